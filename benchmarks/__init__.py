@@ -0,0 +1,5 @@
+"""
+Benchmarks del dashboard: renderizan main.py y las páginas con AppTest de
+Streamlit, sin navegador ni red, y miden arranque en frío, reruns en caliente,
+memoria y tamaño de las cachés. Ver benchmarks/run.py.
+"""
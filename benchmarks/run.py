@@ -0,0 +1,290 @@
+"""
+Benchmark de renderizado de las páginas con AppTest de Streamlit.
+
+Cada página se ejecuta en un proceso nuevo (así el arranque en frío incluye
+importaciones, lectura de datos y construcción de cachés, y el pico de memoria
+es solo suyo) y se mide:
+
+- import_s: importación de los módulos de la página (python -X importtime, en
+  otro proceso nuevo) e imports: lo que aporta cada paquete.
+- cold_s: primera ejecución de la página.
+- warm_s: mediana de varios reruns sin cambiar nada.
+- steps: cada interacción del escenario (benchmarks/scenarios.py).
+- rss_cold_mb / peak_rss_mb: pico de memoria tras el arranque y al final.
+- caches: bytes de cada st.cache_data y de las cachés propias (catálogo,
+  sesiones, geometría, figuras).
+
+Las peticiones HTTP se sustituyen por respuestas fijas (benchmarks/stubs.py) y
+la caché de fotos va a un fichero temporal: no hace falta red ni se tocan las
+cachés de data/cache. Los resultados se guardan en JSON y, con --baseline, se
+comparan con una ejecución anterior; el código de salida es 1 si hay regresiones.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.run
+    python -m benchmarks.run --pages 4_ 6_ --reruns 10
+    python -m benchmarks.run --baseline benchmarks/results/base.json --threshold 0.2
+    python -m benchmarks.run --pages main --max-import-s 1.0
+"""
+import argparse
+import ast
+import datetime
+import glob
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+PAGE_TIMEOUT = 300
+# Diferencias absolutas por debajo de estas no se consideran regresión (ruido)
+MIN_DELTA = {"s": 0.05, "mb": 16}
+
+
+def page_files():
+    return ["main.py"] + sorted(glob.glob(os.path.join("pages", "[0-9]_*.py")))
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux da KiB y macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def find_widget(at, kind, label):
+    for widget in getattr(at, kind):
+        if widget.label == label:
+            return widget
+    raise LookupError(f"No hay {kind} con la etiqueta {label!r}")
+
+
+def timed_run(at):
+    start = time.perf_counter()
+    at.run()
+    return round(time.perf_counter() - start, 4)
+
+
+def cache_sizes():
+    """Bytes de cada función con st.cache_data y de las cachés propias del dashboard"""
+    from streamlit.runtime.caching import get_data_cache_stats_provider
+
+    from pages import functions
+
+    sizes = {"cache_data": {}}
+    stats = get_data_cache_stats_provider().get_stats()
+    for family in stats.values() if isinstance(stats, dict) else [stats]:
+        for stat in family:
+            sizes["cache_data"][stat.cache_name] = sizes["cache_data"].get(stat.cache_name, 0) + stat.byte_length
+
+    catalog = functions.get_catalog()
+    usage = catalog.memory_usage()
+    sizes["catalog"] = {"tables": len(catalog.loaded_tables()), "bytes": int(usage["bytes"].sum())}
+    if "session-index" in catalog.loaded_tables():
+        sessions, session_bytes = functions.get_session_index().cache_usage()
+        sizes["session_index"] = {"sessions": sessions, "bytes": session_bytes}
+    geometry = functions.get_geometry_cache()
+    sizes["geometry"] = {"items": len(geometry), "bytes": geometry.bytes}
+    figures, figure_bytes = functions.get_figure_cache().usage()
+    sizes["figures"] = {"items": figures, "bytes": figure_bytes}
+    return sizes
+
+
+def bench_page(page, reruns):
+    """Mide una página en este proceso (se llama desde el proceso hijo)"""
+    from benchmarks import stubs
+    from benchmarks.scenarios import SCENARIOS
+
+    stubs.install()
+    from streamlit.testing.v1 import AppTest
+
+    result = {"errors": []}
+    at = AppTest.from_file(os.path.abspath(page), default_timeout=PAGE_TIMEOUT)
+    result["cold_s"] = timed_run(at)
+    result["rss_cold_mb"] = peak_rss_mb()
+    result["errors"] += [e.value for e in at.exception]
+
+    warm = [timed_run(at) for _ in range(reruns)]
+    result["warm_s"] = statistics.median(warm) if warm else None
+    result["warm_max_s"] = max(warm) if warm else None
+
+    result["steps"] = {}
+    for description, kind, label, value in SCENARIOS.get(os.path.basename(page), []):
+        try:
+            widget = find_widget(at, kind, label)
+            widget.set_value(value(widget) if callable(value) else value)
+        except (LookupError, IndexError, ValueError) as e:
+            result["errors"].append(f"{description}: {e}")
+            continue
+        result["steps"][description] = timed_run(at)
+        result["errors"] += [f"{description}: {e.value}" for e in at.exception]
+
+    result["peak_rss_mb"] = peak_rss_mb()
+    result["caches"] = cache_sizes()
+    result["http_requests"] = len(stubs.requests_seen)
+    return result
+
+
+def import_profile(page):
+    """
+    Importa en un proceso nuevo, con python -X importtime, los mismos módulos
+    que la página. Devuelve el total en segundos y los milisegundos propios de
+    cada paquete (la suma de sus módulos), de mayor a menor.
+    """
+    with open(page, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    imports = [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "\n".join(imports)], capture_output=True, text=True
+    )
+    total_us, packages = 0, {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        module = name.strip()
+        if len(name) - len(name.lstrip()) == 1:
+            # Sin sangría: módulo importado directamente por la página
+            total_us += int(cumulative_us)
+        package = module.split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+    top = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:10]
+    return round(total_us / 1e6, 4), {package: round(us / 1000, 1) for package, us in top}
+
+
+def run_worker(page, reruns, output):
+    """Proceso hijo: una página con cachés vacías y la caché de fotos en un temporal"""
+    env = dict(os.environ)
+    with tempfile.TemporaryDirectory() as tmp:
+        env["F1_PHOTO_CACHE"] = os.path.join(tmp, "photos.sqlite")
+        command = [sys.executable, "-m", "benchmarks.run", "--worker", page, "--reruns", str(reruns), "--output", output]
+        completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {"errors": [completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "exit code"]}
+    with open(output, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def metrics(page_result):
+    """Métricas comparables de una página: {nombre: (valor, unidad)}"""
+    values = {
+        "import_s": (page_result.get("import_s"), "s"),
+        "cold_s": (page_result.get("cold_s"), "s"),
+        "warm_s": (page_result.get("warm_s"), "s"),
+        "peak_rss_mb": (page_result.get("peak_rss_mb"), "mb"),
+    }
+    for step, seconds in page_result.get("steps", {}).items():
+        values[f"step: {step}"] = (seconds, "s")
+    return values
+
+
+def compare(results, baseline, threshold):
+    """Lista de regresiones (página, métrica, antes, ahora) respecto a la línea base"""
+    regressions = []
+    for page, current in results["pages"].items():
+        previous = baseline.get("pages", {}).get(page)
+        if previous is None:
+            continue
+        before = metrics(previous)
+        for name, (value, unit) in metrics(current).items():
+            if value is None or before.get(name, (None,))[0] is None:
+                continue
+            old = before[name][0]
+            if value > old * (1 + threshold) and value - old > MIN_DELTA[unit]:
+                regressions.append((page, name, old, value))
+    return regressions
+
+
+def environment():
+    import pandas as pd
+    import streamlit as st
+
+    # Fuera de una sesión, st.cache_data avisa de que no hay runtime: no es un error
+    logging.getLogger("streamlit.runtime.caching.cache_data_api").setLevel(logging.ERROR)
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    from pages.functions import dataset_version
+
+    return {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "streamlit": st.__version__,
+        "pandas": pd.__version__,
+        "dataset_version": dataset_version(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de las páginas del dashboard")
+    parser.add_argument("--pages", nargs="*", help="Solo las páginas cuyo nombre contenga alguno de estos textos")
+    parser.add_argument("--reruns", type=int, default=5, help="Reruns en caliente por página")
+    parser.add_argument("--output", help="Fichero JSON de resultados (por defecto benchmarks/results/<fecha>.json)")
+    parser.add_argument("--baseline", help="Resultados anteriores con los que comparar")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Empeoramiento relativo que cuenta como regresión")
+    parser.add_argument("--max-import-s", type=float, help="Falla si alguna página tarda más en importar sus módulos")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(bench_page(args.worker, args.reruns), f, ensure_ascii=False)
+        return
+
+    pages = [p for p in page_files() if not args.pages or any(text in p for text in args.pages)]
+    results = {**environment(), "reruns": args.reruns, "pages": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for page in pages:
+            page_result = run_worker(page, args.reruns, os.path.join(tmp, "page.json"))
+            page_result["import_s"], page_result["imports"] = import_profile(page)
+            results["pages"][os.path.basename(page)] = page_result
+            print(
+                f"{os.path.basename(page)}: imports {page_result['import_s']:.2f}s, "
+                f"frío {page_result.get('cold_s', float('nan')):.2f}s, "
+                f"caliente {page_result.get('warm_s') or float('nan'):.3f}s, "
+                f"{len(page_result.get('steps', {}))} interacciones, "
+                f"pico {page_result.get('peak_rss_mb', float('nan')):.0f} MB"
+                + (f", {len(page_result['errors'])} errores" if page_result.get("errors") else "")
+            )
+            for error in page_result.get("errors", [])[:3]:
+                print(f"    {error}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Resultados en {output}")
+
+    failed = False
+    if args.max_import_s is not None:
+        for page, page_result in results["pages"].items():
+            if page_result["import_s"] > args.max_import_s:
+                failed = True
+                slowest = ", ".join(f"{name} {ms:.0f} ms" for name, ms in list(page_result["imports"].items())[:3])
+                print(f"IMPORTS {page}: {page_result['import_s']:.2f}s > {args.max_import_s:.2f}s ({slowest})")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for page, name, old, new in regressions:
+            print(f"REGRESIÓN {page} {name}: {old} -> {new}")
+        if regressions:
+            failed = True
+        else:
+            print(f"Sin regresiones respecto a {args.baseline} (umbral {args.threshold:.0%})")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Interacciones representativas de cada página. Cada paso es
+(descripción, tipo de widget, etiqueta, valor); el valor puede ser una función
+que recibe el widget y devuelve el valor (p. ej. la segunda opción), para no
+depender de nombres concretos de la base de datos.
+"""
+
+
+def option(index):
+    return lambda widget: widget.options[index]
+
+
+SCENARIOS = {
+    "main.py": [],
+    "1_👤_Informacion_de_Pilotos.py": [
+        ("piloto: Lewis Hamilton", "selectbox", "Selecciona un piloto", "lewis-hamilton"),
+        ("métrica 2", "radio", "Selecciona una métrica para visualizar su evolución anual:", option(1)),
+        ("métrica 3", "radio", "Selecciona una métrica para visualizar su evolución anual:", option(2)),
+        ("métrica 4", "radio", "Selecciona una métrica para visualizar su evolución anual:", option(3)),
+        ("piloto: Max Verstappen", "selectbox", "Selecciona un piloto", "max-verstappen"),
+    ],
+    "2_🏢_Informacion_de_Escuderias.py": [
+        ("escudería: Ferrari", "selectbox", "Selecciona una escudería", "ferrari"),
+        ("métrica 2", "radio", "Selecciona una métrica para visualizar su evolución anual:", option(1)),
+        ("métrica 3", "radio", "Selecciona una métrica para visualizar su evolución anual:", option(2)),
+        ("escudería: McLaren", "selectbox", "Selecciona una escudería", "mclaren"),
+    ],
+    "3_📊_Analisis_de_Temporada.py": [
+        ("años 1990-2025", "slider", "Selecciona un rango de años:", (1990, 2025)),
+        ("años 1950-2025", "slider", "Selecciona un rango de años:", (1950, 2025)),
+        ("año del piloto", "selectbox", "Selecciona un año:", option(-1)),
+        ("comparar escuderías", "radio", "Comparar:", "Escuderías"),
+        ("años 2000-2020", "slider", "Selecciona un rango de años:", (2000, 2020)),
+        ("progresión del campeonato", "radio", "Análisis:", "Progresión del campeonato"),
+        ("progresión 2021", "selectbox", "Temporada:", 2021),
+        ("duelos entre compañeros", "radio", "Análisis:", "Duelos entre compañeros"),
+        ("duelos: temporada 2021", "selectbox", "Temporada:", 2021),
+        ("simulador de puntuación", "radio", "Análisis:", "Sistema de puntuación alternativo"),
+        ("sistema 1961-1990", "selectbox", "Partir del sistema:", "1961-1990 (11 mejores resultados)"),
+        ("simulador: pilotos", "radio", "Comparar:", "Pilotos"),
+    ],
+    "4_🏁_Resultados_Historicos.py": [
+        ("año 2024", "selectbox", "Selecciona el Año", 2024),
+        ("segundo GP", "selectbox", "Selecciona el Gran Premio", option(1)),
+        ("sesión 2", "selectbox", "Selecciona la Sesión", option(1)),
+        ("sesión 3", "selectbox", "Selecciona la Sesión", option(2)),
+        ("año 1990", "selectbox", "Selecciona el Año", 1990),
+        ("paradas: Ferrari", "multiselect", "Escuderías:", ["ferrari"]),
+        ("paradas 1994-2000", "slider", "Temporadas:", (1994, 2000)),
+    ],
+    "5_🏆_Informacion_de_GP.py": [
+        ("GP: British Grand Prix", "selectbox", "Selecciona un Gran Premio", "British Grand Prix"),
+        ("métrica 2", "radio", "Selecciona una métrica para visualizar:", option(1)),
+        ("métrica 3", "radio", "Selecciona una métrica para visualizar:", option(2)),
+        ("GP: Italian Grand Prix", "selectbox", "Selecciona un Gran Premio", "Italian Grand Prix"),
+        ("récords: trazado 2", "selectbox", "Circuito y trazado:", option(1)),
+    ],
+    "6_🌍_Estadisticas_Geograficas.py": [
+        ("por escuderías", "radio", "Analizar por:", "Escuderías"),
+        ("métrica 2", "selectbox", "Selecciona la métrica a visualizar:", option(1)),
+        ("métrica 3", "selectbox", "Selecciona la métrica a visualizar:", option(2)),
+        ("temporadas 1980-2000", "slider", "Temporadas:", (1980, 2000)),
+        ("por pilotos", "radio", "Analizar por:", "Pilotos"),
+    ],
+}
@@ -0,0 +1,37 @@
+"""
+Sustituye las peticiones HTTP por respuestas fijas para que los benchmarks no
+dependan de la red: Wikipedia devuelve siempre un artículo con foto y cualquier
+otra URL (las descargas de GADM) un 404, que las páginas ya tratan como "sin
+mapa regional".
+"""
+import urllib.parse
+
+import requests
+
+BENCH_PHOTO_URL = "https://upload.wikimedia.org/benchmark.jpg"
+WIKIPEDIA_ARTICLE = (
+    "<html><body><table class='infobox'><tr><td>"
+    f"<img src='{BENCH_PHOTO_URL[len('https:'):]}'>"
+    "</td></tr></table></body></html>"
+).encode()
+
+requests_seen = []
+
+
+def _fake_request(self, method, url, *args, **kwargs):
+    requests_seen.append(url)
+    response = requests.Response()
+    response.url = url
+    response.request = requests.Request(method, url).prepare()
+    if urllib.parse.urlsplit(url).path.startswith(("/w/", "/wiki/")):
+        response.status_code, response.reason = 200, "OK"
+        response._content = WIKIPEDIA_ARTICLE
+    else:
+        response.status_code, response.reason = 404, "Not Found"
+        response._content = b""
+    return response
+
+
+def install():
+    """requests.get y requests.Session pasan todos por Session.request"""
+    requests.sessions.Session.request = _fake_request
@@ -3,24 +3,25 @@ import pandas as pd
 import numpy as np
 import json
 import random
+from pages.functions import dataset_version, perf_panel, perf_start, table_row_count
 
 st.set_page_config(
     page_title="F1 Stats Dashboard",
     page_icon="🏎️",
     layout="wide"
 )
+perf_start("main")
 
+# La versión de los datos forma parte de la clave de caché: tras una actualización se recalcula.
+# Los recuentos salen del manifiesto del almacén, sin leer las tablas.
 @st.cache_data
-def load_main_stats():
+def load_main_stats(version):
     try:
-        drivers = pd.read_csv("database/f1db-drivers.csv")
-        races = pd.read_csv("database/f1db-races.csv")
-        constructors = pd.read_csv("database/f1db-constructors.csv")
-        return len(drivers), len(races), len(constructors)
+        return tuple(table_row_count(table) for table in ("drivers", "races", "constructors"))
     except FileNotFoundError:
         return 0, 0, 0
 
-total_drivers, total_races, total_constructors = load_main_stats()
+total_drivers, total_races, total_constructors = load_main_stats(dataset_version())
 
 st.title("🏎️ F1 Stats Dashboard 🏎️")
 st.markdown("### Bienvenido al centro de análisis definitivo para los aficionados de la Fórmula 1")
@@ -86,3 +87,5 @@ with c2:
             st.switch_page("pages/3_📊_Analisis_de_Temporada.py")
 
 st.markdown("---")
+
+perf_panel()
@@ -1,141 +1,479 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
+from pages.functions import (
+    SCORING_PRESETS,
+    build_race_results_with_gp,
+    cached_figure,
+    dataset_version,
+    get_catalog,
+    get_championship_progression,
+    get_teammate_head_to_head,
+    get_season_cube,
+    perf_panel,
+    perf_start,
+    simulate_championships,
+    span,
+)
 
 st.set_page_config(
     page_title="Análisis de Temporada",
     page_icon="📊",
     layout="wide",
 )
+perf_start("temporada")
 
 st.title("📊 Análisis Histórico por Temporada")
 st.markdown("Compara el rendimiento de pilotos y escuderías a lo largo de la historia de la F1.")
 
-@st.cache_data
+ENTITY_LABELS = {"Pilotos": ("drivers", "Piloto"), "Escuderías": ("constructors", "Escudería")}
+SEASONS_MODE, SIMULATOR_MODE = "Evolución por temporada", "Sistema de puntuación alternativo"
+PROGRESSION_MODE = "Progresión del campeonato"
+TEAMMATES_MODE = "Duelos entre compañeros"
+ALL_SEASONS = "Todas"
+PROGRESSION_TOP = 5
+SCORING_ROWS = 20
+DEFAULT_SELECTION = {
+    "drivers": ["michael-schumacher", "lewis-hamilton", "max-verstappen", "fernando-alonso", "sebastian-vettel"],
+    "constructors": ["ferrari", "mclaren", "red-bull", "mercedes", "williams"],
+}
+
+# --- Figuras (se construyen una vez por selección; ver cached_figure) ---
+def points_figure(plot_data, entity_label):
+    return px.line(
+        plot_data,
+        x='year',
+        y='points',
+        color='name',
+        title="Puntos por temporada",
+        labels={'year': 'Año', 'points': 'Puntos', 'name': entity_label},
+        markers=True
+    )
+
+def wins_figure(cube, entity, selected_years, selected_ids, entity_label):
+    wins = cube.totals(entity, *selected_years, "wins", ids=selected_ids)
+    wins = wins[wins > 0].astype(int).sort_values(ascending=False)
+    if wins.empty:
+        return None
+    names = cube.names(entity)
+    wins_count = pd.DataFrame({'name': wins.index.map(names), 'victorias': wins.to_numpy()})
+    return px.bar(
+        wins_count,
+        x='name',
+        y='victorias',
+        color='name',
+        title=f"Victorias Totales entre {selected_years[0]} y {selected_years[1]}",
+        labels={'name': entity_label, 'victorias': 'Número de Victorias'}
+    )
+
+def team_positions_figure(plot_data, team_id, team_name):
+    team_data = plot_data[plot_data['id'] == team_id].melt(
+        id_vars='year', value_vars=['avgGrid', 'avgFinish'], var_name='métrica', value_name='posición'
+    ).dropna()
+    if team_data.empty:
+        return None
+    team_data['métrica'] = team_data['métrica'].map({'avgGrid': 'Salida media', 'avgFinish': 'Llegada media'})
+    fig = px.line(
+        team_data,
+        x='year',
+        y='posición',
+        color='métrica',
+        title=f"Posición media de salida y de llegada de {team_name}",
+        labels={'year': 'Año', 'posición': 'Posición media', 'métrica': ''},
+        markers=True
+    )
+    fig.update_yaxes(autorange="reversed")
+    return fig
+
+def grid_vs_finish_figure(driver_id, driver_name, year):
+    race_results = get_catalog().derived("races-race-results+grands-prix", build_race_results_with_gp)
+    scatter_data = race_results[
+        (race_results['year'] == year) &
+        (race_results['driverId'] == driver_id) &
+        (race_results['gridPositionNumber'] > 0)
+    ].dropna(subset=['gridPositionNumber', 'positionNumber'])
+    if scatter_data.empty:
+        return None
+    fig = px.scatter(
+        scatter_data,
+        x='gridPositionNumber',
+        y='positionNumber',
+        title=f"Salida vs. Llegada para {driver_name} en {year}",
+        labels={'gridPositionNumber': 'Posición de Salida', 'positionNumber': 'Posición Final'},
+        hover_data=['grandPrixName']
+    )
+    max_pos = max(scatter_data['gridPositionNumber'].max(), scatter_data['positionNumber'].max()) + 1
+    fig.add_shape(type='line', x0=0, y0=0, x1=max_pos, y1=max_pos, line=dict(color='Gray', dash='dash'))
+    fig.update_yaxes(autorange="reversed")
+    return fig
+
+# --- Simulador de puntuación ---
+def trimmed(points):
+    """Puntos sin los ceros finales: tablas equivalentes comparten entrada en la caché"""
+    points = [float(value) for value in points]
+    while points and points[-1] == 0:
+        points.pop()
+    return tuple(points)
+
+def scoring_editor():
+    """Editor del sistema de puntuación; devuelve los argumentos de simulate_championships"""
+    preset_name = st.selectbox("Partir del sistema:", list(SCORING_PRESETS))
+    preset = SCORING_PRESETS[preset_name]
+    table = pd.DataFrame(0.0, index=pd.Index(range(1, SCORING_ROWS + 1), name="Posición"), columns=["Carrera", "Sprint"])
+    table.iloc[:len(preset["race"]), 0] = preset["race"]
+    table.iloc[:len(preset["sprint"]), 1] = preset["sprint"]
+    # La clave incluye el sistema de partida: al cambiarlo, el editor vuelve a sus valores
+    points_column = st.column_config.NumberColumn(min_value=0.0, step=0.5, format="%g")
+    edited = st.data_editor(
+        table,
+        key=f"puntuacion-{preset_name}",
+        use_container_width=True,
+        column_config={"Carrera": points_column, "Sprint": points_column},
+    )
+    fastest_lap = st.number_input(
+        "Puntos por vuelta rápida:", min_value=0.0, step=0.5, value=float(preset["fastest_lap"]),
+        key=f"vuelta-rapida-{preset_name}",
+    )
+    fastest_lap_top = st.number_input(
+        "Vuelta rápida solo si termina entre los N primeros (0 = siempre):", min_value=0, max_value=SCORING_ROWS,
+        value=preset["fastest_lap_top"], key=f"vuelta-rapida-top-{preset_name}",
+    )
+    best_results = st.number_input(
+        "Grandes Premios que cuentan por temporada (0 = todos):", min_value=0, max_value=30,
+        value=preset["best_results"], key=f"mejores-resultados-{preset_name}",
+    )
+    return (
+        trimmed(edited["Carrera"].fillna(0)),
+        trimmed(edited["Sprint"].fillna(0)),
+        float(fastest_lap),
+        int(fastest_lap_top) if fastest_lap else 0,
+        int(best_results),
+    )
+
+def champions_table(simulated, actual, entity_label):
+    """Campeón real y simulado de cada temporada"""
+    simulated = simulated[simulated['position'] == 1].drop_duplicates('year').set_index('year')
+    actual = actual[actual['position'] == 1].drop_duplicates('year').set_index('year')
+    champions = pd.DataFrame({
+        'Año': simulated.index,
+        f'{entity_label} campeón': actual['name'].reindex(simulated.index).to_numpy(),
+        f'{entity_label} campeón simulado': simulated['name'].to_numpy(),
+        'Puntos simulados': simulated['points'].to_numpy(),
+    })
+    changed = actual['id'].reindex(simulated.index).to_numpy() != simulated['id'].to_numpy()
+    champions['Cambia'] = changed & actual['id'].reindex(simulated.index).notna().to_numpy()
+    return champions.sort_values('Año', ascending=False, ignore_index=True)
+
+def season_table(simulated, actual, year, entity_label):
+    """Clasificación simulada de una temporada junto a la real"""
+    season = simulated[simulated['year'] == year]
+    real = actual[actual['year'] == year].drop_duplicates('id').set_index('id')
+    table = pd.DataFrame({
+        'Posición simulada': season['position'].to_numpy(),
+        entity_label: season['name'].to_numpy(),
+        'Puntos simulados': season['points'].to_numpy(),
+        'Posición real': real['position'].reindex(season['id']).to_numpy(),
+        'Puntos reales': real['points'].reindex(season['id']).to_numpy(),
+    })
+    table['Diferencia'] = table['Posición real'] - table['Posición simulada']
+    return table
+
+def simulator_view(cube, entity, entity_label):
+    st.subheader("Sistema de puntuación alternativo")
+    st.markdown(
+        "Recalcula los campeonatos de todas las temporadas desde 1950 con otro sistema de puntuación. "
+        "Edita la tabla: los resultados se actualizan al momento."
+    )
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        scoring = scoring_editor()
+    with span("simulación"):
+        simulated = simulate_championships(dataset_version(), *scoring)[entity]
+        actual = cube.seasons(entity, *cube.year_range(entity))
+        champions = champions_table(simulated, actual, entity_label)
+    with col2:
+        seasons_with_champion = int(champions[f'{entity_label} campeón'].notna().sum())
+        st.metric("Temporadas con otro campeón", f"{int(champions['Cambia'].sum())} de {seasons_with_champion}")
+        if st.checkbox("Mostrar solo las temporadas con otro campeón", value=True):
+            champions = champions[champions['Cambia']]
+        st.dataframe(champions.drop(columns='Cambia'), hide_index=True, use_container_width=True)
+
+        years = sorted(simulated['year'].unique(), reverse=True)
+        year = st.selectbox("Clasificación simulada de la temporada:", options=years)
+        st.dataframe(season_table(simulated, actual, year, entity_label), hide_index=True, use_container_width=True)
+
+# --- Progresión del campeonato ---
+def progression_figure(progression, entity, year, selected_ids, metric, entity_label):
+    """Puntos o posición de cada entidad tras cada ronda de la temporada"""
+    season = progression.season(entity, year)
+    points, positions = progression.select(entity, year, selected_ids)
+    values = points if metric == 'points' else positions
+    rounds = len(season['rounds'])
+    plot_data = pd.DataFrame({
+        'round': np.repeat(season['rounds'], len(selected_ids)),
+        'race': np.repeat(season['races'], len(selected_ids)),
+        'name': [progression.names[entity].get(id_, id_) for id_ in selected_ids] * rounds,
+        metric: values.ravel(),
+    })
+    fig = px.line(
+        plot_data,
+        x='round',
+        y=metric,
+        color='name',
+        title=f"{'Puntos' if metric == 'points' else 'Posición en el campeonato'} tras cada carrera de {year}",
+        labels={'round': 'Ronda', 'points': 'Puntos', 'position': 'Posición', 'name': entity_label, 'race': 'Gran Premio'},
+        hover_data=['race'],
+        markers=True
+    )
+    if metric == 'position':
+        fig.update_yaxes(autorange="reversed")
+    return fig
+
+def contenders_table(progression, entity, year, entity_label):
+    """Clasificación tras la última ronda y cuándo se quedó cada uno sin opciones al título"""
+    season = progression.season(entity, year)
+    contenders = progression.contenders(entity, year)
+    races = dict(zip(season['rounds'], season['races']))
+    finished = len(season['rounds']) >= season['scheduled']
+    status = [
+        f"Sin opciones desde la ronda {round_} ({races[round_]})" if round_ >= 0
+        else "Campeón" if finished and position == 1
+        else "Aún con opciones"
+        for round_, position in zip(contenders['eliminated'], contenders['position'])
+    ]
+    return pd.DataFrame({
+        'Posición': contenders['position'].to_numpy(),
+        entity_label: contenders['name'].to_numpy(),
+        'Puntos': contenders['points'].to_numpy(),
+        'Título': status,
+    })
+
+def progression_view(entity, entity_label):
+    st.subheader("Progresión del campeonato")
+    st.markdown(
+        "Clasificación del campeonato tras cada carrera y ronda en la que cada "
+        f"{'piloto' if entity == 'drivers' else 'escudería'} se quedó sin opciones matemáticas al título."
+    )
+    progression = get_championship_progression()
+    year = st.sidebar.selectbox("Temporada:", options=progression.years(entity)[::-1])
+    season = progression.season(entity, year)
+    names = progression.names[entity]
+    selected_ids = st.sidebar.multiselect(
+        f"Selecciona {'pilotos' if entity == 'drivers' else 'escuderías'} para comparar:",
+        options=list(season['ids']),
+        default=list(season['ids'][:PROGRESSION_TOP]),
+        format_func=lambda id_: names.get(id_, id_),
+    )
+    played, scheduled = len(season['rounds']), season['scheduled']
+    if played < scheduled:
+        st.info(f"Temporada en curso: {played} de {scheduled} carreras disputadas.")
+
+    if not selected_ids:
+        st.warning(f"Por favor, selecciona al menos {'un piloto' if entity == 'drivers' else 'una escudería'} en la barra lateral para ver las gráficas.")
+    else:
+        selection = (entity, int(year), tuple(selected_ids))
+        for metric in ('points', 'position'):
+            with span(f"figura progresión {metric}"):
+                fig = cached_figure(
+                    ("temporada-progresion", metric) + selection,
+                    lambda: progression_figure(progression, entity, year, selected_ids, metric, entity_label),
+                )
+            with span("plotly_chart"):
+                st.plotly_chart(fig, use_container_width=True)
+
+    st.subheader("¿Quién podía ganar el título?")
+    st.dataframe(contenders_table(progression, entity, year, entity_label), hide_index=True, use_container_width=True)
+    st.caption(
+        "Se considera sin opciones a quien, ni ganando todas las carreras restantes (con vuelta rápida y sprint "
+        "donde puntúan, según el reglamento de la temporada), alcanzaría al líder. No se tienen en cuenta desempates "
+        "ni resultados descartados, así que algunos títulos se dan por decididos una carrera más tarde."
+    )
+
+# --- Duelos entre compañeros de equipo ---
+def duels_table(summary, with_driver):
+    """Balance de cada pareja en formato legible"""
+    table = pd.DataFrame({
+        'Piloto': summary['name'],
+        'Compañero': summary['teammate'],
+        'Escudería': summary['constructors'],
+        'Temporadas': [
+            str(first) if first == last else f"{first}-{last}"
+            for first, last in zip(summary['firstYear'], summary['lastYear'])
+        ],
+        'Carreras': summary['races'],
+        'Clasificación': summary['qualifyingWins'].astype(str) + "-" + summary['qualifyingLosses'].astype(str),
+        'Diferencia mediana (s)': (summary['medianGapMillis'] / 1000).round(3),
+        'Diferencia mediana (%)': summary['medianGapPercent'].round(2),
+        'Carrera': summary['raceWins'].astype(str) + "-" + summary['raceLosses'].astype(str),
+    })
+    return table if with_driver else table.drop(columns='Piloto')
+
+def teammate_gap_figure(by_year, driver_name):
+    plot_data = by_year.dropna(subset=['medianGapPercent'])
+    if plot_data.empty:
+        return None
+    fig = px.bar(
+        plot_data,
+        x='year',
+        y='medianGapPercent',
+        color='teammate',
+        barmode='group',
+        title=f"Diferencia mediana en clasificación de {driver_name} con sus compañeros",
+        labels={'year': 'Año', 'medianGapPercent': 'Diferencia mediana (%)', 'teammate': 'Compañero'},
+        hover_data=['constructors', 'races'],
+    )
+    fig.add_hline(y=0, line=dict(color='Gray', dash='dash'))
+    return fig
+
+def teammates_view(entity):
+    st.subheader("Duelos entre compañeros de equipo")
+    st.markdown(
+        "Quién quedó por delante en clasificación y en carrera entre pilotos de la misma escudería, "
+        "y la diferencia mediana en clasificación (en la sesión más avanzada en la que marcaron tiempo los dos)."
+    )
+    head_to_head = get_teammate_head_to_head()
+    lookup = 'driver' if entity == 'drivers' else 'constructor'
+    names = head_to_head.names[entity]
+    options = sorted(head_to_head.keys(lookup), key=lambda id_: names.get(id_, id_))
+    default = DEFAULT_SELECTION[entity][0]
+    selected = st.sidebar.selectbox(
+        "Piloto:" if entity == 'drivers' else "Escudería:",
+        options=options,
+        index=options.index(default) if default in options else 0,
+        format_func=lambda id_: names.get(id_, id_),
+    )
+    filters = {lookup: selected}
+    by_year = head_to_head.summary(**filters, by_year=True)
+    year = st.sidebar.selectbox("Temporada:", options=[ALL_SEASONS] + sorted(by_year['year'].unique(), reverse=True))
+    if year != ALL_SEASONS:
+        filters['year'] = int(year)
+
+    with span("duelos"):
+        summary = head_to_head.summary(**filters)
+    if summary.empty:
+        st.info(f"No hay duelos entre compañeros para {names.get(selected, selected)}.")
+        return
+    st.dataframe(duels_table(summary, with_driver=entity != 'drivers'), hide_index=True, use_container_width=True)
+    st.caption(
+        "Clasificación y carrera: duelos ganados-perdidos. Una diferencia negativa significa que el piloto fue más "
+        "rápido que su compañero. En carrera se compara el orden final, retirados incluidos."
+    )
+
+    if entity == 'drivers':
+        with span("figura duelos"):
+            fig = cached_figure(
+                ("temporada-companeros", selected),
+                lambda: teammate_gap_figure(by_year, names.get(selected, selected)),
+            )
+        if fig is not None:
+            with span("plotly_chart"):
+                st.plotly_chart(fig, use_container_width=True)
+
 def load_data():
     try:
-        driver_standings = pd.read_csv("database/f1db-seasons-driver-standings.csv")
-        drivers = pd.read_csv("database/f1db-drivers.csv")[['id', 'name']]
-        race_results = pd.read_csv("database/f1db-races-race-results.csv", low_memory=False)
-        
-        # ### CORRECCIÓN 2: Añadir la información del Gran Premio que faltaba
-        races = pd.read_csv("database/f1db-races.csv")[['raceId', 'grandPrixId']]
-        grands_prix = pd.read_csv("database/f1db-grands-prix.csv")[['id', 'name']]
-        
-        race_results = race_results.merge(races, on='raceId', how='left')
-        race_results = race_results.merge(grands_prix, left_on='grandPrixId', right_on='id', how='left')
-        race_results.rename(columns={'name': 'grandPrixName'}, inplace=True)
-
-        # name_corrections = {"Fernando Alonso Díaz": "Fernando Alonso"}
-        drivers['fullName'] = drivers['name']
-        race_results['full_name'] = race_results['full_name']
-
-        driver_standings = driver_standings.merge(drivers, left_on='driverId', right_on='id', how='left')
-        race_results.rename(columns={'full_name': 'fullName'}, inplace=True)
-        
-        return driver_standings, race_results, drivers
+        return get_season_cube()
     except FileNotFoundError as e:
         st.error(f"Error cargando los datos: no se encontró el archivo {e.filename}. Asegúrate de que los archivos CSV están en la carpeta 'database'.")
-        return None, None, None
+        return None
 
-driver_standings, race_results, drivers = load_data()
+cube = load_data()
 
-if driver_standings is not None:
+if cube is not None:
     st.sidebar.header("Filtros de Análisis")
-    all_years = sorted(driver_standings['year'].unique())
+    mode = st.sidebar.radio("Análisis:", [SEASONS_MODE, PROGRESSION_MODE, TEAMMATES_MODE, SIMULATOR_MODE])
+    entity, entity_label = ENTITY_LABELS[st.sidebar.radio("Comparar:", list(ENTITY_LABELS), horizontal=True)]
+
+if cube is not None and mode == SIMULATOR_MODE:
+    simulator_view(cube, entity, entity_label)
+elif cube is not None and mode == PROGRESSION_MODE:
+    progression_view(entity, entity_label)
+elif cube is not None and mode == TEAMMATES_MODE:
+    teammates_view(entity)
+elif cube is not None:
+    names = cube.names(entity)
+
+    first_year, last_year = cube.year_range(entity)
     selected_years = st.sidebar.slider(
         "Selecciona un rango de años:",
-        min_value=int(min(all_years)),
-        max_value=int(max(all_years)),
-        value=(2010, int(max(all_years))) 
+        min_value=first_year,
+        max_value=last_year,
+        value=(max(2010, first_year), last_year)
     )
 
-    driver_standings_filtered = driver_standings[
-        (driver_standings['year'] >= selected_years[0]) & (driver_standings['year'] <= selected_years[1])
-    ]
+    seasons_in_range = cube.seasons(entity, *selected_years)
+    all_in_range = sorted(seasons_in_range['id'].unique(), key=lambda id_: names[id_])
+    valid_defaults = [id_ for id_ in DEFAULT_SELECTION[entity] if id_ in set(all_in_range)]
 
-    all_drivers_in_range = sorted(driver_standings_filtered['fullName'].dropna().unique())
-    
-    default_drivers_list = ["Michael Schumacher", "Lewis Hamilton", "Max Verstappen", "Fernando Alonso", "Sebastian Vettel"]
-    valid_defaults = [driver for driver in default_drivers_list if driver in all_drivers_in_range]
-    
-    selected_drivers = st.sidebar.multiselect(
-        "Selecciona pilotos para comparar:",
-        options=all_drivers_in_range,
-        default=valid_defaults
+    selected_ids = st.sidebar.multiselect(
+        f"Selecciona {'pilotos' if entity == 'drivers' else 'escuderías'} para comparar:",
+        options=all_in_range,
+        default=valid_defaults,
+        format_func=names.get,
     )
 
-    if not selected_drivers:
-        st.warning("Por favor, selecciona al menos un piloto en la barra lateral para ver las gráficas.")
+    if not selected_ids:
+        st.warning(f"Por favor, selecciona al menos {'un piloto' if entity == 'drivers' else 'una escudería'} en la barra lateral para ver las gráficas.")
     else:
-        plot_data = driver_standings_filtered[driver_standings_filtered['fullName'].isin(selected_drivers)]
-        
+        plot_data = cube.seasons(entity, *selected_years, ids=selected_ids)
+        selection = (entity, tuple(selected_years), tuple(selected_ids))
+
         st.subheader("Evolución de Puntos en el Campeonato")
-        fig1 = px.line(
-            plot_data.sort_values(by='year'),
-            x='year',
-            y='points',
-            color='fullName',
-            title="Puntos por temporada",
-            labels={'year': 'Año', 'points': 'Puntos', 'fullName': 'Piloto'},
-            markers=True
-        )
-        st.plotly_chart(fig1, use_container_width=True)
+        with span("figura puntos"):
+            fig1 = cached_figure(("temporada-puntos",) + selection, lambda: points_figure(plot_data, entity_label))
+        with span("plotly_chart"):
+            st.plotly_chart(fig1, use_container_width=True)
 
         st.subheader("Total de Victorias en el Periodo Seleccionado")
-        wins_data = race_results[
-            (race_results['year'] >= selected_years[0]) & (race_results['year'] <= selected_years[1]) &
-            (race_results['positionNumber'] == 1) &
-            (race_results['fullName'].isin(selected_drivers)) 
-        ]
-        
-        if not wins_data.empty:
-            wins_count = wins_data.groupby('fullName').size().reset_index(name='victorias').sort_values(by='victorias', ascending=False) # Usamos fullName
-            fig2 = px.bar(
-                wins_count,
-                x='fullName', 
-                y='victorias',
-                color='fullName', 
-                title=f"Victorias Totales entre {selected_years[0]} y {selected_years[1]}",
-                labels={'fullName': 'Piloto', 'victorias': 'Número de Victorias'}
+        with span("figura victorias"):
+            fig2 = cached_figure(
+                ("temporada-victorias",) + selection,
+                lambda: wins_figure(cube, entity, selected_years, selected_ids, entity_label),
             )
-            st.plotly_chart(fig2, use_container_width=True)
+        if fig2 is not None:
+            with span("plotly_chart"):
+                st.plotly_chart(fig2, use_container_width=True)
         else:
-            st.info("Ninguno de los pilotos seleccionados consiguió victorias en el periodo especificado.")
+            st.info(f"Ninguno de {'los pilotos seleccionados' if entity == 'drivers' else 'las escuderías seleccionadas'} consiguió victorias en el periodo especificado.")
 
         st.subheader("Posición de Salida vs. Posición Final")
-        col1, col2 = st.columns(2)
-        with col1:
-            single_driver_select = st.selectbox("Selecciona un piloto:", options=selected_drivers)
-        
-        available_years_for_driver = sorted(plot_data[plot_data['fullName'] == single_driver_select]['year'].unique(), reverse=True)
-        
-        with col2:
-            if available_years_for_driver:
-                single_year_select = st.selectbox("Selecciona un año:", options=available_years_for_driver)
-            else:
-                single_year_select = None
-
-        if single_year_select:
-            scatter_data = race_results[
-                (race_results['year'] == single_year_select) &
-                (race_results['fullName'] == single_driver_select) & 
-                (race_results['gridPositionNumber'] > 0)
-            ].dropna(subset=['gridPositionNumber', 'positionNumber'])
-            
-            if not scatter_data.empty:
-                fig3 = px.scatter(
-                    scatter_data,
-                    x='gridPositionNumber',
-                    y='positionNumber',
-                    title=f"Salida vs. Llegada para {single_driver_select} en {single_year_select}",
-                    labels={'gridPositionNumber': 'Posición de Salida', 'positionNumber': 'Posición Final'},
-                    hover_data=['grandPrixName'] 
+        if entity == "constructors":
+            single_team_select = st.selectbox("Selecciona una escudería:", options=selected_ids, format_func=names.get)
+            with span("figura posiciones medias"):
+                fig3 = cached_figure(
+                    ("temporada-posiciones-medias", single_team_select, tuple(selected_years)),
+                    lambda: team_positions_figure(plot_data, single_team_select, names[single_team_select]),
                 )
-                max_pos = max(scatter_data['gridPositionNumber'].max(), scatter_data['positionNumber'].max()) + 1
-                fig3.add_shape(type='line', x0=0, y0=0, x1=max_pos, y1=max_pos, line=dict(color='Gray', dash='dash'))
-                fig3.update_yaxes(autorange="reversed")
-                st.plotly_chart(fig3, use_container_width=True)
-                st.caption("La línea discontinua representa mantener la misma posición. Puntos por debajo significan mejora, puntos por encima significan pérdida de posiciones.")
+            if fig3 is not None:
+                with span("plotly_chart"):
+                    st.plotly_chart(fig3, use_container_width=True)
             else:
-                st.info(f"No hay datos de carrera para {single_driver_select} en el año {single_year_select}.")
\ No newline at end of file
+                st.info(f"No hay datos de carrera para {names[single_team_select]} en el periodo seleccionado.")
+        else:
+            col1, col2 = st.columns(2)
+            with col1:
+                single_driver_select = st.selectbox("Selecciona un piloto:", options=selected_ids, format_func=names.get)
+
+            available_years_for_driver = sorted(plot_data.loc[plot_data['id'] == single_driver_select, 'year'].unique(), reverse=True)
+
+            with col2:
+                if available_years_for_driver:
+                    single_year_select = st.selectbox("Selecciona un año:", options=available_years_for_driver)
+                else:
+                    single_year_select = None
+
+            if single_year_select:
+                driver_name = names[single_driver_select]
+                with span("figura salida vs llegada"):
+                    fig3 = cached_figure(
+                        ("temporada-salida-llegada", single_driver_select, int(single_year_select)),
+                        lambda: grid_vs_finish_figure(single_driver_select, driver_name, single_year_select),
+                    )
+                if fig3 is not None:
+                    with span("plotly_chart"):
+                        st.plotly_chart(fig3, use_container_width=True)
+                    st.caption("La línea discontinua representa mantener la misma posición. Puntos por debajo significan mejora, puntos por encima significan pérdida de posiciones.")
+                else:
+                    st.info(f"No hay datos de carrera para {driver_name} en el año {single_year_select}.")
+
+perf_panel()
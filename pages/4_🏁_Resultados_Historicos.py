@@ -2,155 +2,291 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import numpy as np
+from pages.functions import (
+    MIN_CREW_STOPS,
+    cached_figure,
+    dataset_version,
+    get_catalog,
+    get_pit_stop_stats,
+    get_session_index,
+    perf_panel,
+    perf_start,
+    span,
+)
 
 st.set_page_config(
     page_title="Resultados Históricos",
     page_icon="🏁",
     layout="wide",
 )
+perf_start("resultados")
+
+DEFAULT_PIT_STOP_TEAMS = ["ferrari", "mclaren", "red-bull", "mercedes", "williams"]
+STOP_COUNT_LABELS = {"oneStop": "1", "twoStops": "2", "threeOrMore": "3 o más"}
 
+# La versión de los datos forma parte de la clave de caché: tras una actualización se recalcula
 @st.cache_data
-def load_historical_data():
+def load_historical_data(version):
     try:
-        data = {
-            "Carrera": pd.read_csv("database/f1db-races-race-results.csv", low_memory=False),
-            "Clasificación": pd.read_csv("database/f1db-races-qualifying-results.csv", low_memory=False),
-            "Carrera Sprint": pd.read_csv("database/f1db-races-sprint-race-results.csv", low_memory=False),
-            "Clasificación Sprint": pd.read_csv("database/f1db-races-sprint-qualifying-results.csv", low_memory=False),
-            "Libres 1": pd.read_csv("database/f1db-races-free-practice-1-results.csv", low_memory=False),
-            "Libres 2": pd.read_csv("database/f1db-races-free-practice-2-results.csv", low_memory=False),
-            "Libres 3": pd.read_csv("database/f1db-races-free-practice-3-results.csv", low_memory=False),
-        }
-
-        races = pd.read_csv("database/f1db-races.csv")
-        grands_prix = pd.read_csv("database/f1db-grands-prix.csv")
-        pit_stops = pd.read_csv("database/f1db-races-pit-stops.csv")
-
-        drivers = pd.read_csv("database/f1db-drivers.csv")[['id', 'name']].rename(columns={'name': 'full_name'})
-        constructors = pd.read_csv("database/f1db-constructors.csv")[['id', 'fullName']].rename(columns={'fullName': 'team_full_name'})
-
-        for key, df in data.items():
-            if 'full_name' not in df.columns and 'driverId' in df.columns:
-                df = df.merge(drivers, left_on='driverId', right_on='id', how='left')
-                df = df.merge(constructors, left_on='constructorId', right_on='id', how='left')
-                data[key] = df
-        
-        pit_stops['durationSeconds'] = pd.to_numeric(pit_stops['time'], errors='coerce')
-        pit_stops = pit_stops.merge(drivers, left_on='driverId', right_on='id', how='left')
-        pit_stops.rename(columns={'full_name': 'Piloto'}, inplace=True)
-
-        return data, races, grands_prix, pit_stops
+        catalog = get_catalog()
+        races = catalog.table("races", columns=['raceId', 'year', 'grandPrixId'])
+        grands_prix = catalog.table("grands-prix", columns=['id', 'fullName'])
+        return races, grands_prix
     except FileNotFoundError as e:
         st.error(f"Error: No se encontró el archivo {e.filename}.")
-        return None, None, None, None
+        return None, None
+
+def load_names():
+    catalog = get_catalog()
+    drivers = catalog.table("drivers", columns=['id', 'name']).rename(columns={'name': 'full_name'})
+    constructors = catalog.table("constructors", columns=['id', 'fullName']).rename(columns={'fullName': 'team_full_name'})
+    return drivers, constructors
+
+@st.cache_data
+def load_race_pit_stops(race_id, version):
+    pit_stops = get_catalog().load("races-pit-stops", columns=['driverId', 'stop', 'timeMillis'], filters=[('raceId', '==', race_id)])
+    pit_stops['durationSeconds'] = pit_stops['timeMillis'].astype('float64') / 1000
+    drivers, _ = load_names()
+    pit_stops = pit_stops.merge(drivers, left_on='driverId', right_on='id', how='left')
+    pit_stops.rename(columns={'full_name': 'Piloto'}, inplace=True)
+    return pit_stops
+
+# --- Figuras (se construyen una vez por selección; ver cached_figure) ---
+def pit_stops_figure(race_id, gp_name, year, version):
+    pit_stops_in_race = load_race_pit_stops(race_id, version)
+    if pit_stops_in_race.empty or 'durationSeconds' not in pit_stops_in_race.columns:
+        return None
+
+    with span("resumen paradas"):
+        pit_stop_summary = pit_stops_in_race.groupby('Piloto').agg(
+            avg_duration=('durationSeconds', 'mean'),
+            num_stops=('stop', 'max')
+        ).reset_index().sort_values('avg_duration')
+
+    fig = px.bar(
+        pit_stop_summary,
+        x='Piloto',
+        y='avg_duration',
+        title=f"Tiempo Medio de Parada en Boxes en {gp_name} {year}",
+        labels={'Piloto': 'Piloto', 'avg_duration': 'Duración Media (s)'},
+        hover_data={'num_stops': True},
+        text_auto='.2f'
+    )
+    fig.update_layout(
+        xaxis_title='Piloto',
+        yaxis_title='Duración Media (s)',
+        title={'text': f"Tiempo Medio de Parada en Boxes en {gp_name} {year}", 'x':0.5, 'xanchor': 'center'},
+        margin=dict(l=40, r=40, t=60, b=40)
+    )
+    fig.update_traces(textposition='outside')
+    fig.update_layout(
+        xaxis={'categoryorder':'total descending'},
+        title_x=0.5,
+        hoverlabel=dict(
+            bgcolor="white",
+            font_size=12
+        )
+    )
+    fig.update_traces(hovertemplate='<b>%{x}</b><br>Tiempo Medio: %{y:.2f}s<br>Paradas: %{customdata[0]}<extra></extra>')
+    return fig
+
+def pit_stop_evolution_figure(stats, teams, years):
+    plot_data = pd.concat(
+        [stats.by_year(team, years).assign(Escudería=stats.names.get(team, team)) for team in teams],
+        ignore_index=True,
+    )
+    if plot_data.empty:
+        return None
+    fig = px.line(
+        plot_data,
+        x='year',
+        y='median',
+        color='Escudería',
+        error_y=plot_data['p90'] - plot_data['median'],
+        error_y_minus=plot_data['median'] - plot_data['p10'],
+        title="Mediana del tiempo en el pit lane por temporada (barras: p10-p90)",
+        labels={'year': 'Año', 'median': 'Mediana (s)'},
+        hover_data={'stops': True, 'p10': ':.2f', 'p90': ':.2f'},
+        markers=True
+    )
+    return fig
+
+def stop_counts_figure(stats, years):
+    stop_counts = stats.stop_counts(years)
+    if stop_counts.empty:
+        return None
+    plot_data = stop_counts.melt(
+        id_vars=['year', 'stopsPerDriver'], value_vars=list(STOP_COUNT_LABELS), var_name='paradas', value_name='share'
+    )
+    plot_data['paradas'] = plot_data['paradas'].map(STOP_COUNT_LABELS)
+    fig = px.bar(
+        plot_data,
+        x='year',
+        y='share',
+        color='paradas',
+        title="Pilotos según su número de paradas en cada carrera",
+        labels={'year': 'Año', 'share': 'Proporción de pilotos', 'paradas': 'Paradas', 'stopsPerDriver': 'Paradas por piloto'},
+        hover_data={'stopsPerDriver': ':.2f', 'share': ':.0%'},
+    )
+    fig.update_yaxes(tickformat='.0%')
+    return fig
+
+def pit_stops_history():
+    """Pestaña de análisis histórico de las paradas en boxes"""
+    stats = get_pit_stop_stats()
+    names = stats.names
+    first_year, last_year = stats.year_range()
+
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        team_options = sorted(stats.teams(), key=lambda id_: names.get(id_, id_))
+        selected_teams = st.multiselect(
+            "Escuderías:",
+            options=team_options,
+            default=[team for team in DEFAULT_PIT_STOP_TEAMS if team in team_options],
+            format_func=lambda id_: names.get(id_, id_),
+        )
+    with col2:
+        selected_years = st.slider(
+            "Temporadas:", min_value=first_year, max_value=last_year, value=(max(2010, first_year), last_year)
+        )
+    selected_years = tuple(selected_years)
+
+    with span("distribución paradas"):
+        rows = [(names.get(team, team), stats.distribution(team, selected_years)) for team in selected_teams]
+        rows.append(("Todas las escuderías", stats.distribution(None, selected_years)))
+    st.dataframe(
+        pd.DataFrame([
+            {'Escudería': name, 'Paradas': d['stops'], 'p10 (s)': d['p10'], 'Mediana (s)': d['median'], 'p90 (s)': d['p90']}
+            for name, d in rows
+        ]).round(2),
+        hide_index=True,
+        use_container_width=True,
+    )
+    st.caption(
+        "Tiempo desde la entrada hasta la salida del pit lane. Incluye las paradas durante banderas rojas, "
+        "por eso el p90 de algunas temporadas es muy alto; la mediana no se ve afectada."
+    )
+
+    if selected_teams:
+        with span("figura evolución paradas"):
+            fig = cached_figure(
+                ("resultados-paradas-evolucion", tuple(selected_teams), selected_years),
+                lambda: pit_stop_evolution_figure(stats, selected_teams, selected_years),
+            )
+        if fig is not None:
+            with span("plotly_chart"):
+                st.plotly_chart(fig, use_container_width=True)
+
+    with span("figura número de paradas"):
+        fig = cached_figure(("resultados-paradas-numero", selected_years), lambda: stop_counts_figure(stats, selected_years))
+    if fig is not None:
+        with span("plotly_chart"):
+            st.plotly_chart(fig, use_container_width=True)
+
+    st.subheader("Equipo de boxes más rápido de cada temporada")
+    fastest = stats.fastest_crews(selected_years)
+    st.dataframe(
+        pd.DataFrame({
+            'Año': fastest['year'],
+            'Escudería': fastest['name'],
+            'Mediana (s)': fastest['median'].round(2),
+            'p10 (s)': fastest['p10'].round(2),
+            'Paradas': fastest['stops'],
+        }),
+        hide_index=True,
+        use_container_width=True,
+    )
+    st.caption(f"Solo escuderías con al menos {MIN_CREW_STOPS} paradas en la temporada.")
 
-data_sessions, races, grands_prix, pit_stops = load_historical_data()
+version = dataset_version()
+races, grands_prix = load_historical_data(version)
+session_index = get_session_index()
 
 st.title("🏁 Resultados Históricos")
 st.text("Busca y visualiza los resultados de cualquier sesión en la historia de la Fórmula 1.")
 
-if data_sessions:
-    col1, col2, col3 = st.columns(3)
+results_tab, pit_stops_tab = st.tabs(["Resultados por sesión", "Paradas en boxes"])
 
-    with col1:
-        years = sorted(races['year'].unique(), reverse=True)
-        selected_year = st.selectbox("Selecciona el Año", options=years)
+with results_tab:
+    if races is not None:
+        col1, col2, col3 = st.columns(3)
 
-    with col2:
-        races_in_year = races[races['year'] == selected_year]
-        gp_in_year = grands_prix[grands_prix['id'].isin(races_in_year['grandPrixId'])]
-        gp_names = sorted(gp_in_year['fullName'].unique()) if not gp_in_year.empty else []
-        selected_gp_name = st.selectbox("Selecciona el Gran Premio", options=gp_names)
-
-    with col3:
-        if selected_gp_name:
-            gp_id = grands_prix[grands_prix['fullName'] == selected_gp_name]['id'].iloc[0]
-            race_info_row = races_in_year[races_in_year['grandPrixId'] == gp_id]
-            if not race_info_row.empty:
-                race_id = race_info_row.iloc[0]['raceId']
-
-                available_sessions = []
-                for session_name, df in data_sessions.items():
-                    if not df.empty and 'raceId' in df.columns and race_id in df['raceId'].unique():
-                        available_sessions.append(session_name)
-
-                selected_session = st.selectbox("Selecciona la Sesión", options=available_sessions) if available_sessions else None
+        with col1:
+            years = sorted(races['year'].unique(), reverse=True)
+            selected_year = st.selectbox("Selecciona el Año", options=years)
+
+        with col2:
+            races_in_year = races[races['year'] == selected_year]
+            gp_in_year = grands_prix[grands_prix['id'].isin(races_in_year['grandPrixId'])]
+            gp_names = sorted(gp_in_year['fullName'].unique()) if not gp_in_year.empty else []
+            selected_gp_name = st.selectbox("Selecciona el Gran Premio", options=gp_names)
+
+        with col3:
+            if selected_gp_name:
+                gp_id = grands_prix[grands_prix['fullName'] == selected_gp_name]['id'].iloc[0]
+                race_info_row = races_in_year[races_in_year['grandPrixId'] == gp_id]
+                if not race_info_row.empty:
+                    race_id = race_info_row.iloc[0]['raceId']
+
+                    race_id = int(race_id)
+                    available_sessions = session_index.sessions(race_id)
+
+                    selected_session = st.selectbox("Selecciona la Sesión", options=available_sessions) if available_sessions else None
+                else:
+                    race_id, selected_session = None, None
             else:
                 race_id, selected_session = None, None
-        else:
-            race_id, selected_session = None, None
 
-    if race_id and selected_session:
-        st.subheader(f"Resultados de {selected_session} - {selected_gp_name} {selected_year}")
+        if race_id and selected_session:
+            st.subheader(f"Resultados de {selected_session} - {selected_gp_name} {selected_year}")
 
-        session_df = data_sessions[selected_session]
-        results_df = session_df[session_df['raceId'] == race_id].copy()
+            with span("resultados de la sesión"):
+                results_df = session_index.results(selected_session, race_id)
 
-        if all(col in results_df.columns for col in ['positionNumber', 'time', 'gap']):
-            results_df['time_or_gap'] = np.where(
-                results_df['positionNumber'] == 1,
-                results_df['time'],
-                results_df['gap']
-            )
-        elif 'time' in results_df.columns:
-            results_df['time_or_gap'] = results_df['time']
-
-        columns_to_show = {
-            'positionText': 'Pos.',
-            'driverNumber': 'Nº',
-            'full_name': 'Piloto',
-            'team_full_name': 'Escudería',
-            'time_or_gap': 'Tiempo/Gap',
-            'laps': 'Vueltas',
-            'points': 'Puntos'
-        }
-
-        display_columns_map = {original: new for original, new in columns_to_show.items() if original in results_df.columns}
-
-        st.dataframe(results_df[list(display_columns_map.keys())].rename(columns=display_columns_map), use_container_width=True, hide_index=True)
-
-        st.markdown("---")
-        
-        pit_stops_in_race = pit_stops[pit_stops['raceId'] == race_id]
-        if not pit_stops_in_race.empty and 'durationSeconds' in pit_stops_in_race.columns:
-            st.subheader("Análisis de Paradas en Boxes (Pit Stops)")
-
-            pit_stop_summary = pit_stops_in_race.groupby('Piloto').agg(
-                avg_duration=('durationSeconds', 'mean'),
-                num_stops=('stop', 'max')
-            ).reset_index().sort_values('avg_duration')
-
-            fig = px.bar(
-                pit_stop_summary,
-                x='Piloto',
-                y='avg_duration',
-                title=f"Tiempo Medio de Parada en Boxes en {selected_gp_name} {selected_year}",
-                labels={'Piloto': 'Piloto', 'avg_duration': 'Duración Media (s)'},
-                hover_data={'num_stops': True},
-                text_auto='.2f'
-            )
-            fig.update_layout(
-                xaxis_title='Piloto',
-                yaxis_title='Duración Media (s)',
-                title={'text': f"Tiempo Medio de Parada en Boxes en {selected_gp_name} {selected_year}", 'x':0.5, 'xanchor': 'center'},
-                margin=dict(l=40, r=40, t=60, b=40)
-            )
-            fig.update_traces(textposition='outside')
-            fig.update_layout(
-                xaxis={'categoryorder':'total descending'},
-                title_x=0.5,
-                hoverlabel=dict(
-                    bgcolor="white",
-                    font_size=12
+            if all(col in results_df.columns for col in ['positionNumber', 'time', 'gap']):
+                results_df['time_or_gap'] = np.where(
+                    results_df['positionNumber'].eq(1).fillna(False),
+                    results_df['time'],
+                    results_df['gap']
                 )
-            )
-            fig.update_traces(hovertemplate='<b>%{x}</b><br>Tiempo Medio: %{y:.2f}s<br>Paradas: %{customdata[0]}<extra></extra>')
+            elif 'time' in results_df.columns:
+                results_df['time_or_gap'] = results_df['time']
 
-            st.plotly_chart(fig, use_container_width=True)
+            columns_to_show = {
+                'positionText': 'Pos.',
+                'driverNumber': 'Nº',
+                'full_name': 'Piloto',
+                'team_full_name': 'Escudería',
+                'time_or_gap': 'Tiempo/Gap',
+                'laps': 'Vueltas',
+                'points': 'Puntos'
+            }
+
+            display_columns_map = {original: new for original, new in columns_to_show.items() if original in results_df.columns}
+
+            st.dataframe(results_df[list(display_columns_map.keys())].rename(columns=display_columns_map), use_container_width=True, hide_index=True)
+
+            st.markdown("---")
+
+            with span("figura paradas"):
+                fig = cached_figure(
+                    ("resultados-paradas", race_id),
+                    lambda: pit_stops_figure(race_id, selected_gp_name, selected_year, version),
+                )
+            if fig is not None:
+                st.subheader("Análisis de Paradas en Boxes (Pit Stops)")
+                with span("plotly_chart"):
+                    st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("No hay datos detallados sobre paradas en boxes para esta carrera.")
+
+        elif not selected_gp_name:
+            st.info("Por favor, selecciona un Gran Premio.")
         else:
-            st.info("No hay datos detallados sobre paradas en boxes para esta carrera.")
+            st.info("No hay sesiones disponibles para este Gran Premio o año.")
+
+with pit_stops_tab:
+    pit_stops_history()
 
-    elif not selected_gp_name:
-        st.info("Por favor, selecciona un Gran Premio.")
-    else:
-        st.info("No hay sesiones disponibles para este Gran Premio o año.")
\ No newline at end of file
+perf_panel()
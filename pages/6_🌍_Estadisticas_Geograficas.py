@@ -1,9 +1,8 @@
 import streamlit as st
-import pandas as pd
 import folium
 from streamlit_folium import st_folium
-import geopandas as gpd
-from pages.functions import load_world_geometry, fuzzy_match_countries
+from branca.colormap import linear
+from pages.functions import CUBE_COUNT_METRIC, get_country_cube, load_world_layer, perf_panel, perf_start, span, world_layer
 
 # --- Configuración de la Página ---
 st.set_page_config(
@@ -11,28 +10,14 @@ st.set_page_config(
     page_icon="🌍",
     layout="wide",
 )
+perf_start("geografia")
 
 st.title("🌍 Estadísticas Geográficas de la F1")
 st.markdown("Visualiza la distribución mundial de talento y éxito en la Fórmula 1.")
 
-@st.cache_data
-def load_data():
-    drivers = pd.read_csv("database/f1db-drivers.csv")
-    constructors = pd.read_csv("database/f1db-constructors.csv")
-    countries = pd.read_csv("database/f1db-countries.csv")
-    
-    drivers = drivers.merge(countries[['id', 'name']], left_on='nationalityCountryId', right_on='id', how='left')
-    drivers.rename(columns={'name_y': 'countryName'}, inplace=True)
-    
-    constructors = constructors.merge(countries[['id', 'name']], left_on='countryId', right_on='id', how='left')
-    constructors.rename(columns={'name_y': 'countryName'}, inplace=True)
-
-    world_geo = load_world_geometry()
-    
-    return drivers, constructors, world_geo
-
 with st.spinner("Cargando datos y geometría..."):
-    drivers_df, constructors_df, world_geo = load_data()
+    cube = get_country_cube()
+    world_geo = load_world_layer()
     
 
 if world_geo is None:
@@ -50,7 +35,7 @@ else:
             "Victorias Totales": "totalRaceWins",
             "Pole Positions Totales": "totalPolePositions",
             "Podios Totales": "totalPodiums",
-            "Número de Pilotos": "id"
+            "Número de Pilotos": CUBE_COUNT_METRIC
         }
     else: # Escuderías
         metric_options = {
@@ -58,7 +43,7 @@ else:
             "Victorias Totales": "totalRaceWins",
             "Pole Positions Totales": "totalPolePositions",
             "Podios Totales": "totalPodiums",
-            "Número de Escuderías": "id"
+            "Número de Escuderías": CUBE_COUNT_METRIC
         }
         
     selected_metric_name = st.sidebar.selectbox(
@@ -67,40 +52,49 @@ else:
     )
     selected_metric_col = metric_options[selected_metric_name]
 
-    st.header(f"Mapa de Coropletas: {selected_metric_name} por {entity_type}")
+    first_year, last_year = cube.year_range()
+    start_year, end_year = st.sidebar.slider(
+        "Temporadas:",
+        min_value=first_year,
+        max_value=last_year,
+        value=(first_year, last_year),
+    )
 
-    if entity_type == "Pilotos":
-        if selected_metric_col == "id": 
-            data_agg = drivers_df.groupby('countryName').size().reset_index(name=selected_metric_col)
-        else:
-            data_agg = drivers_df.groupby('countryName')[selected_metric_col].sum().reset_index()
-    else: # Escuderías
-        if selected_metric_col == "id": 
-            data_agg = constructors_df.groupby('countryName').size().reset_index(name=selected_metric_col)
-        else:
-            data_agg = constructors_df.groupby('countryName')[selected_metric_col].sum().reset_index()
+    st.header(f"Mapa de Coropletas: {selected_metric_name} por {entity_type}")
+    if (start_year, end_year) != (first_year, last_year):
+        st.caption(f"Temporadas {start_year}–{end_year}")
 
-    world_map_data = world_geo.merge(data_agg, left_on="NAME", right_on="countryName", how="left")
-    world_map_data[selected_metric_col] = world_map_data[selected_metric_col].fillna(0)
+    # Consulta directa al cubo precalculado; la geometría es la capa mundial cacheada
+    entity = "drivers" if entity_type == "Pilotos" else "constructors"
+    with span("consulta al cubo"):
+        values = cube.values(entity, selected_metric_col, start_year, end_year)
+    world_map_data = world_layer(values, selected_metric_col)
 
-    m = folium.Map(location=[20, 0], zoom_start=2, tiles="CartoDB positron")
+    with span("mapa coropletas"):
+        m = folium.Map(location=[20, 0], zoom_start=2, tiles="CartoDB positron")
 
-    choropleth = folium.Choropleth(
-        geo_data=world_map_data,
-        data=world_map_data,
-        columns=['NAME', selected_metric_col],
-        key_on='feature.properties.NAME',
-        fill_color='YlOrRd', 
-        fill_opacity=0.7,
-        line_opacity=0.2,
-        legend_name=f"{selected_metric_name} por País",
-        highlight=True
-    ).add_to(m)
+        colormap = linear.YlOrRd_09.scale(0, max(max(values.values(), default=0), 1)).to_step(6)
+        colormap.caption = f"{selected_metric_name} por País"
 
-    folium.GeoJsonTooltip(
-        fields=['NAME', selected_metric_col],
-        aliases=['País:', f'{selected_metric_name}:'],
-        style=("background-color: white; color: #333333; font-family: arial; font-size: 12px; padding: 10px;")
-    ).add_to(choropleth.geojson)
+        folium.GeoJson(
+            world_map_data,
+            style_function=lambda feature: {
+                'fillColor': colormap(feature['properties'][selected_metric_col]),
+                'color': 'black',
+                'weight': 1,
+                'opacity': 0.2,
+                'fillOpacity': 0.7,
+            },
+            highlight_function=lambda feature: {'weight': 3, 'fillOpacity': 0.9},
+            tooltip=folium.GeoJsonTooltip(
+                fields=['NAME', selected_metric_col],
+                aliases=['País:', f'{selected_metric_name}:'],
+                style=("background-color: white; color: #333333; font-family: arial; font-size: 12px; padding: 10px;")
+            ),
+        ).add_to(m)
+        colormap.add_to(m)
     
-    st_folium(m, width=1200, height=600)
\ No newline at end of file
+    with span("st_folium"):
+        st_folium(m, width=1200, height=600)
+
+perf_panel()
@@ -1,18 +1,2125 @@
-import requests
+import numpy as np
 import pandas as pd
 import streamlit as st
 import time
-from bs4 import BeautifulSoup
 import urllib.parse
-import pycountry
-from difflib import get_close_matches
-import geopandas as gpd
-import io
+import os
+import json
+import logging
+import contextlib
+import functools
+import hashlib
+import inspect
+import shutil
+import tempfile
+import sqlite3
+import threading
+from collections import Counter, OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+# geopandas/pyogrio/shapely, requests, BeautifulSoup y pycountry se importan dentro de
+# las funciones que los usan: la portada y las páginas sin mapas ni fotos no pagan su
+# importación (más de medio segundo en frío).
+
+
+if int(pd.__version__.split(".")[0]) < 3:
+    # Copy-on-Write: las vistas que entrega el catálogo nunca modifican la tabla compartida
+    pd.set_option("mode.copy_on_write", True)
+
+
+# --- Medición de tiempos ---
+# Con F1_PERF=1 se miden todos los reruns; con ?perf=1 en la URL, solo los de esa
+# sesión (?perf=0 lo desactiva). Desactivado, span() solo consulta un thread-local.
+PERF_ENABLED = os.environ.get("F1_PERF", "") not in ("", "0")
+# Fichero con los contadores en formato Prometheus (para el textfile collector de node_exporter)
+PERF_METRICS_FILE = os.environ.get("F1_PERF_METRICS_FILE")
+PERF_LOG = logging.getLogger("f1_dashboard.perf")
+if not PERF_LOG.handlers:
+    # Una línea JSON por rerun en stderr, junto al log de Streamlit
+    _perf_handler = logging.StreamHandler()
+    _perf_handler.setFormatter(logging.Formatter("%(message)s"))
+    PERF_LOG.addHandler(_perf_handler)
+    PERF_LOG.setLevel(logging.INFO)
+    PERF_LOG.propagate = False
+
+
+class _PerfState(threading.local):
+    """Tramos del rerun en curso (cada sesión ejecuta sus reruns en su propio hilo)"""
+    spans = None        # None: medición desactivada
+    depth = 0
+    started = 0.0
+    page = None
+
+
+_perf_local = _PerfState()
+_perf_counters = defaultdict(lambda: [0, 0.0])   # (tipo, nombre) -> [llamadas, segundos]
+_perf_lock = threading.Lock()
+
+
+class _Span:
+    __slots__ = ("name", "start", "depth")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.depth = _perf_local.depth
+        _perf_local.depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        _perf_local.depth = self.depth
+        _perf_local.spans.append((self.name, self.depth, self.start - _perf_local.started, elapsed))
+        return False
+
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+def span(name):
+    """Mide el bloque with como un tramo del rerun actual (no hace nada si la medición está desactivada)"""
+    if _perf_local.spans is None:
+        return _NO_SPAN
+    return _Span(name)
+
+
+def timed(name):
+    """Decorador: cada llamada a la función es un tramo (no usar debajo de st.cache_data)"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def perf_start(page):
+    """Empieza a medir un rerun de la página, si la medición está activada para esta sesión"""
+    if "perf" in st.query_params:
+        st.session_state["perf"] = st.query_params["perf"] not in ("0", "false")
+    enabled = PERF_ENABLED or st.session_state.get("perf", False)
+    _perf_local.spans = [] if enabled else None
+    _perf_local.depth = 0
+    _perf_local.page = page
+    _perf_local.started = time.perf_counter()
+
+
+def _record_rerun(page, total, spans):
+    with _perf_lock:
+        _perf_counters[("rerun", page)][0] += 1
+        _perf_counters[("rerun", page)][1] += total
+        for name, _, _, elapsed in spans:
+            _perf_counters[("span", name)][0] += 1
+            _perf_counters[("span", name)][1] += elapsed
+
+
+def perf_metrics():
+    """Contadores acumulados del proceso en el formato de texto de Prometheus"""
+    lines = []
+    with _perf_lock:
+        counters = sorted(_perf_counters.items())
+    for kind, label in (("rerun", "page"), ("span", "span")):
+        for metric, position, fmt in (("seconds", 1, "{:.6f}"), ("calls", 0, "{}")):
+            family = f"f1_dashboard_{kind}_{metric}_total"
+            lines.append(f"# TYPE {family} counter")
+            for (counter_kind, name), values in counters:
+                if counter_kind == kind:
+                    lines.append(f"{family}{{{label}={json.dumps(name, ensure_ascii=False)}}} {fmt.format(values[position])}")
+    return "\n".join(lines) + "\n"
+
+
+def _write_perf_metrics(path):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(perf_metrics())
+    os.replace(tmp, path)
+
+
+def perf_panel():
+    """
+    Cierra la medición del rerun: la suma a los contadores, la escribe en el log
+    (una línea JSON por rerun) y la muestra en la barra lateral.
+    """
+    spans = _perf_local.spans
+    if spans is None:
+        return
+    total = time.perf_counter() - _perf_local.started
+    page = _perf_local.page
+    _perf_local.spans = None
+    spans.sort(key=lambda s: s[2])
+    _record_rerun(page, total, spans)
+    PERF_LOG.info(json.dumps({
+        "event": "rerun",
+        "page": page,
+        "total_ms": round(total * 1000, 1),
+        "spans": [
+            {"name": name, "depth": depth, "start_ms": round(start * 1000, 1), "ms": round(elapsed * 1000, 1)}
+            for name, depth, start, elapsed in spans
+        ],
+    }, ensure_ascii=False))
+    if PERF_METRICS_FILE:
+        _write_perf_metrics(PERF_METRICS_FILE)
+
+    with st.sidebar.expander("⏱️ Rendimiento", expanded=True):
+        st.metric("Rerun", f"{total * 1000:.0f} ms")
+        st.dataframe(
+            pd.DataFrame({
+                "tramo": ["· " * depth + name for name, depth, _, _ in spans],
+                "ms": [round(elapsed * 1000, 1) for _, _, _, elapsed in spans],
+            }),
+            hide_index=True,
+            use_container_width=True,
+        )
+        st.caption("Solo se miden las cargas y cálculos que no estaban ya en caché.")
+
+
+# --- Almacén columnar ---
+DATABASE_DIR = "database"
+STORE_DIR = os.path.join("data", "store")
+MANIFEST_FILE = "manifest.json"
+# Se incrementa cuando cambia el formato de los Parquet (esquema, orden...) para forzar la recompilación
+STORE_FORMAT_VERSION = 3
+
+# Operadores admitidos en los filtros de load_table (mismo formato que pyarrow)
+FILTER_OPERATORS = {
+    "==": lambda col, value: col == value,
+    "=": lambda col, value: col == value,
+    "!=": lambda col, value: col != value,
+    "<": lambda col, value: col < value,
+    "<=": lambda col, value: col <= value,
+    ">": lambda col, value: col > value,
+    ">=": lambda col, value: col >= value,
+    "in": lambda col, value: col.isin(value),
+    "not in": lambda col, value: ~col.isin(value),
+}
+
+
+# --- Esquema de tipos ---
+# Columnas de identificadores -> tabla de referencia cuyos ids forman las categorías.
+# Todas las tablas comparten el mismo CategoricalDtype para cada tipo de id, así que
+# los merge/isin/groupby entre tablas trabajan con códigos enteros y no con cadenas.
+# La columna id de la propia tabla de referencia se queda como texto: sus valores
+# son todos distintos y una categoría por fila solo añadiría los códigos.
+ID_COLUMNS = {
+    "driverId": "drivers",
+    "parentDriverId": "drivers",
+    "teammateId": "drivers",
+    "constructorId": "constructors",
+    "parentConstructorId": "constructors",
+    "engineManufacturerId": "engine-manufacturers",
+    "tyreManufacturerId": "tyre-manufacturers",
+    "countryId": "countries",
+    "nationalityCountryId": "countries",
+    "countryOfBirthCountryId": "countries",
+    "secondNationalityCountryId": "countries",
+    "continentId": "continents",
+    "grandPrixId": "grands-prix",
+    "circuitId": "circuits",
+    "chassisId": "chassis",
+    "engineId": "engines",
+    "entrantId": "entrants",
+}
+
+# Enteros pequeños (nullable, porque muchas posiciones están vacías)
+COLUMN_DTYPES = {
+    "raceId": "int32",
+    "year": "Int16",
+    "yearFrom": "Int16",
+    "yearTo": "Int16",
+    "round": "Int8",
+    "stop": "Int8",
+    "pitStops": "Int8",
+    "lap": "Int16",
+    "laps": "Int16",
+    "gapLaps": "Int16",
+    "scheduledLaps": "Int16",
+    "turns": "Int16",
+    "driverNumber": "Int16",
+    "permanentNumber": "Int16",
+    "positionDisplayOrder": "Int16",
+    "positionNumber": "Int16",
+    "positionsGained": "Int16",
+    "gridPositionNumber": "Int16",
+    "gridPenaltyPositions": "Int16",
+    "qualificationPositionNumber": "Int16",
+    "bestChampionshipPosition": "Int16",
+    "bestStartingGridPosition": "Int16",
+    "bestRaceResult": "Int16",
+}
+
+# Los tiempos en milisegundos caben en int32 (hasta ~24 días)
+MILLIS_DTYPE = "Int32"
+
+
+@lru_cache(maxsize=None)
+def shared_id_dtype(reference_table, database_dir=DATABASE_DIR):
+    """CategoricalDtype con todos los ids de una tabla de referencia (drivers, constructors...)"""
+    ids = pd.read_csv(table_csv_path(reference_table, database_dir), usecols=["id"])["id"]
+    return pd.CategoricalDtype(sorted(ids.dropna().astype(str).unique()))
+
+
+def table_schema(table, columns, database_dir=DATABASE_DIR):
+    """Tipos declarados para las columnas de una tabla f1db"""
+    schema = {}
+    for column in columns:
+        if column in ID_COLUMNS:
+            schema[column] = shared_id_dtype(ID_COLUMNS[column], database_dir)
+        elif column in COLUMN_DTYPES:
+            schema[column] = COLUMN_DTYPES[column]
+        elif column.endswith("Millis"):
+            schema[column] = MILLIS_DTYPE
+    return schema
+
+
+def apply_schema(table, df, database_dir=DATABASE_DIR):
+    """Convierte un DataFrame de f1db a los tipos compactos del esquema"""
+    converted = {}
+    for column, dtype in table_schema(table, df.columns, database_dir).items():
+        values = df[column]
+        if values.dtype == dtype:
+            continue
+        if isinstance(dtype, pd.CategoricalDtype):
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype(str).where(values.notna())
+            as_category = values.astype(dtype)
+            unknown = values.notna() & as_category.isna()
+            if unknown.any():
+                # Ids que no están en la tabla de referencia: se añaden para no perderlos
+                extra = pd.Index(values[unknown].astype(str).unique())
+                as_category = values.astype(pd.CategoricalDtype(dtype.categories.union(extra)))
+            converted[column] = as_category
+        else:
+            converted[column] = values.astype(dtype)
+    if not converted:
+        return df
+    return df.assign(**converted)
+
+
+SHARED_IDS_ROW = "(ids compartidos)"
+
+
+def schema_memory_report(tables=None, database_dir=DATABASE_DIR):
+    """
+    Memoria de cada tabla con los tipos por defecto de read_csv frente al esquema
+    compacto. Las categorías de los CategoricalDtype compartidos están una sola vez
+    en memoria: a cada tabla se le cuentan solo sus códigos y las categorías van en
+    una fila aparte (SHARED_IDS_ROW), para que el total sea la memoria real.
+    """
+    rows, shared = [], {}
+    for table in tables or list_tables(database_dir):
+        df = pd.read_csv(table_csv_path(table, database_dir), low_memory=False)
+        before = int(df.memory_usage(index=True, deep=True).sum())
+        compact = apply_schema(table, df, database_dir)
+        after = int(compact.memory_usage(index=True, deep=True).sum())
+        for column in compact.columns.intersection(list(ID_COLUMNS)):
+            dtype = shared_id_dtype(ID_COLUMNS[column], database_dir)
+            if compact[column].dtype == dtype:
+                categories = int(dtype.categories.memory_usage(deep=True))
+                after -= categories
+                shared[ID_COLUMNS[column]] = categories
+        rows.append({"table": table, "rows": len(df), "default_bytes": before, "compact_bytes": after})
+    if shared:
+        rows.append({"table": SHARED_IDS_ROW, "rows": 0, "default_bytes": 0, "compact_bytes": sum(shared.values())})
+    report = pd.DataFrame(rows, columns=["table", "rows", "default_bytes", "compact_bytes"])
+    default_bytes = report["default_bytes"].where(report["default_bytes"] > 0)
+    report["saving"] = 1 - report["compact_bytes"] / default_bytes
+    return report.sort_values("default_bytes", ascending=False, ignore_index=True)
+
+
+def table_csv_path(table, database_dir=DATABASE_DIR):
+    """Ruta del CSV original de f1db para una tabla (p. ej. 'races-pit-stops')"""
+    return os.path.join(database_dir, f"f1db-{table}.csv")
+
+
+def table_store_path(table, store_dir=STORE_DIR):
+    """Ruta del dataset Parquet compilado para una tabla"""
+    return os.path.join(store_dir, table)
+
+
+def list_tables(database_dir=DATABASE_DIR):
+    """Nombres de todas las tablas f1db disponibles en la carpeta de CSV"""
+    names = []
+    for file_name in sorted(os.listdir(database_dir)):
+        if file_name.startswith("f1db-") and file_name.endswith(".csv"):
+            names.append(file_name[len("f1db-"):-len(".csv")])
+    return names
+
+
+def file_digest(path):
+    """SHA-256 del contenido de un fichero, leído por bloques"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _combined_digest(parts):
+    return hashlib.sha256("\n".join(str(part) for part in parts).encode()).hexdigest()
+
+
+# --- Versiones del almacén ---
+# El manifiesto lista, para cada tabla, el hash de sus entradas y los ficheros
+# Parquet que la forman. Los ficheros nunca se sobrescriben (cada compilación o
+# actualización escribe partes nuevas) y el manifiesto se sustituye de forma
+# atómica, así que cada versión sigue siendo legible mientras alguien la use.
+_manifest_cache = {}
+_manifest_lock = threading.Lock()
+
+
+def read_manifest(store_dir=STORE_DIR):
+    """Manifiesto actual del almacén ({} si no hay almacén); solo se relee si el fichero cambia"""
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return {}
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _manifest_lock:
+        cached = _manifest_cache.get(path)
+        if cached is None or cached[0] != key:
+            with open(path, encoding="utf-8") as f:
+                cached = _manifest_cache[path] = (key, json.load(f))
+        return cached[1]
+
+
+def dataset_version(store_dir=STORE_DIR):
+    """Identificador de la versión de los datos ('csv' si se leen directamente los CSV)"""
+    return read_manifest(store_dir).get("version", "csv")
+
+
+def store_files(table, manifest=None, store_dir=STORE_DIR):
+    """Ficheros Parquet de una tabla en una versión del almacén (None si no está compilada)"""
+    manifest = read_manifest(store_dir) if manifest is None else manifest
+    entry = manifest.get("tables", {}).get(table)
+    if entry is None:
+        return None
+    return [os.path.join(table_store_path(table, store_dir), file_name) for file_name in entry["files"]]
+
+
+def _write_manifest(entries, store_dir, previous):
+    """Publica una nueva versión y borra las partes que ya no usa ni esta ni la anterior"""
+    manifest = {
+        "version": _combined_digest(sorted((name, entry["key"]) for name, entry in entries.items()))[:16],
+        "tables": entries,
+    }
+    os.makedirs(store_dir, exist_ok=True)
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    with open(path + ".part", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".part", path)
+
+    keep = {
+        (name, file_name)
+        for version in (manifest, previous)
+        for name, entry in version.get("tables", {}).items()
+        for file_name in entry["files"]
+    }
+    for name in os.listdir(store_dir):
+        path = table_store_path(name, store_dir)
+        if not os.path.isdir(path):
+            continue
+        for file_name in os.listdir(path):
+            if file_name.startswith("part-") and (name, file_name) not in keep:
+                os.remove(os.path.join(path, file_name))
+    return manifest
+
+
+def _write_part(df, table, store_dir):
+    """Escribe df como una parte nueva de la tabla y devuelve el nombre del fichero"""
+    if "raceId" in df.columns:
+        df = df.sort_values("raceId", kind="stable")
+    path = table_store_path(table, store_dir)
+    os.makedirs(path, exist_ok=True)
+    numbers = [int(name[5:9]) for name in os.listdir(path) if name.startswith("part-") and name[5:9].isdigit()]
+    file_name = f"part-{max(numbers, default=-1) + 1:04d}.parquet"
+    df.to_parquet(os.path.join(path, file_name + ".tmp"), index=False, row_group_size=4096)
+    os.replace(os.path.join(path, file_name + ".tmp"), os.path.join(path, file_name))
+    return file_name
+
+
+def _table_entry(key, df, files):
+    max_race_id = int(df["raceId"].max()) if "raceId" in df.columns and len(df) else None
+    return {"key": key, "files": files, "rows": len(df), "maxRaceId": max_race_id}
+
+
+def _compile_tables(entries, tables, database_dir, store_dir, force):
+    """Compila en entries las tablas y vistas cuyas entradas han cambiado; devuelve {tabla: filas o None}"""
+    csv_digests = {}
+
+    def csv_digest(table):
+        if table not in csv_digests:
+            csv_digests[table] = file_digest(table_csv_path(table, database_dir))
+        return csv_digests[table]
+
+    def up_to_date(name, key):
+        return not force and entries.get(name, {}).get("key") == key
+
+    built = {}
+    available = list_tables(database_dir)
+    for table in tables or available:
+        if table in STORE_VIEWS:
+            continue  # se compila como vista, a partir de su CSV y de las tablas que une
+        key = _combined_digest([STORE_FORMAT_VERSION, csv_digest(table)])
+        if up_to_date(table, key):
+            built[table] = None
+            continue
+        df = apply_schema(table, pd.read_csv(table_csv_path(table, database_dir), low_memory=False), database_dir)
+        entries[table] = _table_entry(key, df, [_write_part(df, table, store_dir)])
+        built[table] = len(df)
+
+    source = SourceTables(database_dir, store_dir, manifest={"tables": entries})
+    view_keys = {}
+    for view, (inputs, build) in STORE_VIEWS.items():
+        parts = [STORE_FORMAT_VERSION, inspect.getsource(build)]
+        for name in inputs:
+            if name in view_keys and name != view:
+                parts.append(view_keys[name])
+            elif name in available:
+                parts.append(csv_digest(name))
+            else:
+                break
+        else:
+            view_keys[view] = key = _combined_digest(parts)
+            if tables and view not in tables and not set(inputs) & set(tables):
+                continue
+            if up_to_date(view, key):
+                built[view] = None
+                continue
+            df = source.build_view(view)
+            entries[view] = _table_entry(key, df, [_write_part(df, view, store_dir)])
+            built[view] = len(df)
+    return built
+
+
+def build_store(tables=None, database_dir=DATABASE_DIR, store_dir=STORE_DIR, force=False):
+    """
+    Compila los CSV de f1db en datasets Parquet con el esquema compacto (uno por tabla)
+    y materializa las vistas desnormalizadas de STORE_VIEWS.
+    Las tablas por carrera se ordenan por raceId y se escriben en row groups
+    pequeños para que los filtros sobre raceId puedan saltarse bloques enteros.
+
+    La compilación es incremental: el manifiesto guarda el hash del contenido de
+    las entradas de cada tabla/vista y solo se recompila lo que ha cambiado (o
+    todo, con force=True). Devuelve {tabla: número de filas}, con None para las
+    que no hacía falta recompilar.
+    """
+    previous = read_manifest(store_dir)
+    entries = {name: dict(entry) for name, entry in previous.get("tables", {}).items()}
+    built = _compile_tables(entries, tables, database_dir, store_dir, force)
+    if not previous or any(rows is not None for rows in built.values()):
+        _write_manifest(entries, store_dir, previous)
+    return built
+
+
+def _race_fingerprints(df):
+    """Número de filas y hash del contenido de cada carrera"""
+    hashes = pd.util.hash_pandas_object(df, index=False)
+    return hashes.groupby(df["raceId"].to_numpy()).agg(["size", "sum"])
+
+
+def _new_race_rows(table, csv_path, entry, database_dir, store_dir):
+    """
+    Filas de las carreras nuevas de un CSV, si las carreras que ya están en el
+    almacén no han cambiado (mismas filas, mismo contenido). None si hay que
+    recompilar la tabla entera.
+    """
+    new = apply_schema(table, pd.read_csv(csv_path, low_memory=False), database_dir)
+    old = load_table(table, manifest={"tables": {table: entry}}, store_dir=store_dir)
+    if list(new.columns) != list(old.columns):
+        return None
+    kept = new[new["raceId"] <= entry["maxRaceId"]]
+    try:
+        kept = kept.astype(old.dtypes.to_dict())
+        added = new[new["raceId"] > entry["maxRaceId"]].astype(old.dtypes.to_dict())
+    except (TypeError, ValueError):
+        return None
+    if not _race_fingerprints(kept).equals(_race_fingerprints(old)):
+        return None
+    return added
+
+
+def refresh_store(source_dir, database_dir=DATABASE_DIR, store_dir=STORE_DIR):
+    """
+    Incorpora una nueva entrega de CSV de f1db (por ejemplo, a mitad de temporada).
+
+    - Las tablas cuyo CSV no ha cambiado (mismo hash) no se tocan.
+    - En las tablas por carrera, si las carreras ya compiladas siguen igual, las
+      carreras nuevas se añaden como una parte más, sin reescribir la tabla.
+    - El resto de tablas cambiadas y las vistas que dependen de ellas se recompilan.
+    - La nueva versión se publica de golpe al sustituir el manifiesto: los
+      servidores en marcha la ven en su siguiente rerun, sin reiniciar.
+
+    Devuelve {tabla: 'appended' | 'rebuilt'} con las tablas que han cambiado.
+    """
+    previous = read_manifest(store_dir)
+    entries = {name: dict(entry) for name, entry in previous.get("tables", {}).items()}
+    changes = {}
+    for file_name in sorted(os.listdir(source_dir)):
+        if not (file_name.startswith("f1db-") and file_name.endswith(".csv")):
+            continue
+        table = file_name[len("f1db-"):-len(".csv")]
+        source, target = os.path.join(source_dir, file_name), table_csv_path(table, database_dir)
+        digest = file_digest(source)
+        if os.path.exists(target) and file_digest(target) == digest:
+            continue
+        changes[table] = "rebuilt"
+        entry = entries.get(table)
+        if table not in STORE_VIEWS and entry and entry.get("maxRaceId") is not None:
+            added = _new_race_rows(table, source, entry, database_dir, store_dir)
+            if added is not None:
+                files = entry["files"] + ([_write_part(added, table, store_dir)] if len(added) else [])
+                entries[table] = {
+                    "key": _combined_digest([STORE_FORMAT_VERSION, digest]),
+                    "files": files,
+                    "rows": entry["rows"] + len(added),
+                    "maxRaceId": max(entry["maxRaceId"], int(added["raceId"].max()) if len(added) else 0),
+                }
+                changes[table] = "appended"
+        shutil.copyfile(source, target + ".part")
+        os.replace(target + ".part", target)
+
+    if set(changes) & set(ID_COLUMNS.values()):
+        shared_id_dtype.cache_clear()
+    if changes:
+        _compile_tables(entries, list(changes), database_dir, store_dir, force=False)
+        for view in STORE_VIEWS:
+            if entries.get(view, {}).get("key") != previous.get("tables", {}).get(view, {}).get("key"):
+                changes[view] = "rebuilt"
+        _write_manifest(entries, store_dir, previous)
+    return changes
+
+
+def table_columns(table, manifest=None):
+    """Columnas de una tabla sin leer sus datos"""
+    files = store_files(table, manifest)
+    if files:
+        import pyarrow.parquet as pq
+        return pq.read_schema(files[0]).names
+    return pd.read_csv(table_csv_path(table), nrows=0).columns.tolist()
+
+
+def table_row_count(table, manifest=None, store_dir=STORE_DIR):
+    """Filas de una tabla sin leer sus datos: las del manifiesto o, sin almacén, las del CSV"""
+    manifest = read_manifest(store_dir) if manifest is None else manifest
+    entry = manifest.get("tables", {}).get(table)
+    if entry is not None:
+        return entry["rows"]
+    return len(pd.read_csv(table_csv_path(table), usecols=[0]))
+
+
+def _apply_filters(df, filters):
+    """Aplica en pandas los mismos filtros que se pasarían a pyarrow"""
+    for column, op, value in filters or []:
+        df = df[FILTER_OPERATORS[op](df[column], value)]
+    return df.reset_index(drop=True)
+
+
+def load_table(table, columns=None, filters=None, manifest=None, store_dir=STORE_DIR):
+    """
+    Lee una tabla de f1db desde el almacén columnar, o desde el CSV si aún no se ha compilado.
+
+    - columns: lista de columnas a leer (proyección).
+    - filters: lista de tuplas (columna, operador, valor), p. ej. [("raceId", "==", 1100)].
+      Con Parquet el filtro se resuelve al leer, sin cargar el resto de filas.
+    - manifest: versión del almacén que se lee (por defecto, la actual).
+    """
+    files = store_files(table, manifest, store_dir)
+    if files:
+        # Parquet guarda las categorías de cada fichero; se recodifican a las compartidas
+        return apply_schema(table, pd.read_parquet(files, columns=columns, filters=filters))
+    if table in STORE_VIEWS:
+        # Vista sin compilar: se construye desde los CSV originales
+        df = _apply_filters(SourceTables().build_view(table), filters)
+        return df[list(columns)] if columns is not None else df
+    usecols = None
+    if columns is not None:
+        # Las columnas usadas en los filtros también hay que leerlas del CSV
+        usecols = list(dict.fromkeys(list(columns) + [f[0] for f in filters or []]))
+    df = apply_schema(table, pd.read_csv(table_csv_path(table), usecols=usecols, low_memory=False))
+    df = _apply_filters(df, filters)
+    return df[list(columns)] if columns is not None else df
+
+
+
+# --- Catálogo compartido ---
+class DataCatalog:
+    """
+    Tablas de f1db compartidas por todas las páginas y sesiones del proceso.
+    Cada tabla se carga una sola vez (la primera vez que se pide) y se entrega
+    como vista de solo lectura: con Copy-on-Write, modificar la vista no altera
+    la tabla compartida.
+
+    Un catálogo lee siempre la misma versión del almacén (la del manifiesto con
+    el que se crea). Al crear el de una versión nueva a partir del anterior se
+    heredan las tablas cuyas entradas no han cambiado y los derivados que solo
+    leyeron tablas sin cambios.
+    """
+
+    def __init__(self, manifest=None, previous=None):
+        self.manifest = read_manifest() if manifest is None else manifest
+        self.version = self.manifest.get("version", "csv")
+        self._tables = {}
+        self._inputs = {}        # derivado -> tablas que leyó al construirse
+        self._recording = None   # tablas leídas por el derivado que se está construyendo
+        self._lock = threading.RLock()
+        if previous is not None:
+            self._inherit(previous)
+
+    def _key(self, name):
+        return self.manifest.get("tables", {}).get(name, {}).get("key")
+
+    def _inherit(self, previous):
+        names = set(self.manifest.get("tables", {})) | set(previous.manifest.get("tables", {}))
+        changed = {name for name in names if self._key(name) != previous._key(name)}
+        if changed & set(ID_COLUMNS.values()):
+            # Cambian las categorías compartidas de los ids: no se puede mezclar con lo anterior
+            shared_id_dtype.cache_clear()
+            return
+        with previous._lock:
+            for name, value in previous._tables.items():
+                inputs = previous._inputs.get(name, {name})
+                if not inputs & changed:
+                    self._tables[name] = value
+                    if name in previous._inputs:
+                        self._inputs[name] = inputs
+
+    def _record(self, names):
+        if self._recording is not None:
+            self._recording.update(names)
+
+    def table(self, name, columns=None):
+        """Vista de solo lectura de una tabla, opcionalmente con solo algunas columnas"""
+        with self._lock:
+            self._record([name])
+            if name not in self._tables:
+                with span(f"cargar {name}"):
+                    self._tables[name] = load_table(name, manifest=self.manifest)
+            df = self._tables[name]
+        if columns is not None:
+            return df[list(columns)]
+        return df.copy(deep=False)
+
+    def load(self, name, columns=None, filters=None):
+        """Lectura puntual de una tabla de esta versión, sin guardarla en el catálogo"""
+        with self._lock:
+            self._record([name])
+        with span(f"leer {name}"):
+            return load_table(name, columns=columns, filters=filters, manifest=self.manifest)
+
+    def derived(self, name, build, inputs=()):
+        """
+        Tabla derivada (merges, agregados...) u otro objeto calculado una sola vez
+        con build(catalog) y compartido igual que las tablas originales. Las tablas
+        que lee build se apuntan como sus entradas; inputs añade las que lea más
+        tarde (por ejemplo, de forma perezosa).
+        """
+        with self._lock:
+            if name not in self._tables:
+                if name in self.manifest.get("tables", {}):
+                    # Vista ya materializada por scripts.build_store
+                    with span(f"cargar {name}"):
+                        self._tables[name] = load_table(name, manifest=self.manifest)
+                else:
+                    outer, self._recording = self._recording, set(inputs)
+                    try:
+                        with span(f"calcular {name}"):
+                            self._tables[name] = build(self)
+                    finally:
+                        self._inputs[name], self._recording = self._recording, outer
+            self._record(self._inputs.get(name, {name}))
+            value = self._tables[name]
+        return value.copy(deep=False) if isinstance(value, pd.DataFrame) else value
+
+    def loaded_tables(self):
+        return sorted(self._tables)
+
+    def memory_usage(self):
+        """Memoria ocupada por cada tabla cargada, de mayor a menor"""
+        rows = [
+            {
+                "table": name,
+                "rows": len(df),
+                "columns": df.shape[1],
+                "bytes": int(df.memory_usage(index=True, deep=True).sum()),
+            }
+            for name, df in list(self._tables.items())
+            if isinstance(df, pd.DataFrame)
+        ]
+        report = pd.DataFrame(rows, columns=["table", "rows", "columns", "bytes"])
+        return report.sort_values("bytes", ascending=False, ignore_index=True)
+
+
+class CatalogRegistry:
+    """
+    Catálogo de la versión actual de los datos. Cuando scripts.refresh_data
+    publica un manifiesto nuevo, la siguiente petición crea el catálogo de esa
+    versión (heredando lo que no ha cambiado); los reruns que ya tenían el
+    anterior terminan con él.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = None
+
+    def current(self):
+        manifest = read_manifest()
+        with self._lock:
+            if self._current is None or self._current.version != manifest.get("version", "csv"):
+                self._current = DataCatalog(manifest, previous=self._current)
+            return self._current
+
+
+@st.cache_resource
+def get_catalog_registry():
+    return CatalogRegistry()
+
+
+def get_catalog():
+    """Catálogo único por proceso del servidor para la versión actual de los datos"""
+    return get_catalog_registry().current()
+
+
+# --- Vistas desnormalizadas ---
+# Cada vista se construye con build(tablas), donde tablas ofrece la misma
+# interfaz .table(nombre, columnas) que DataCatalog: las páginas la calculan
+# en memoria desde el catálogo y scripts.build_store la materializa en Parquet.
+def build_race_results_view(catalog):
+    """Resultados de carrera con el nombre del piloto (full_name) y de la escudería (team_full_name)"""
+    results = catalog.table("races-race-results").drop(columns=["full_name", "team_full_name"], errors="ignore")
+    drivers = catalog.table("drivers", columns=["id", "name"]).set_index("id")["name"]
+    constructors = catalog.table("constructors", columns=["id", "name"]).set_index("id")["name"]
+    return results.assign(
+        full_name=results["driverId"].map(drivers).astype(object),
+        team_full_name=results["constructorId"].map(constructors).astype(object),
+    )
+
+
+def build_race_results_with_gp(catalog):
+    """Resultados de carrera con el nombre del Gran Premio"""
+    race_results = catalog.table("races-race-results")
+    races = catalog.table("races", columns=["raceId", "grandPrixId"])
+    grands_prix = catalog.table("grands-prix", columns=["id", "name"])
+
+    race_results = race_results.merge(races, on="raceId", how="left")
+    race_results = race_results.merge(grands_prix, left_on="grandPrixId", right_on="id", how="left").drop(columns="id")
+    return race_results.rename(columns={"name": "grandPrixName", "full_name": "fullName"})
+
+
+def build_results_with_nationality(catalog):
+    """Resultados de carrera con la nacionalidad de cada piloto"""
+    results = catalog.table("races-race-results")
+    drivers = catalog.table("drivers", columns=["id", "nationalityCountryId"])
+    return results.merge(drivers, left_on="driverId", right_on="id", how="left").drop(columns="id")
+
+
+# Tiempos de clasificación, de la sesión más avanzada a la menos: se compara la
+# más avanzada en la que marcaron tiempo los dos compañeros
+QUALIFYING_TIMES = ["q3Millis", "q2Millis", "q1Millis", "timeMillis"]
+# Resultados de carrera de quien no llegó a tomar la salida
+NOT_STARTED = ["DNS", "DNQ", "DNPQ", "DNP", "EX"]
+
+
+def build_teammate_duels(catalog):
+    """
+    Duelos entre compañeros de equipo: una fila por carrera, piloto y compañero
+    (mismo constructorId en esa carrera), con cada pareja desde los dos lados.
+
+    - qualifyingAhead: quedó por delante en la clasificación oficial.
+    - qualifyingGapMillis / qualifyingGapPercent: diferencia con el compañero en
+      la sesión más avanzada en la que marcaron tiempo los dos (negativa si fue
+      más rápido).
+    - raceAhead: terminó por delante en carrera (positionDisplayOrder, que
+      ordena también a los retirados); sin valor si alguno no tomó la salida.
+    """
+    keys = ["raceId", "year", "driverId", "constructorId"]
+    qualifying = catalog.table("races-qualifying-results", columns=keys + ["positionNumber"] + QUALIFYING_TIMES)
+    race = catalog.table("races-race-results", columns=keys + ["positionDisplayOrder", "positionText"])
+    race = race[~race["positionText"].isin(NOT_STARTED)].drop(columns="positionText")
+    entries = qualifying.drop_duplicates(["raceId", "driverId"]).merge(race, on=keys, how="outer")
+
+    pairs = entries.merge(entries, on=["raceId", "year", "constructorId"], suffixes=("", "Teammate"))
+    pairs = pairs[pairs["driverId"] != pairs["driverIdTeammate"]].reset_index(drop=True)
+
+    gap = np.full(len(pairs), np.nan)
+    reference = np.full(len(pairs), np.nan)
+    for column in QUALIFYING_TIMES:
+        own = pairs[column].to_numpy(dtype="float64", na_value=np.nan)
+        other = pairs[column + "Teammate"].to_numpy(dtype="float64", na_value=np.nan)
+        common = np.isnan(gap) & ~np.isnan(own) & ~np.isnan(other)
+        gap[common] = own[common] - other[common]
+        reference[common] = other[common]
+
+    def ahead(column):
+        own, other = pairs[column], pairs[column + "Teammate"]
+        return (own < other).astype("boolean").where(own.notna() & other.notna())
+
+    return pd.DataFrame({
+        "raceId": pairs["raceId"],
+        "year": pairs["year"],
+        "constructorId": pairs["constructorId"],
+        "driverId": pairs["driverId"],
+        "teammateId": pairs["driverIdTeammate"],
+        "qualifyingAhead": ahead("positionNumber"),
+        "qualifyingGapMillis": pd.array(gap, dtype="Float64").astype(MILLIS_DTYPE),
+        "qualifyingGapPercent": gap / reference * 100,
+        "raceAhead": ahead("positionDisplayOrder"),
+    }).sort_values(["raceId", "constructorId", "driverId"], ignore_index=True)
+
+
+# vista: (tablas de entrada, función que la construye). Una entrada con el
+# mismo nombre que la vista es su CSV original; el resto de vistas que
+# aparezcan como entrada tienen que estar definidas antes.
+STORE_VIEWS = {
+    "races-race-results": (("races-race-results", "drivers", "constructors"), build_race_results_view),
+    "races-race-results+grands-prix": (("races-race-results", "races", "grands-prix"), build_race_results_with_gp),
+    "races-race-results+nationality": (("races-race-results", "drivers"), build_results_with_nationality),
+    "teammate-duels": (("races-qualifying-results", "races-race-results"), build_teammate_duels),
+}
+
+
+class SourceTables:
+    """
+    Tablas de entrada para construir las vistas: los CSV originales con el
+    esquema compacto, salvo las vistas anteriores, que se leen del almacén si
+    ya están compiladas o se construyen antes.
+    """
+
+    def __init__(self, database_dir=DATABASE_DIR, store_dir=STORE_DIR, manifest=None):
+        self.database_dir = database_dir
+        self.store_dir = store_dir
+        self.manifest = manifest
+        self._building = []
+        self._views = {}
+
+    def table(self, name, columns=None):
+        if name in STORE_VIEWS and name not in self._building:
+            df = self._views.get(name)
+            if df is None:
+                files = store_files(name, self.manifest, self.store_dir)
+                if files:
+                    df = apply_schema(name, pd.read_parquet(files), self.database_dir)
+                else:
+                    df = self.build_view(name)
+        else:
+            csv = pd.read_csv(table_csv_path(name, self.database_dir), usecols=columns, low_memory=False)
+            df = apply_schema(name, csv, self.database_dir)
+        return df[list(columns)] if columns is not None else df.copy(deep=False)
+
+    def build_view(self, view):
+        self._building.append(view)
+        try:
+            self._views[view] = STORE_VIEWS[view][1](self)
+        finally:
+            self._building.pop()
+        return self._views[view]
+
+
+class MemoryLRU:
+    """
+    Caché LRU limitada por memoria: size_of(valor) estima los bytes de cada
+    entrada y se descartan las menos usadas cuando se supera max_bytes.
+    """
+
+    def __init__(self, max_bytes, size_of):
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self._items = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+
+    def get(self, key, build):
+        """Valor de key; si no está, se calcula con build() y se guarda"""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        value = build()
+        size = self.size_of(value)
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = value
+                self._sizes[key] = size
+                self.bytes += size
+            while self.bytes > self.max_bytes and len(self._items) > 1:
+                old_key, _ = self._items.popitem(last=False)
+                self.bytes -= self._sizes.pop(old_key)
+        return value
+
+    def discard(self, key):
+        with self._lock:
+            if key in self._items:
+                del self._items[key]
+                self.bytes -= self._sizes.pop(key)
+
+    def __len__(self):
+        return len(self._items)
+
+
+# --- Caché de figuras ---
+FIGURE_CACHE_BYTES = int(os.environ.get("F1_FIGURE_CACHE_MB", "32")) * 1024 * 1024
+
+
+class FigureCache:
+    """
+    Figuras Plotly ya construidas, guardadas como JSON en una LRU limitada por
+    memoria y compartidas por todas las sesiones (el JSON es inmutable; cada
+    rerun recibe su propia Figure). La clave es la selección que determina la
+    figura (página, id, métrica, años, sesión...) y la caché se vacía cuando
+    cambia la versión de los datos.
+    """
+
+    def __init__(self, max_bytes=FIGURE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.version = None
+        self._figures = MemoryLRU(max_bytes, len)
+        self._lock = threading.Lock()
+
+    def get(self, key, build, version):
+        """JSON de la figura de key ("" si no hay figura); si no está, se construye con build()"""
+        import plotly.io as pio
+
+        def serialize():
+            figure = build()
+            return "" if figure is None else pio.to_json(figure, validate=False)
+
+        with self._lock:
+            if version != self.version:
+                self.version, self._figures = version, MemoryLRU(self.max_bytes, len)
+            figures = self._figures
+        return figures.get(key, serialize)
+
+    def usage(self):
+        """(figuras en memoria, bytes ocupados)"""
+        return len(self._figures), self._figures.bytes
+
+
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache()
+
+
+def cached_figure(key, build):
+    """
+    Figura de una selección: build() (filtros de pandas y construcción con Plotly)
+    solo se ejecuta la primera vez que se pide key con la versión actual de los datos.
+    build() puede devolver None cuando no hay nada que dibujar; también se recuerda.
+    """
+    import plotly.io as pio
+
+    payload = get_figure_cache().get(tuple(key), build, dataset_version())
+    if not payload:
+        return None
+    # El JSON ya es una figura válida: no hace falta volver a validarlo al reconstruirla
+    return pio.from_json(payload, skip_invalid=True)
+
+
+# --- Índices precalculados ---
+def build_driver_profiles(catalog):
+    """
+    Ficha de cada piloto con resultados en carrera, indexada por driverId: datos
+    personales con los países ya resueltos, totales de su carrera, campeonatos,
+    carreras terminadas/abandonos y victorias por país (dict {alpha3: victorias}).
+    Las filas siguen el orden de su última carrera, como el selector de la página.
+    """
+    results = catalog.table("races-race-results", columns=["raceId", "driverId", "positionNumber", "positionText"])
+    drivers = catalog.table("drivers")
+    seasons = catalog.table("seasons-drivers")
+    standings = catalog.table("seasons-driver-standings", columns=["driverId", "positionNumber"])
+    races = catalog.table("races", columns=["raceId", "grandPrixId"])
+    gp = catalog.table("grands-prix", columns=["id", "countryId"])
+    countries = catalog.table("countries", columns=["id", "name", "alpha3Code"]).set_index("id")
+    country_names = countries["name"]
+    country_alpha3 = countries["alpha3Code"]
+
+    order = results.sort_values("raceId", kind="stable").drop_duplicates("driverId", keep="last")
+    profiles = order[["driverId", "raceId"]].rename(columns={"raceId": "lastRaceId"})
+    profiles = profiles.set_index(profiles["driverId"].astype(str)).drop(columns="driverId")
+    profiles.index.name = "driverId"
+
+    bio = drivers.set_index(drivers["id"].astype(str))
+    profiles = profiles.join(bio[["name", "fullName", "dateOfBirth", "dateOfDeath", "placeOfBirth", "permanentNumber"]])
+    profiles["countryOfBirth"] = bio["countryOfBirthCountryId"].map(country_names).astype(object)
+    profiles["nationality"] = bio["nationalityCountryId"].map(country_names).astype(object)
+
+    totals = seasons.groupby("driverId", observed=True)[
+        ["totalRaceWins", "totalPodiums", "totalPolePositions", "totalRaceStarts"]
+    ].sum()
+    totals.index = totals.index.astype(str)
+    profiles = profiles.join(totals)
+
+    champions = standings[standings["positionNumber"] == 1]["driverId"].astype(str).value_counts()
+    profiles["championships"] = champions
+
+    finished = pd.to_numeric(results["positionText"], errors="coerce").notna()
+    counts = pd.DataFrame({"driverId": results["driverId"].astype(str), "finished": finished})
+    counts = counts.groupby("driverId").agg(entries=("finished", "size"), finished=("finished", "sum"))
+    profiles = profiles.join(counts)
+    profiles["dnf"] = profiles["entries"] - profiles["finished"]
+
+    count_columns = ["totalRaceWins", "totalPodiums", "totalPolePositions", "totalRaceStarts", "championships"]
+    profiles[count_columns] = profiles[count_columns].fillna(0).astype(int)
+
+    wins = results[results["positionNumber"] == 1][["raceId", "driverId"]]
+    wins = wins.merge(races, on="raceId", how="left").merge(gp, left_on="grandPrixId", right_on="id", how="left")
+    wins["country"] = wins["countryId"].map(country_alpha3).astype(object)
+    wins_by_country = wins.dropna(subset=["country"]).groupby([wins["driverId"].astype(str), "country"]).size()
+    wins_by_country = {
+        driver_id: group.droplevel(0).to_dict() for driver_id, group in wins_by_country.groupby(level=0)
+    }
+    profiles["winsByCountry"] = [wins_by_country.get(driver_id, {}) for driver_id in profiles.index]
+    return profiles
+
+
+def build_constructor_profiles(catalog):
+    """
+    Ficha de cada escudería indexada por constructorId: nombre, etiqueta para el
+    selector, país, totales de su historia (de f1db-constructors), campeonatos y
+    victorias por país (dict {alpha3: victorias}).
+    """
+    results = catalog.table("races-race-results", columns=["raceId", "constructorId", "positionNumber"])
+    constructors = catalog.table("constructors")
+    standings = catalog.table("seasons-constructor-standings", columns=["constructorId", "positionNumber"])
+    races = catalog.table("races", columns=["raceId", "grandPrixId"])
+    gp = catalog.table("grands-prix", columns=["id", "countryId"])
+    countries = catalog.table("countries", columns=["id", "name", "alpha3Code"]).set_index("id")
+
+    profiles = constructors.set_index(constructors["id"].astype(str))[[
+        "name", "fullName", "totalRaceWins", "totalPodiums", "totalPolePositions", "total1And2Finishes",
+        "totalRaceStarts",
+    ]]
+    profiles.index.name = "constructorId"
+    # Las escuderías que comparten nombre (Lotus, ATS) se distinguen por el nombre completo
+    repeated = profiles["name"].duplicated(keep=False)
+    profiles["label"] = profiles["name"].where(~repeated, profiles["name"] + " (" + profiles["fullName"] + ")")
+    profiles["country"] = constructors.set_index(profiles.index)["countryId"].map(countries["name"]).astype(object)
+
+    champions = standings[standings["positionNumber"] == 1]["constructorId"].astype(str).value_counts()
+    profiles["championships"] = champions.reindex(profiles.index, fill_value=0).astype(int)
+
+    wins = results[results["positionNumber"] == 1][["raceId", "constructorId"]]
+    wins = wins.merge(races, on="raceId", how="left").merge(gp, left_on="grandPrixId", right_on="id", how="left")
+    wins["country"] = wins["countryId"].map(countries["alpha3Code"]).astype(object)
+    wins_by_country = wins.dropna(subset=["country"]).groupby([wins["constructorId"].astype(str), "country"]).size()
+    wins_by_country = {
+        constructor_id: group.droplevel(0).to_dict() for constructor_id, group in wins_by_country.groupby(level=0)
+    }
+    profiles["winsByCountry"] = [wins_by_country.get(constructor_id, {}) for constructor_id in profiles.index]
+    return profiles
+
+
+# entidad: (tabla de temporadas, clasificación final, columna id, tabla de la entidad, columna de país)
+CUBE_ENTITIES = {
+    "drivers": ("seasons-drivers", "seasons-driver-standings", "driverId", "drivers", "nationalityCountryId"),
+    "constructors": (
+        "seasons-constructors", "seasons-constructor-standings", "constructorId", "constructors", "countryId",
+    ),
+}
+CUBE_SUM_METRICS = ["totalChampionshipWins", "totalRaceWins", "totalPolePositions", "totalPodiums"]
+CUBE_COUNT_METRIC = "entityCount"
+
+
+class CountryCube:
+    """
+    Cubo entidad × métrica × país (alpha-3) por temporada. Cada métrica se
+    guarda como suma acumulada por años (con una fila inicial de ceros), así que
+    el total de cualquier periodo es la resta de dos filas. El número de
+    entidades cuenta las que tienen alguna temporada entre su primera y su
+    última dentro del periodo: (primeras temporadas <= fin) - (últimas < inicio).
+    """
+
+    def __init__(self, years, countries, cumulative):
+        self.years = years
+        self.countries = countries
+        self._cumulative = cumulative
+
+    def year_range(self):
+        return int(self.years[0]), int(self.years[-1])
+
+    def values(self, entity, metric, start=None, end=None):
+        """{alpha3: valor} de la métrica en las temporadas [start, end] (ambas incluidas)"""
+        first = 0 if start is None else np.searchsorted(self.years, start, side="left")
+        last = len(self.years) if end is None else np.searchsorted(self.years, end, side="right")
+        if metric == CUBE_COUNT_METRIC:
+            totals = self._cumulative[entity]["firstSeason"][last] - self._cumulative[entity]["lastSeason"][first]
+        else:
+            cumulative = self._cumulative[entity][metric]
+            totals = cumulative[last] - cumulative[first]
+        return {code: int(value) for code, value in zip(self.countries, totals) if value}
+
+
+def _cumulative_by_year(year_index, country_index, weights, shape):
+    """Matriz año × país acumulada por años, con una fila inicial de ceros"""
+    counts = np.zeros(shape, dtype=np.int64)
+    np.add.at(counts, (year_index + 1, country_index), weights)
+    return counts.cumsum(axis=0)
+
+
+def completed_seasons(catalog):
+    """Temporadas cuya clasificación ya incluye la última carrera del calendario"""
+    scheduled = catalog.table("races", columns=["year", "round"]).groupby("year")["round"].max()
+    standings = catalog.table("races-driver-standings", columns=["year", "round"]).groupby("year")["round"].max()
+    done = standings.reindex(scheduled.index) >= scheduled
+    return set(done[done].index.astype(int))
+
+
+def build_country_cube(catalog):
+    """Cubo de estadísticas por país calculado a partir de las tablas de temporadas"""
+    alpha3 = catalog.table("countries", columns=["id", "alpha3Code"]).set_index("id")["alpha3Code"]
+    completed = completed_seasons(catalog)
+    frames = {}
+    for entity, (seasons_table, standings_table, id_column, entity_table, country_column) in CUBE_ENTITIES.items():
+        seasons = catalog.table(seasons_table, columns=["year", id_column] + CUBE_SUM_METRICS[1:])
+        standings = catalog.table(standings_table, columns=["year", id_column, "positionNumber"])
+        # El líder de una temporada en curso todavía no es campeón
+        champions = standings[(standings["positionNumber"] == 1) & standings["year"].isin(completed)]
+        champions = champions[["year", id_column]].assign(totalChampionshipWins=1)
+        seasons = seasons.merge(champions, on=["year", id_column], how="left")
+        country = catalog.table(entity_table, columns=["id", country_column]).set_index("id")[country_column]
+        seasons["country"] = seasons[id_column].map(country).map(alpha3).astype(object)
+        frames[entity] = seasons.dropna(subset=["country"])
+
+    years = np.arange(
+        min(int(frame["year"].min()) for frame in frames.values()),
+        max(int(frame["year"].max()) for frame in frames.values()) + 1,
+    )
+    countries = sorted(set().union(*(frame["country"].unique() for frame in frames.values())))
+    shape = (len(years) + 1, len(countries))
+
+    cumulative = {}
+    for entity, frame in frames.items():
+        id_column = CUBE_ENTITIES[entity][2]
+        year_index = frame["year"].astype(int).to_numpy() - years[0]
+        country_index = pd.Categorical(frame["country"], categories=countries).codes
+        cumulative[entity] = {
+            metric: _cumulative_by_year(year_index, country_index, frame[metric].fillna(0).astype(int).to_numpy(), shape)
+            for metric in CUBE_SUM_METRICS
+        }
+        first_last = frame.groupby(frame[id_column].astype(str)).agg(
+            first=("year", "min"), last=("year", "max"), country=("country", "first")
+        )
+        active_country = pd.Categorical(first_last["country"], categories=countries).codes
+        ones = np.ones(len(first_last), dtype=np.int64)
+        cumulative[entity]["firstSeason"] = _cumulative_by_year(
+            first_last["first"].astype(int).to_numpy() - years[0], active_country, ones, shape
+        )
+        cumulative[entity]["lastSeason"] = _cumulative_by_year(
+            first_last["last"].astype(int).to_numpy() - years[0], active_country, ones, shape
+        )
+    return CountryCube(years, countries, cumulative)
+
+
+def get_country_cube():
+    """Cubo de estadísticas por país, calculado una vez por versión de los datos"""
+    return get_catalog().derived("country-cube", build_country_cube)
+
+
+# entidad: (columna id en resultados, temporadas, clasificación final, tabla de la entidad)
+SEASON_ENTITIES = {
+    "drivers": ("driverId", "seasons-drivers", "seasons-driver-standings", "drivers"),
+    "constructors": ("constructorId", "seasons-constructors", "seasons-constructor-standings", "constructors"),
+}
+SEASON_METRICS = ["points", "position", "wins", "podiums", "poles", "starts", "dnfs", "avgGrid", "avgFinish"]
+
+
+class SeasonCube:
+    """
+    Una fila por (temporada, piloto) y por (temporada, escudería) con puntos y
+    posición en el campeonato, victorias, podios, poles, salidas, abandonos y
+    posición media de salida y de llegada. Las filas están ordenadas por año:
+    un rango de temporadas es un corte con searchsorted, sin máscaras.
+    """
+
+    def __init__(self, frames):
+        self._frames = frames
+        self._years = {entity: frame["year"].to_numpy() for entity, frame in frames.items()}
+        # Código entero de cada id, para sumar con np.bincount sin agrupar en pandas
+        self._codes, self._ids = {}, {}
+        for entity, frame in frames.items():
+            self._codes[entity], self._ids[entity] = pd.factorize(frame["id"])
+        self._code_of = {entity: {id_: code for code, id_ in enumerate(ids)} for entity, ids in self._ids.items()}
+
+    def year_range(self, entity="drivers"):
+        years = self._years[entity]
+        return int(years[0]), int(years[-1])
+
+    def names(self, entity):
+        """{id: nombre} de todas las entidades del cubo"""
+        frame = self._frames[entity]
+        return dict(zip(frame["id"], frame["name"]))
+
+    def _bounds(self, entity, start, end):
+        years = self._years[entity]
+        return np.searchsorted(years, start, side="left"), np.searchsorted(years, end, side="right")
+
+    def seasons(self, entity, start, end, ids=None):
+        """Filas de las temporadas [start, end] (ambas incluidas), opcionalmente solo de algunos ids"""
+        first, last = self._bounds(entity, start, end)
+        rows = self._frames[entity].iloc[first:last]
+        if ids is not None:
+            codes = [self._code_of[entity][id_] for id_ in ids if id_ in self._code_of[entity]]
+            rows = rows[np.isin(self._codes[entity][first:last], codes)]
+        return rows
+
+    def totals(self, entity, start, end, metric, ids=None):
+        """Suma de una métrica por id en las temporadas [start, end] (solo los ids con valor si ids es None)"""
+        first, last = self._bounds(entity, start, end)
+        values = np.nan_to_num(self._frames[entity][metric].to_numpy(dtype="float64")[first:last])
+        sums = np.bincount(self._codes[entity][first:last], weights=values, minlength=len(self._ids[entity]))
+        if ids is None:
+            present = np.flatnonzero(sums)
+            return pd.Series(sums[present], index=self._ids[entity][present])
+        codes = self._code_of[entity]
+        return pd.Series([sums[codes[id_]] if id_ in codes else 0.0 for id_ in ids], index=list(ids))
+
+
+def _season_results(results, id_column):
+    """Victorias, podios, abandonos y posiciones medias por (año, id) a partir de los resultados"""
+    position = results["positionNumber"].astype("float64")
+    grid = results["gridPositionNumber"].astype("float64")
+    frame = pd.DataFrame({
+        "year": results["year"].astype(int).to_numpy(),
+        "id": results[id_column].astype(str).to_numpy(),
+        "wins": (position == 1).to_numpy(),
+        "podiums": (position <= 3).to_numpy(),
+        "dnfs": pd.to_numeric(results["positionText"], errors="coerce").isna().to_numpy(),
+        "grid": grid.where(grid > 0).to_numpy(),
+        "finish": position.to_numpy(),
+    })
+    return frame.groupby(["year", "id"]).agg(
+        wins=("wins", "sum"), podiums=("podiums", "sum"), dnfs=("dnfs", "sum"),
+        avgGrid=("grid", "mean"), avgFinish=("finish", "mean"),
+    )
+
+
+def build_season_cube(catalog):
+    """Cubo por temporada de pilotos y escuderías a partir de las tablas de temporadas y de resultados"""
+    results = catalog.table(
+        "races-race-results",
+        columns=["year", "driverId", "constructorId", "positionNumber", "positionText", "gridPositionNumber"],
+    )
+    frames = {}
+    for entity, (id_column, seasons_table, standings_table, entity_table) in SEASON_ENTITIES.items():
+        seasons = catalog.table(seasons_table, columns=["year", id_column, "totalRaceStarts", "totalPolePositions"])
+        seasons = pd.DataFrame({
+            "year": seasons["year"].astype(int).to_numpy(),
+            "id": seasons[id_column].astype(str).to_numpy(),
+            "starts": seasons["totalRaceStarts"].astype("float64").to_numpy(),
+            "poles": seasons["totalPolePositions"].astype("float64").to_numpy(),
+        }).set_index(["year", "id"])
+        standings = catalog.table(standings_table, columns=["year", id_column, "points", "positionNumber"])
+        standings = pd.DataFrame({
+            "year": standings["year"].astype(int).to_numpy(),
+            "id": standings[id_column].astype(str).to_numpy(),
+            "points": standings["points"].astype("float64").to_numpy(),
+            "position": standings["positionNumber"].astype("float64").to_numpy(),
+        }).drop_duplicates(["year", "id"]).set_index(["year", "id"])
+
+        frame = seasons.join(standings, how="outer").join(_season_results(results, id_column), how="outer")
+        frame = frame.sort_index().reset_index()
+        counts = ["wins", "podiums", "poles", "starts", "dnfs"]
+        frame[counts] = frame[counts].fillna(0).astype(int)
+        names = catalog.table(entity_table, columns=["id", "name"])
+        frame["name"] = frame["id"].map(dict(zip(names["id"].astype(str), names["name"])))
+        frames[entity] = frame[["year", "id", "name"] + SEASON_METRICS]
+    return SeasonCube(frames)
+
+
+def get_season_cube():
+    """Cubo por temporada, calculado una vez por versión de los datos"""
+    return get_catalog().derived("season-cube", build_season_cube)
+
+
+# --- Simulador de sistemas de puntuación ---
+# Cada sistema: puntos por posición en carrera y en sprint, puntos por vuelta
+# rápida (opcionalmente solo para quien termine entre los N primeros) y número
+# de resultados que cuentan por temporada (0 = todos).
+SCORING_PRESETS = {
+    "2010-actualidad": {"race": [25, 18, 15, 12, 10, 8, 6, 4, 2, 1], "sprint": [8, 7, 6, 5, 4, 3, 2, 1],
+                        "fastest_lap": 0, "fastest_lap_top": 0, "best_results": 0},
+    "2019-2024 (vuelta rápida)": {"race": [25, 18, 15, 12, 10, 8, 6, 4, 2, 1], "sprint": [8, 7, 6, 5, 4, 3, 2, 1],
+                                  "fastest_lap": 1, "fastest_lap_top": 10, "best_results": 0},
+    "2003-2009": {"race": [10, 8, 6, 5, 4, 3, 2, 1], "sprint": [], "fastest_lap": 0, "fastest_lap_top": 0,
+                  "best_results": 0},
+    "1991-2002": {"race": [10, 6, 4, 3, 2, 1], "sprint": [], "fastest_lap": 0, "fastest_lap_top": 0,
+                  "best_results": 0},
+    "1961-1990 (11 mejores resultados)": {"race": [9, 6, 4, 3, 2, 1], "sprint": [], "fastest_lap": 0,
+                                          "fastest_lap_top": 0, "best_results": 11},
+    "1950-1959": {"race": [8, 6, 4, 3, 2], "sprint": [], "fastest_lap": 1, "fastest_lap_top": 0,
+                  "best_results": 0},
+}
+
+
+class ChampionshipSimulator:
+    """
+    Recalcula los campeonatos de pilotos y de escuderías de todas las temporadas
+    con otro sistema de puntuación. Los resultados de carreras y sprints se
+    guardan una sola vez como arrays de NumPy, con la agrupación por
+    (temporada, entidad, carrera) ya resuelta; cada sistema se aplica a todas
+    las temporadas a la vez: los puntos son un índice sobre la tabla de
+    puntuación, los mejores resultados un lexsort y los totales np.bincount.
+
+    Cada coche puntúa por su posición (también en los coches compartidos de los
+    años 50) y una escudería suma los puntos de todos sus coches. Los empates
+    se deshacen por victorias, segundos y terceros puestos.
+    """
+
+    def __init__(self, results, names):
+        self.names = names
+        self._years, season = np.unique(results["year"].to_numpy(), return_inverse=True)
+        self._position = results["position"].to_numpy()
+        self._sprint = results["sprint"].to_numpy()
+        self._fastest = results["fastest"].to_numpy()
+        self.max_position = int(self._position.max(initial=0))
+        race = pd.factorize(results["raceId"])[0]
+        counted = (self._position >= 1) & (self._position <= 3) & ~self._sprint
+        self._groups = {}
+        for entity, column in (("drivers", "driverId"), ("constructors", "constructorId")):
+            code, ids = pd.factorize(results[column])
+            # Grupo (temporada, entidad) de cada fila y hueco (temporada, entidad, carrera)
+            group_key = season.astype("int64") * len(ids) + code
+            groups, group = np.unique(group_key, return_inverse=True)
+            slots, slot = np.unique(group.astype("int64") * (race.max(initial=0) + 1) + race, return_inverse=True)
+            countback = np.stack([
+                np.bincount(group, weights=counted & (self._position == place), minlength=len(groups))
+                for place in (1, 2, 3)
+            ])
+            self._groups[entity] = {
+                "ids": np.asarray(ids), "group": group, "slot": slot,
+                "slot_group": slots // (race.max(initial=0) + 1),
+                "season": groups // len(ids), "entity": groups % len(ids), "countback": countback,
+            }
+
+    def _points(self, race_points, sprint_points, fastest_lap, fastest_lap_top):
+        """Puntos de cada resultado (carrera o sprint) con el sistema dado"""
+        size = max(self.max_position, len(race_points), len(sprint_points)) + 1
+        race_table, sprint_table = np.zeros(size), np.zeros(size)
+        race_table[1:len(race_points) + 1] = race_points
+        sprint_table[1:len(sprint_points) + 1] = sprint_points
+        points = np.where(self._sprint, sprint_table[self._position], race_table[self._position])
+        if fastest_lap:
+            eligible = self._fastest & ~self._sprint
+            if fastest_lap_top:
+                eligible &= (self._position >= 1) & (self._position <= fastest_lap_top)
+            points = points + fastest_lap * eligible
+        return points
+
+    def simulate(self, race_points, sprint_points=(), fastest_lap=0, fastest_lap_top=0, best_results=0):
+        """
+        Clasificación simulada de cada temporada: {entidad: DataFrame con year, id,
+        name, points, position y wins}, ordenado por año y posición. best_results
+        limita los Grandes Premios que cuentan por temporada (los sprints cuentan siempre).
+        """
+        points = self._points(race_points, sprint_points, fastest_lap, fastest_lap_top)
+        standings = {}
+        for entity, groups in self._groups.items():
+            n_groups = len(groups["season"])
+            race_scores = np.bincount(groups["slot"], weights=np.where(self._sprint, 0, points))
+            if best_results:
+                # Mejores resultados de cada (temporada, entidad): orden descendente dentro de cada grupo
+                order = np.lexsort((-race_scores, groups["slot_group"]))
+                sorted_groups = groups["slot_group"][order]
+                starts = np.searchsorted(sorted_groups, np.arange(n_groups))
+                keep = np.empty(len(order), dtype=bool)
+                keep[order] = np.arange(len(order)) - starts[sorted_groups] < best_results
+                race_scores = race_scores * keep
+            totals = np.bincount(groups["slot_group"], weights=race_scores, minlength=n_groups)
+            totals += np.bincount(groups["group"], weights=np.where(self._sprint, points, 0), minlength=n_groups)
+
+            wins, seconds, thirds = groups["countback"]
+            order = np.lexsort((-thirds, -seconds, -wins, -totals, groups["season"]))
+            season_starts = np.searchsorted(groups["season"][order], np.arange(len(self._years)))
+            position = np.empty(n_groups, dtype=int)
+            position[order] = np.arange(n_groups) - season_starts[groups["season"][order]] + 1
+
+            ids = groups["ids"][groups["entity"][order]]
+            standings[entity] = pd.DataFrame({
+                "year": self._years[groups["season"][order]],
+                "id": ids,
+                "name": [self.names[entity].get(id_, id_) for id_ in ids],
+                "points": totals[order],
+                "position": position[order],
+                "wins": wins[order].astype(int),
+            })
+        return standings
+
+
+def build_championship_simulator(catalog):
+    """Resultados de carreras y sprints (posición, vuelta rápida) de todas las temporadas para el simulador"""
+    columns = ["raceId", "year", "driverId", "constructorId", "positionNumber"]
+    fastest_laps = catalog.table("races-fastest-laps", columns=["raceId", "driverId", "positionNumber"])
+    fastest_laps = fastest_laps[fastest_laps["positionNumber"] == 1]
+    fastest_keys = set(zip(fastest_laps["raceId"], fastest_laps["driverId"].astype(str)))
+
+    parts = []
+    for table, sprint in (("races-race-results", False), ("races-sprint-race-results", True)):
+        results = catalog.table(table, columns=columns)
+        part = pd.DataFrame({
+            "raceId": results["raceId"].to_numpy(),
+            "year": results["year"].astype(int).to_numpy(),
+            "driverId": results["driverId"].astype(str).to_numpy(),
+            "constructorId": results["constructorId"].astype(str).to_numpy(),
+            "position": results["positionNumber"].astype("float64").fillna(0).astype(int).to_numpy(),
+            "sprint": sprint,
+        })
+        part["fastest"] = [not sprint and key in fastest_keys for key in zip(part["raceId"], part["driverId"])]
+        parts.append(part)
+
+    names = {}
+    for entity, (_, _, _, entity_table) in SEASON_ENTITIES.items():
+        table = catalog.table(entity_table, columns=["id", "name"])
+        names[entity] = dict(zip(table["id"].astype(str), table["name"]))
+    return ChampionshipSimulator(pd.concat(parts, ignore_index=True), names)
+
+
+def get_championship_simulator():
+    """Simulador con los resultados de la versión actual de los datos"""
+    return get_catalog().derived("championship-simulator", build_championship_simulator)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def simulate_championships(version, race_points, sprint_points, fastest_lap, fastest_lap_top, best_results):
+    """Clasificaciones simuladas con un sistema de puntuación; se cachean por sistema y versión de los datos"""
+    with span("simular campeonatos"):
+        return get_championship_simulator().simulate(
+            race_points, sprint_points, fastest_lap, fastest_lap_top, best_results
+        )
+
+
+# --- Progresión del campeonato ---
+# entidad: (clasificación tras cada carrera, columna id)
+PROGRESSION_TABLES = {
+    "drivers": ("races-driver-standings", "driverId"),
+    "constructors": ("races-constructor-standings", "constructorId"),
+}
+# Sistema de puntuación vigente desde cada temporada (ver SCORING_PRESETS). Sirve
+# para acotar lo máximo que se puede sumar en una ronda; donde el sistema real
+# daba menos (1960, los sprints de 2021, las escuderías antes de 1979, cuando
+# solo puntuaba su mejor coche) la cota es más alta, nunca más baja.
+SEASON_SCORING = (
+    (1950, "1950-1959"),
+    (1960, "1961-1990 (11 mejores resultados)"),
+    (1991, "1991-2002"),
+    (2003, "2003-2009"),
+    (2010, "2010-actualidad"),
+    (2019, "2019-2024 (vuelta rápida)"),
+    (2025, "2010-actualidad"),
+)
+
+
+def round_maximum(year, entity, sprint):
+    """
+    Puntos máximos de una ronda según el sistema de la temporada: la victoria
+    (un doblete, para escuderías), la vuelta rápida si puntúa y la victoria (o
+    el doblete) en el sprint si la ronda lo tiene
+    """
+    preset = SCORING_PRESETS[[name for first_year, name in SEASON_SCORING if first_year <= year][-1]]
+    cars = 2 if entity == "constructors" else 1
+    points = sum(preset["race"][:cars]) + preset["fastest_lap"]
+    if sprint:
+        points += sum(preset["sprint"][:cars])
+    return points
+
+
+def _forward_fill(values):
+    """Rellena hacia abajo (por rondas) los huecos NaN de cada columna de un array 2D"""
+    filled = np.where(np.isnan(values), 0, np.arange(len(values))[:, None])
+    np.maximum.accumulate(filled, axis=0, out=filled)
+    return values[filled, np.arange(values.shape[1])]
+
+
+class ChampionshipProgression:
+    """
+    Clasificación del campeonato tras cada ronda. Para cada (entidad, temporada)
+    guarda arrays densos ronda × piloto/escudería de puntos y de posición, y la
+    ronda en la que cada uno se quedó sin opciones matemáticas de ganar el
+    título; elegir temporada o pilotos solo corta esos arrays.
+
+    Una entidad está eliminada cuando ni sumando en cada ronda restante (también
+    las que aún no se han disputado) lo máximo que reparte esa ronda
+    (round_maximum, o lo que sumó alguien en ella si fue más, como en las
+    rondas de puntos dobles) llega a los puntos del líder. La cota nunca se
+    queda corta, así que nadie se da por eliminado antes de tiempo; como no
+    se aplican los desempates ni los resultados descartados, algunas
+    temporadas se deciden aquí una ronda más tarde que en realidad.
+    """
+
+    def __init__(self, seasons, names):
+        self._seasons = seasons
+        self.names = names
+        self._columns = {
+            key: {id_: column for column, id_ in enumerate(season["ids"])} for key, season in seasons.items()
+        }
+
+    def years(self, entity):
+        return sorted(year for season_entity, year in self._seasons if season_entity == entity)
+
+    def season(self, entity, year):
+        """Arrays de una temporada: rounds, races, ids (por posición final), points, positions, eliminated, scheduled"""
+        return self._seasons[(entity, year)]
+
+    def select(self, entity, year, ids):
+        """(puntos, posiciones) de algunos ids: arrays rondas × len(ids), en el orden de ids"""
+        season = self._seasons[(entity, year)]
+        columns = [self._columns[(entity, year)][id_] for id_ in ids]
+        return season["points"][:, columns], season["positions"][:, columns]
+
+    def contenders(self, entity, year):
+        """Posición y puntos tras la última ronda disputada y ronda de eliminación (-1 si no) de cada id"""
+        season = self._seasons[(entity, year)]
+        return pd.DataFrame({
+            "id": season["ids"],
+            "name": [self.names[entity].get(id_, id_) for id_ in season["ids"]],
+            "position": season["positions"][-1],
+            "points": season["points"][-1],
+            "eliminated": season["eliminated"],
+        })
+
+
+def _season_progression(rows, id_column, race_names, round_points):
+    """
+    Arrays densos de una temporada a partir de sus filas de clasificación tras
+    cada carrera; round_points[i] es el máximo de la ronda i + 1 (ver round_maximum)
+    """
+    rounds, round_index = np.unique(rows["round"].to_numpy(), return_inverse=True)
+    ids, id_index = np.unique(rows[id_column].to_numpy(), return_inverse=True)
+    points = np.full((len(rounds), len(ids)), np.nan)
+    positions = np.full((len(rounds), len(ids)), np.nan)
+    points[round_index, id_index] = rows["points"].to_numpy(dtype="float64")
+    positions[round_index, id_index] = rows["positionNumber"].to_numpy(dtype="float64")
+    # Quien aún no ha aparecido lleva 0 puntos y sin posición; después conserva la última
+    points = np.nan_to_num(_forward_fill(points))
+    positions = _forward_fill(positions)
+
+    scheduled = max(len(round_points), int(rounds[-1]))
+    per_round = np.zeros(scheduled)
+    per_round[:len(round_points)] = round_points
+    gains = np.diff(points, axis=0, prepend=0).max(axis=1)
+    per_round[rounds - 1] = np.maximum(per_round[rounds - 1], gains)
+    # Puntos que quedan en juego después de cada ronda
+    remaining = np.append(np.cumsum(per_round[::-1])[::-1], 0.0)[rounds]
+    out = points + remaining[:, None] < points.max(axis=1)[:, None]
+    eliminated = np.where(out.any(axis=0), rounds[out.argmax(axis=0)], -1)
+
+    order = np.lexsort((-points[-1], np.nan_to_num(positions[-1], nan=np.inf)))
+    return {
+        "rounds": rounds,
+        "races": [race_names.get(round_, "") for round_ in rounds],
+        "ids": ids[order],
+        "points": points[:, order],
+        "positions": positions[:, order],
+        "eliminated": eliminated[order],
+        "scheduled": scheduled,
+    }
+
+
+def build_championship_progression(catalog):
+    """Progresión de los campeonatos de pilotos y de escuderías de todas las temporadas"""
+    races = catalog.table(
+        "races", columns=["raceId", "year", "round", "grandPrixId", "sprintRaceDate", "sprintQualifyingFormat"]
+    )
+    gp_names = catalog.table("grands-prix", columns=["id", "name"])
+    sprint_races = catalog.table("races-sprint-race-results", columns=["raceId"])["raceId"]
+    races = races.assign(
+        year=races["year"].astype(int),
+        gp=races["grandPrixId"].map(dict(zip(gp_names["id"], gp_names["name"]))).astype(object),
+        # Los sprints ya disputados tienen resultados; los que faltan, fecha o formato en el calendario
+        sprint=races["raceId"].isin(sprint_races)
+        | races["sprintRaceDate"].notna()
+        | races["sprintQualifyingFormat"].notna(),
+    )
+    race_names = {year: dict(zip(group["round"], group["gp"])) for year, group in races.groupby("year")}
+    calendars = {year: group.sort_values("round") for year, group in races.groupby("year")}
+
+    seasons, names = {}, {}
+    for entity, (table, id_column) in PROGRESSION_TABLES.items():
+        standings = catalog.table(table, columns=["year", "round", id_column, "points", "positionNumber"])
+        standings = standings.assign(year=standings["year"].astype(int), **{id_column: standings[id_column].astype(str)})
+        # En algunas temporadas f1db clasifica por separado cada motor de una escudería
+        # (Lotus-Ford y Lotus-BRM): se queda la mejor clasificada
+        standings = standings.sort_values("positionNumber", na_position="last", kind="stable")
+        standings = standings.drop_duplicates(["year", "round", id_column])
+        for year, rows in standings.groupby("year"):
+            calendar = calendars.get(year, races.iloc[:0])
+            round_points = np.zeros(int(calendar["round"].max()) if len(calendar) else 0)
+            round_points[calendar["round"].to_numpy(dtype=int) - 1] = [
+                round_maximum(year, entity, sprint) for sprint in calendar["sprint"]
+            ]
+            seasons[(entity, year)] = _season_progression(rows, id_column, race_names.get(year, {}), round_points)
+        entity_table = SEASON_ENTITIES[entity][3]
+        table_names = catalog.table(entity_table, columns=["id", "name"])
+        names[entity] = dict(zip(table_names["id"].astype(str), table_names["name"]))
+    return ChampionshipProgression(seasons, names)
+
+
+def get_championship_progression():
+    """Progresión de los campeonatos, calculada una vez por versión de los datos"""
+    return get_catalog().derived("championship-progression", build_championship_progression)
+
+
+# --- Duelos entre compañeros de equipo ---
+class TeammateHeadToHead:
+    """
+    Balance de los duelos entre compañeros de equipo de toda la historia (vista
+    teammate-duels), resumido una sola vez por pareja a tres niveles: toda su
+    carrera juntos, por escudería y por escudería y temporada. Cada resumen
+    guarda las posiciones de las filas de cada piloto, escudería y temporada,
+    así que una consulta solo elige el nivel e intersecta esos arrays.
+
+    Cada pareja aparece desde los dos lados (piloto / compañero); leading marca
+    el lado de quien ganó más duelos de clasificación.
+    """
+
+    LEVELS = ((), ("constructorId",), ("constructorId", "year"))
+    LOOKUPS = {"driver": "driverId", "constructor": "constructorId", "year": "year"}
+
+    def __init__(self, duels, names):
+        self.names = names
+        self._summaries = {}
+        for level in self.LEVELS:
+            table = self._summarize(duels, level)
+            positions = {
+                lookup: {
+                    int(key) if column == "year" else str(key): rows
+                    for key, rows in table.groupby(column, observed=True, sort=False).indices.items()
+                }
+                for lookup, column in self.LOOKUPS.items()
+                if column in table.columns
+            }
+            self._summaries[level] = (table, positions)
+        self._keys = {lookup: sorted(self._summaries[self.LEVELS[-1]][1][lookup]) for lookup in self.LOOKUPS}
+
+    def _summarize(self, duels, level):
+        qualifying = duels["qualifyingAhead"].astype("float64")
+        race = duels["raceAhead"].astype("float64")
+        keys = ["driverId", "teammateId", *level]
+        grouped = duels.assign(
+            qualifyingWins=qualifying == 1, qualifyingLosses=qualifying == 0,
+            raceWins=race == 1, raceLosses=race == 0,
+            gapMillis=duels["qualifyingGapMillis"].astype("float64"),
+        ).groupby(keys, observed=True, sort=False)
+        table = grouped.agg(
+            firstYear=("year", "min"),
+            lastYear=("year", "max"),
+            races=("raceId", "nunique"),
+            qualifyingWins=("qualifyingWins", "sum"),
+            qualifyingLosses=("qualifyingLosses", "sum"),
+            medianGapMillis=("gapMillis", "median"),
+            medianGapPercent=("qualifyingGapPercent", "median"),
+            raceWins=("raceWins", "sum"),
+            raceLosses=("raceLosses", "sum"),
+        ).reset_index()
+        table = table.astype({key: int if key == "year" else str for key in keys})
+        team_names = self.names["constructors"]
+        if "constructorId" in level:
+            table["constructors"] = table["constructorId"].map(lambda id_: team_names.get(id_, id_))
+        else:
+            # Una pareja puede haber coincidido en varias escuderías
+            teams = {}
+            pair_teams = duels[["driverId", "teammateId", "constructorId"]].drop_duplicates().astype(str)
+            for driver, teammate, team in pair_teams.itertuples(index=False):
+                teams.setdefault((driver, teammate), []).append(team_names.get(team, team))
+            table["constructors"] = [
+                ", ".join(teams[pair]) for pair in zip(table["driverId"], table["teammateId"])
+            ]
+        ahead = table["qualifyingWins"] - table["qualifyingLosses"]
+        table["leading"] = (ahead > 0) | ((ahead == 0) & (table["driverId"] < table["teammateId"]))
+        table.insert(1, "name", table["driverId"].map(lambda id_: self.names["drivers"].get(id_, id_)))
+        table.insert(3, "teammate", table["teammateId"].map(lambda id_: self.names["drivers"].get(id_, id_)))
+        return table.sort_values(["lastYear", "races"], ascending=False, ignore_index=True)
+
+    def keys(self, lookup):
+        """Pilotos ('driver'), escuderías ('constructor') o temporadas ('year') con algún duelo"""
+        return self._keys[lookup]
+
+    def summary(self, driver=None, constructor=None, year=None, by_year=False):
+        """
+        Balance de cada pareja de un piloto, una escudería y/o una temporada (los
+        filtros que se den): carreras juntos, duelos de clasificación y de
+        carrera ganados y perdidos y mediana de la diferencia en clasificación.
+        Con by_year, una fila por temporada. Sin piloto, cada pareja sale una
+        vez, desde el lado de quien ganó más duelos de clasificación.
+        """
+        if year is not None or by_year:
+            level = ("constructorId", "year")
+        elif constructor is not None:
+            level = ("constructorId",)
+        else:
+            level = ()
+        table, positions = self._summaries[level]
+        selected = None
+        for lookup, key in (("driver", driver), ("constructor", constructor), ("year", year)):
+            if key is None:
+                continue
+            rows = positions[lookup].get(key, np.array([], dtype=np.intp))
+            selected = rows if selected is None else np.intersect1d(selected, rows, assume_unique=True)
+        if selected is not None:
+            table = table.take(np.sort(selected))
+        if driver is None:
+            table = table[table["leading"]]
+        return table.drop(columns="leading").reset_index(drop=True)
+
+
+def build_teammate_head_to_head(catalog):
+    """Duelos entre compañeros con los nombres de pilotos y escuderías"""
+    duels = catalog.derived("teammate-duels", build_teammate_duels)
+    names = {}
+    for entity, table in (("drivers", "drivers"), ("constructors", "constructors")):
+        ids = catalog.table(table, columns=["id", "name"])
+        names[entity] = dict(zip(ids["id"].astype(str), ids["name"]))
+    return TeammateHeadToHead(duels, names)
+
+
+def get_teammate_head_to_head():
+    """Duelos entre compañeros, calculados (o leídos del almacén) una vez por versión de los datos"""
+    return get_catalog().derived("teammate-head-to-head", build_teammate_head_to_head)
+
+
+# --- Paradas en boxes ---
+PIT_STOP_QUANTILES = (0.1, 0.5, 0.9)
+# Paradas mínimas de una escudería en una temporada para entrar en el ranking de equipos más rápidos
+MIN_CREW_STOPS = 20
+
+
+def _sorted_quantiles(values, starts, ends, q):
+    """
+    Cuantil q (interpolación lineal, como np.quantile) de varios tramos
+    values[start:end] ya ordenados, sin volver a ordenarlos
+    """
+    position = starts + q * (ends - starts - 1)
+    low = np.floor(position).astype(np.intp)
+    high = np.minimum(low + 1, ends - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+class PitStopStats:
+    """
+    Estadísticas históricas de las paradas en boxes (timeMillis: tiempo desde
+    la entrada hasta la salida del pit lane).
+
+    Los tiempos se guardan ordenados por (año, tiempo), para todas las
+    escuderías juntas y para cada una por separado. Así, los cuantiles de cada
+    temporada se leen por posición dentro de su tramo, y los de un rango de
+    años solo necesitan buscar con searchsorted dónde empieza y acaba el rango.
+    Los agregados por temporada se calculan al construir el índice.
+    """
+
+    def __init__(self, stops, names):
+        self.names = names
+        stops = stops.dropna(subset=["timeMillis"])
+        teams = stops["constructorId"].astype(str).to_numpy()
+        years = stops["year"].to_numpy(dtype=np.int64)
+        seconds = stops["timeMillis"].to_numpy(dtype="float64") / 1000
+
+        self._series = {}
+        order = np.lexsort((seconds, years))
+        self._series[None] = (years[order], seconds[order])
+        order = np.lexsort((seconds, years, teams))
+        sorted_teams = teams[order]
+        bounds = np.flatnonzero(sorted_teams[1:] != sorted_teams[:-1]) + 1
+        for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(order)]):
+            rows = order[start:end]
+            self._series[sorted_teams[start]] = (years[rows], seconds[rows])
+
+        self._by_year = {team: self._yearly(*series) for team, series in self._series.items()}
+        self._stop_counts = self._count_stops(stops)
+
+    @staticmethod
+    def _yearly(years, seconds):
+        """Paradas y cuantiles de cada temporada a partir de un tramo ordenado por (año, tiempo)"""
+        season_years, starts, counts = np.unique(years, return_index=True, return_counts=True)
+        ends = starts + counts
+        table = pd.DataFrame({"year": season_years, "stops": counts})
+        for q in PIT_STOP_QUANTILES:
+            table[f"p{round(q * 100)}"] = _sorted_quantiles(seconds, starts, ends, q)
+        return table.rename(columns={"p50": "median"})
+
+    @staticmethod
+    def _count_stops(stops):
+        """Por temporada: paradas por piloto y carrera y reparto de pilotos según su número de paradas"""
+        per_driver = stops.groupby(["year", "raceId", "driverId"], observed=True)["stop"].max().reset_index()
+        table = pd.crosstab(per_driver["year"], per_driver["stop"].clip(upper=3), normalize="index")
+        table.columns = [{1: "oneStop", 2: "twoStops", 3: "threeOrMore"}[int(stops_)] for stops_ in table.columns]
+        table.insert(0, "stopsPerDriver", per_driver.groupby("year")["stop"].mean())
+        table.insert(0, "races", stops.groupby("year")["raceId"].nunique())
+        return table.reset_index().astype({"year": int})
+
+    def teams(self):
+        """Escuderías con alguna parada registrada"""
+        return sorted(team for team in self._series if team is not None)
+
+    def year_range(self):
+        years = self._series[None][0]
+        return int(years[0]), int(years[-1])
+
+    def _slice(self, team, years):
+        team_years, seconds = self._series.get(team, (np.array([], dtype=np.int64), np.array([])))
+        if years is None:
+            return seconds
+        start, end = np.searchsorted(team_years, [years[0], years[1] + 1])
+        return seconds[start:end]
+
+    def distribution(self, team=None, years=None):
+        """Paradas, p10, mediana y p90 (segundos) de una escudería (o de todas) en un rango de años"""
+        seconds = self._slice(team, years)
+        if not len(seconds):
+            return {"stops": 0, "p10": np.nan, "median": np.nan, "p90": np.nan}
+        p10, median, p90 = np.quantile(seconds, PIT_STOP_QUANTILES)
+        return {"stops": len(seconds), "p10": p10, "median": median, "p90": p90}
+
+    def by_year(self, team=None, years=None):
+        """Paradas, p10, mediana y p90 de cada temporada de una escudería (o de todas)"""
+        table = self._by_year.get(team)
+        if table is None:
+            return pd.DataFrame(columns=["year", "stops", "p10", "median", "p90"])
+        if years is not None:
+            table = table[table["year"].between(*years)]
+        return table.reset_index(drop=True)
+
+    def stop_counts(self, years=None):
+        """Evolución del número de paradas por piloto y carrera"""
+        table = self._stop_counts
+        if years is not None:
+            table = table[table["year"].between(*years)]
+        return table.reset_index(drop=True)
+
+    def fastest_crews(self, years=None, min_stops=MIN_CREW_STOPS):
+        """Escudería con la mediana más baja de cada temporada (con al menos min_stops paradas)"""
+        seasons = pd.concat(
+            [table.assign(constructorId=team) for team, table in self._by_year.items() if team is not None],
+            ignore_index=True,
+        )
+        seasons = seasons[seasons["stops"] >= min_stops]
+        if years is not None:
+            seasons = seasons[seasons["year"].between(*years)]
+        fastest = seasons.loc[seasons.groupby("year")["median"].idxmin()]
+        fastest.insert(1, "name", fastest["constructorId"].map(lambda id_: self.names.get(id_, id_)))
+        return fastest.sort_values("year", ascending=False, ignore_index=True)
+
+
+def build_pit_stop_stats(catalog):
+    """Estadísticas de paradas en boxes de toda la historia"""
+    stops = catalog.table("races-pit-stops", columns=["raceId", "year", "driverId", "constructorId", "stop", "timeMillis"])
+    constructors = catalog.table("constructors", columns=["id", "name"])
+    return PitStopStats(
+        stops.astype({"year": int}), dict(zip(constructors["id"].astype(str), constructors["name"]))
+    )
+
+
+def get_pit_stop_stats():
+    """Estadísticas de paradas en boxes, calculadas una vez por versión de los datos"""
+    return get_catalog().derived("pit-stop-stats", build_pit_stop_stats)
+
+
+# --- Récords de vuelta ---
+def lap_time(millis):
+    """Tiempo de vuelta en formato m:ss.mmm"""
+    if pd.isna(millis):
+        return ""
+    minutes, millis = divmod(int(millis), 60000)
+    return f"{minutes}:{millis / 1000:06.3f}"
+
+
+class LapRecords:
+    """
+    Evolución del récord de vuelta en carrera de cada circuito y trazado
+    (circuitId, courseLength): un circuito que cambia de longitud empieza un
+    récord nuevo. Para cada trazado guarda, ordenadas por fecha, la vuelta
+    rápida de cada carrera y su mínimo acumulado (el récord tras esa carrera),
+    así que la gráfica de cualquier circuito es una consulta directa.
+    """
+
+    def __init__(self, laps):
+        laps = laps.sort_values(["circuitId", "courseLength", "date"], ignore_index=True)
+        layout = laps.groupby(["circuitId", "courseLength"], sort=False)
+        previous = layout["fastestLapMillis"].cummin().groupby([laps["circuitId"], laps["courseLength"]]).shift()
+        laps["recordMillis"] = layout["fastestLapMillis"].cummin()
+        laps["newRecord"] = previous.isna() | (laps["fastestLapMillis"] < previous)
+        laps["improvementPercent"] = ((previous - laps["fastestLapMillis"]) / previous * 100).where(laps["newRecord"])
+        self._layouts = {
+            (circuit, float(length)): laps.iloc[rows].reset_index(drop=True)
+            for (circuit, length), rows in layout.indices.items()
+        }
+        self._circuits = {}
+        for circuit, length in self._layouts:
+            self._circuits.setdefault(circuit, []).append(length)
+
+    def layouts(self, circuit_id):
+        """Trazados (courseLength) de un circuito con vueltas rápidas, del más reciente al más antiguo"""
+        lengths = self._circuits.get(circuit_id, [])
+        return sorted(lengths, key=lambda length: self._layouts[(circuit_id, length)]["date"].iloc[-1], reverse=True)
+
+    def evolution(self, circuit_id, course_length):
+        """Vuelta rápida de cada carrera del trazado y récord tras ella (recordMillis)"""
+        return self._layouts[(circuit_id, course_length)]
+
+    def holders(self, circuit_id, course_length):
+        """Carreras en las que se batió el récord, con la mejora sobre el anterior"""
+        laps = self._layouts[(circuit_id, course_length)]
+        return laps[laps["newRecord"]].reset_index(drop=True)
+
+    def improvement_by_decade(self, circuit_id, course_length):
+        """Récord al empezar y al acabar cada década y mejora porcentual en ella"""
+        laps = self._layouts[(circuit_id, course_length)]
+        decade = laps["year"] // 10 * 10
+        grouped = laps.groupby(decade)
+        table = pd.DataFrame({
+            "races": grouped.size(),
+            "firstYear": grouped["year"].min(),
+            "lastYear": grouped["year"].max(),
+            # Récord vigente al empezar la década (el de la década anterior o, si no lo hay, su primera carrera)
+            "startMillis": grouped["recordMillis"].last().shift().fillna(grouped["fastestLapMillis"].first()),
+            "endMillis": grouped["recordMillis"].last(),
+        })
+        table["improvementPercent"] = (table["startMillis"] - table["endMillis"]) / table["startMillis"] * 100
+        return table.rename_axis("decade").reset_index()
+
+
+def build_lap_records(catalog):
+    """Récords de vuelta de todos los circuitos a partir de la vuelta rápida de cada carrera"""
+    fastest = catalog.table("races-fastest-laps", columns=["raceId", "driverId", "constructorId", "timeMillis"])
+    fastest = fastest.dropna(subset=["timeMillis"])
+    fastest = fastest.loc[fastest.groupby("raceId")["timeMillis"].idxmin()]
+    races = catalog.table("races", columns=["raceId", "year", "date", "grandPrixId", "circuitId", "courseLength"])
+    names = {}
+    for table in ("drivers", "constructors", "grands-prix"):
+        ids = catalog.table(table, columns=["id", "name"])
+        names[table] = dict(zip(ids["id"].astype(str), ids["name"]))
+
+    laps = fastest.merge(races, on="raceId").dropna(subset=["courseLength"])
+    return LapRecords(pd.DataFrame({
+        "raceId": laps["raceId"].to_numpy(),
+        "year": laps["year"].astype(int).to_numpy(),
+        "date": laps["date"].astype(str).to_numpy(),
+        "circuitId": laps["circuitId"].astype(str).to_numpy(),
+        "courseLength": laps["courseLength"].astype(float).to_numpy(),
+        "grandPrix": laps["grandPrixId"].astype(str).map(names["grands-prix"]).to_numpy(),
+        "driver": laps["driverId"].astype(str).map(names["drivers"]).to_numpy(),
+        "constructor": laps["constructorId"].astype(str).map(names["constructors"]).to_numpy(),
+        "fastestLapMillis": laps["timeMillis"].astype("float64").to_numpy(),
+    }))
+
+
+def get_lap_records():
+    """Récords de vuelta por circuito y trazado, calculados una vez por versión de los datos"""
+    return get_catalog().derived("lap-records", build_lap_records)
+
+
+# --- Sesiones de cada carrera ---
+SESSION_TABLES = {
+    "Carrera": "races-race-results",
+    "Parrilla de Salida": "races-starting-grid-positions",
+    "Clasificación": "races-qualifying-results",
+    "Clasificación 1": "races-qualifying-1-results",
+    "Clasificación 2": "races-qualifying-2-results",
+    "Precalificación": "races-pre-qualifying-results",
+    "Carrera Sprint": "races-sprint-race-results",
+    "Parrilla Sprint": "races-sprint-starting-grid-positions",
+    "Clasificación Sprint": "races-sprint-qualifying-results",
+    "Warm-up": "races-warming-up-results",
+    "Libres 1": "races-free-practice-1-results",
+    "Libres 2": "races-free-practice-2-results",
+    "Libres 3": "races-free-practice-3-results",
+    "Libres 4": "races-free-practice-4-results",
+}
+SESSION_CACHE_BYTES = int(os.environ.get("F1_SESSION_CACHE_MB", "32")) * 1024 * 1024
+
+# Columnas necesarias para la tabla de resultados (solo se leen estas)
+RESULT_COLUMNS = [
+    "raceId", "positionNumber", "positionText", "driverNumber", "driverId", "constructorId",
+    "full_name", "team_full_name", "time", "gap", "laps", "points",
+]
+
+
+class SessionIndex:
+    """
+    Qué sesiones tiene cada carrera y sus resultados, sin recorrer las tablas.
+
+    - Un bitmap por raceId (bit i = sesión i) calculado solo con la columna
+      raceId de cada tabla; la lista de sesiones de cada combinación de bits se
+      prepara una vez.
+    - Cada tabla de sesión se carga la primera vez que se pide, ordenada por
+      raceId y con un array de offsets: las filas de una carrera son el corte
+      offsets[raceId]:offsets[raceId + 1], sin copia ni máscara booleana.
+    - Las tablas cargadas viven en una caché LRU limitada a max_bytes; las
+      sesiones que nadie consulta se descartan y se vuelven a leer si hacen falta.
+    """
+
+    def __init__(self, catalog=None, tables=SESSION_TABLES, columns=RESULT_COLUMNS, max_bytes=SESSION_CACHE_BYTES):
+        self._tables = dict(tables)
+        self._columns = columns
+        self._catalog = catalog or get_catalog()
+        self._loaded = MemoryLRU(max_bytes, _session_bytes)
+
+        race_ids = {}
+        for name, table in self._tables.items():
+            try:
+                race_ids[name] = self._catalog.load(table, columns=["raceId"])["raceId"].unique().astype(np.int64)
+            except FileNotFoundError:
+                race_ids[name] = np.array([], dtype=np.int64)
+        max_race_id = max((int(ids.max()) for ids in race_ids.values() if len(ids)), default=0)
+        self._availability = np.zeros(max_race_id + 1, dtype=np.uint64)
+        for bit, name in enumerate(self._tables):
+            self._availability[race_ids[name]] |= np.uint64(1 << bit)
+        self._session_lists = {
+            int(mask): [name for bit, name in enumerate(self._tables) if int(mask) >> bit & 1]
+            for mask in np.unique(self._availability)
+        }
+
+    def sessions(self, race_id):
+        """Sesiones disponibles de una carrera, en el orden de las tablas"""
+        if not 0 <= race_id < len(self._availability):
+            return []
+        return self._session_lists[int(self._availability[race_id])]
+
+    def _load(self, name):
+        table = self._tables[name]
+        columns = [col for col in self._columns if col in table_columns(table, self._catalog.manifest)]
+        df = self._catalog.load(table, columns=columns).sort_values("raceId", kind="stable", ignore_index=True)
+        if "full_name" not in df.columns and "driverId" in df.columns:
+            drivers = self._catalog.table("drivers", columns=["id", "name"]).set_index("id")["name"]
+            constructors = self._catalog.table("constructors", columns=["id", "fullName"]).set_index("id")["fullName"]
+            # Nombres como categorías: una cadena por piloto/escudería, no una por fila
+            df["full_name"] = df["driverId"].map(drivers).astype("category")
+            df["team_full_name"] = df["constructorId"].map(constructors).astype("category")
+        offsets = np.searchsorted(df["raceId"].to_numpy(dtype=np.int64), np.arange(len(self._availability) + 1))
+        return df, offsets
+
+    def results(self, name, race_id):
+        """Resultados de una sesión de una carrera (vista de solo lectura)"""
+        df, offsets = self._loaded.get(name, lambda: self._load(name))
+        if not 0 <= race_id < len(self._availability):
+            return df.iloc[0:0]
+        return df.iloc[offsets[race_id]:offsets[race_id + 1]]
+
+
+    def cache_usage(self):
+        """(sesiones en memoria, bytes ocupados)"""
+        return len(self._loaded), self._loaded.bytes
+
+
+def _session_bytes(value):
+    df, offsets = value
+    return int(df.memory_usage(index=True, deep=True).sum()) + offsets.nbytes
+
+
+def get_session_index():
+    """Índice de sesiones único por proceso y versión de los datos"""
+    inputs = list(SESSION_TABLES.values()) + ["drivers", "constructors"]
+    return get_catalog().derived("session-index", SessionIndex, inputs=inputs)
 
 
 @st.cache_data
 def fuzzy_match_countries(grand_prix_id, world_countries):
     """Mapea grandPrixId a nombres de países usando pycountry"""
+    import pycountry
+    from difflib import get_close_matches
+
     # Diccionario para casos especiales
     special_cases = {
         'united-states': 'United States',
@@ -45,59 +2152,754 @@ def fuzzy_match_countries(grand_prix_id, world_countries):
         matches = get_close_matches(country_name, all_countries, n=1, cutoff=0.6)
         return matches[0] if matches else None
 
-@st.cache_data
-def load_world_geometry():
-    """Carga la geometría mundial una sola vez y la cachea"""
+# --- Mapa mundial ---
+WORLD_GEOMETRY_PATH = os.path.join("data", "ne_110m_admin_0_countries.zip")
+
+
+@st.cache_resource
+def load_world_layer():
+    """
+    GeoJSON mundial serializado una sola vez por proceso. Cada país lleva su
+    código ISO alpha-3 (ADM0_A3 de Natural Earth; ISO_A3 vale -99 en Francia o
+    Noruega) como id y solo NAME en las propiedades.
+    """
+    import geopandas as gpd
+
     try:
-        world = gpd.read_file("data/ne_110m_admin_0_countries.zip")
-        return world
+        world = gpd.read_file(WORLD_GEOMETRY_PATH, columns=["NAME", "ADM0_A3"])
     except Exception as e:
         st.error(f"Error cargando geometría mundial: {e}")
         return None
+    layer = json.loads(world.set_index("ADM0_A3").to_json())
+    return layer
 
-@st.cache_data
-def load_driver_photo(driver):
-    search_url = f"https://en.wikipedia.org/w/index.php?search={urllib.parse.quote(driver)}"
-    search_response = requests.get(search_url, timeout=5)
+
+@timed("capa mundial")
+def world_layer(values, value_name, default=0):
+    """
+    Capa mundial con values ({alpha3: valor}) en la propiedad value_name de cada
+    país. La geometría es la de la capa cacheada (no se copia ni se vuelve a
+    serializar); solo se crean las propiedades de cada feature.
+    """
+    layer = load_world_layer()
+    if layer is None:
+        return None
+    features = [
+        {**feature, "properties": {**feature["properties"], value_name: values.get(feature["id"], default)}}
+        for feature in layer["features"]
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+# --- Fotos de Wikipedia ---
+WIKIPEDIA_URL = os.environ.get("F1_WIKIPEDIA_URL", "https://en.wikipedia.org")
+PHOTO_CACHE_PATH = os.environ.get("F1_PHOTO_CACHE", os.path.join("data", "cache", "photos.sqlite"))
+PHOTO_TTL = 30 * 24 * 3600       # una foto encontrada se revisa cada 30 días
+PHOTO_MISS_TTL = 24 * 3600       # un piloto sin foto se vuelve a buscar al día siguiente
+HTTP_TIMEOUT = 5
+PHOTO_POLL_INTERVAL = 0.5         # segundos entre comprobaciones mientras se busca una foto
+
+
+def _infobox_photo(content):
+    """URL de la imagen de la infobox de un artículo de Wikipedia (o None)"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser')
+    infobox = soup.find('table', {'class': 'infobox'})
+    if infobox:
+        img = infobox.find('img')
+        if img and img.get('src'):
+            photo_url = img['src']
+            if photo_url.startswith('//'):
+                photo_url = 'https:' + photo_url
+            return photo_url
+    return None
+
+
+@timed("wikipedia")
+def resolve_driver_photo(driver, base_url=WIKIPEDIA_URL, session=None):
+    """
+    Busca en Wikipedia la foto de un piloto o escudería. Devuelve la URL o None
+    si no hay foto; los errores de red se propagan para no cachearlos como fallos.
+    """
+    import requests
+    from bs4 import BeautifulSoup
+
+    http = session or requests
+    search_url = f"{base_url}/w/index.php?search={urllib.parse.quote(driver)}"
+    search_response = http.get(search_url, timeout=HTTP_TIMEOUT)
     if search_response.status_code == 200:
         search_soup = BeautifulSoup(search_response.content, 'html.parser')
+        if search_soup.find('table', {'class': 'infobox'}):
+            # La búsqueda ya ha redirigido al artículo: no hace falta otra petición
+            return _infobox_photo(search_response.content)
         # Buscar el primer resultado relevante
         first_link = search_soup.find('a', {'class': 'mw-search-result-heading'})
         if first_link and first_link.get('href'):
-            wiki_url = "https://en.wikipedia.org" + first_link['href']
+            wiki_url = base_url + first_link['href']
         else:
             # Si no hay resultados, intentar ir directamente a la página
-            wiki_url = f"https://en.wikipedia.org/wiki/{urllib.parse.quote(driver.replace(' ', '_'))}"
-        response = requests.get(wiki_url, timeout=5)
+            wiki_url = f"{base_url}/wiki/{urllib.parse.quote(driver.replace(' ', '_'))}"
+        response = http.get(wiki_url, timeout=HTTP_TIMEOUT)
         if response.status_code == 200:
-            soup = BeautifulSoup(response.content, 'html.parser')
-            infobox = soup.find('table', {'class': 'infobox'})
-            if infobox:
-                img = infobox.find('img')
-                if img and img.get('src'):
-                    photo_url = img['src']
-                    if photo_url.startswith('//'):
-                        photo_url = 'https:' + photo_url
-    
-                    return photo_url
+            return _infobox_photo(response.content)
     return None
 
-@st.cache_data
-def load_gadm_data(country_code):
+
+class PhotoCache:
+    """
+    Caché persistente en disco (SQLite) de las fotos de Wikipedia. Guarda la URL
+    de la foto, opcionalmente la imagen, y también los pilotos sin foto para no
+    repetir la búsqueda hasta que caduquen.
+    """
+
+    def __init__(self, path=PHOTO_CACHE_PATH, ttl=PHOTO_TTL, miss_ttl=PHOTO_MISS_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS photos ("
+                "name TEXT PRIMARY KEY, url TEXT, image BLOB, fetched_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, name, now=None):
+        """
+        Devuelve (encontrado, url, imagen). encontrado es False si no hay entrada o
+        ha caducado; si es True, url puede ser None (caché negativa).
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT url, image, fetched_at FROM photos WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return False, None, None
+        url, image, fetched_at = row
+        ttl = self.ttl if url else self.miss_ttl
+        if (now or time.time()) - fetched_at > ttl:
+            return False, None, None
+        return True, url, image
+
+    def put(self, name, url, image=None):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO photos (name, url, image, fetched_at) VALUES (?, ?, ?, ?)",
+                (name, url, image, time.time()),
+            )
+
+    def stats(self):
+        with self._connect() as conn:
+            total, found, images = conn.execute(
+                "SELECT COUNT(*), COUNT(url), COUNT(image) FROM photos"
+            ).fetchone()
+        return {"entries": total, "photos": found, "misses": total - found, "images": images}
+
+
+@st.cache_resource
+def get_photo_cache():
+    return PhotoCache()
+
+
+@st.cache_data(ttl=3600)
+def load_driver_photo(driver):
+    """
+    Foto de un piloto o escudería: primero la caché en disco y, si no está o ha
+    caducado, Wikipedia. Devuelve los bytes de la imagen si se guardaron al
+    precargar, la URL si no, o None si no hay foto.
+    """
+    cache = get_photo_cache()
+    found, photo_url, image = cache.get(driver)
+    if not found:
+        photo_url, image = resolve_driver_photo(driver), None
+        cache.put(driver, photo_url)
+    return image or photo_url
+
+
+class PhotoLoader:
+    """
+    Busca fotos en segundo plano para que las páginas no esperen a Wikipedia.
+    Las peticiones del mismo nombre comparten un único Future, las que aún no han
+    empezado se pueden cancelar y se cuentan aciertos, fallos y latencias.
+    """
+
+    def __init__(self, cache, max_workers=4):
+        self.cache = cache
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="photo")
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._counters = Counter()
+        self._latencies = deque(maxlen=1000)
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def request(self, name):
+        """Future con la foto de name (bytes, URL o None); reutiliza la búsqueda en curso"""
+        with self._lock:
+            self._counters["requests"] += 1
+            future = self._futures.get(name)
+            if future is not None and not future.cancelled():
+                if not future.done():
+                    self._counters["deduplicated"] += 1
+                    return future
+                if future.exception() is None:
+                    self._counters["memory_hits"] += 1
+                    return future
+            future = self._pool.submit(self._resolve, name)
+            self._futures[name] = future
+            return future
+
+    def cancel(self, name):
+        """Cancela la búsqueda de name si todavía no ha empezado"""
+        with self._lock:
+            future = self._futures.get(name)
+            if future is not None and future.cancel():
+                self._counters["cancelled"] += 1
+                del self._futures[name]
+
+    def _resolve(self, name):
+        found, photo_url, image = self.cache.get(name)
+        if found:
+            self._count("disk_hits")
+            return image or photo_url
+        self._count("misses")
+        start = time.perf_counter()
+        try:
+            photo_url = resolve_driver_photo(name)
+        except Exception:
+            self._count("errors")
+            raise
+        finally:
+            with self._lock:
+                self._latencies.append(time.perf_counter() - start)
+        self.cache.put(name, photo_url)
+        return photo_url
+
+    def stats(self):
+        """Contadores de peticiones y latencia de las búsquedas en Wikipedia (segundos)"""
+        with self._lock:
+            stats = dict(self._counters)
+            latencies = sorted(self._latencies)
+        stats["lookups"] = len(latencies)
+        if latencies:
+            stats["latency_p50"] = latencies[len(latencies) // 2]
+            stats["latency_max"] = latencies[-1]
+        return stats
+
+
+@st.cache_resource
+def get_photo_loader():
+    return PhotoLoader(get_photo_cache())
+
+
+def show_photo_async(name, slot_key, error_message="No se pudo obtener la foto", width=250):
+    """
+    Pinta la foto de name sin bloquear el resto de la página: mientras se busca,
+    un fragmento comprueba cada PHOTO_POLL_INTERVAL segundos si ya está lista.
+    slot_key identifica el hueco en session_state para cancelar la búsqueda
+    anterior cuando el usuario cambia de selección.
     """
-    Descarga los datos de GADM desde la URL, los descomprime en memoria y los lee con Geopandas.
+    loader = get_photo_loader()
+    previous = st.session_state.get(slot_key)
+    if previous is not None and previous != name:
+        loader.cancel(previous)
+    st.session_state[slot_key] = name
+    future = loader.request(name)
+    pending = not future.done()
+
+    @st.fragment(run_every=PHOTO_POLL_INTERVAL if pending else None)
+    def photo_slot():
+        if not future.done():
+            st.caption("Cargando foto...")
+        elif pending:
+            # Ya está lista: se repinta la página sin el sondeo
+            st.rerun()
+        elif future.cancelled():
+            return
+        elif future.exception() is not None:
+            st.warning(f"{error_message}: {future.exception()}")
+        elif future.result():
+            st.image(future.result(), caption="", width=width)
+
+    photo_slot()
+
+# --- Geometría regional (GADM) ---
+GADM_URL = os.environ.get("F1_GADM_URL", "https://geodata.ucdavis.edu/gadm/gadm4.1/shp/gadm41_{code}_shp.zip")
+GADM_DIR = os.path.join("data", "gadm")
+GADM_LEVELS = (1, 2)                       # regiones (admin-1) y subregiones (admin-2)
+GADM_FIELDS = ["COUNTRY", "NAME_1", "NAME_2"]
+GADM_TOLERANCES = (0.001, 0.01, 0.05)      # grados; 0.01 ≈ 1 km, suficiente para el mapa
+GADM_MAP_TOLERANCE = 0.01
+GEOMETRY_CACHE_BYTES = int(os.environ.get("F1_GEOMETRY_CACHE_MB", "64")) * 1024 * 1024
+
+
+def _geometry_bytes(value):
+    """Tamaño aproximado de un GeoDataFrame (16 bytes por coordenada) o de un GeoJSON"""
+    import geopandas as gpd
+    import shapely
+
+    if isinstance(value, gpd.GeoDataFrame):
+        coordinates = int(shapely.get_num_coordinates(value.geometry.values).sum())
+        return coordinates * 16 + int(value.drop(columns="geometry").memory_usage(deep=True).sum())
+    if isinstance(value, str):
+        return len(value)
+    return 0
+
+
+def gadm_layer_path(country_code, level, tolerance, gadm_dir=GADM_DIR):
+    return os.path.join(gadm_dir, f"{country_code}_{level}_{tolerance}.parquet")
+
+
+@timed("descargar GADM")
+def build_gadm_layers(country_code, gadm_dir=GADM_DIR, url=GADM_URL, session=None):
     """
-    url = f"https://geodata.ucdavis.edu/gadm/gadm4.1/shp/gadm41_{country_code}_shp.zip"
+    Descarga una vez el shapefile de GADM de un país y guarda en disco, para cada
+    nivel disponible, variantes simplificadas con solo los campos que usa el mapa.
+    Devuelve los niveles guardados.
+    """
+    import geopandas as gpd
+    import pyogrio
+    import requests
+
+    http = session or requests
+    response = http.get(url.format(code=country_code), timeout=120)
+    response.raise_for_status()
+    os.makedirs(gadm_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile(suffix=".zip", dir=gadm_dir, delete=False) as f:
+        f.write(response.content)
+        zip_path = f.name
     try:
-        response = requests.get(url)
-        response.raise_for_status()  # Lanza un error si la descarga falla (ej. 404)
+        available = set(pyogrio.list_layers(zip_path)[:, 0])
+        saved = []
+        for level in GADM_LEVELS:
+            layer = f"gadm41_{country_code}_{level}"
+            if layer not in available:
+                continue
+            gdf = gpd.read_file(zip_path, layer=layer)
+            gdf = gdf[[field for field in GADM_FIELDS if field in gdf.columns] + ["geometry"]]
+            for tolerance in GADM_TOLERANCES:
+                simplified = gdf.copy()
+                simplified["geometry"] = gdf.geometry.simplify(tolerance, preserve_topology=True)
+                target = gadm_layer_path(country_code, level, tolerance, gadm_dir)
+                simplified.to_parquet(target + ".part")
+                os.replace(target + ".part", target)
+            saved.append(level)
+        return saved
+    finally:
+        os.remove(zip_path)
+
+
+@st.cache_resource
+def get_geometry_cache():
+    return MemoryLRU(GEOMETRY_CACHE_BYTES, _geometry_bytes)
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def download_gadm_layers(country_code):
+    """
+    Descarga las capas de un país que aún no están en disco. Si falla, el error
+    se recuerda durante una hora para no repetir la descarga en cada interacción.
+    """
+    import requests
 
-        zipfile_in_memory = io.BytesIO(response.content)
-        gdf = gpd.read_file(zipfile_in_memory)
-        return gdf
+    try:
+        build_gadm_layers(country_code)
     except requests.exceptions.HTTPError:
         st.warning(f"No se pudo descargar el mapa para {country_code}. El GP podría no tener mapa regional.")
-        return None
     except Exception as e:
         st.error(f"Ocurrió un error al procesar el mapa para {country_code}: {e}")
+
+
+def load_region_geometry(country_code, level=1, tolerance=GADM_MAP_TOLERANCE):
+    """
+    Regiones de un país (GeoDataFrame con COUNTRY, NAME_1[, NAME_2]) desde el disco,
+    descargándolas de GADM solo la primera vez. Devuelve None si no hay mapa.
+    """
+    import geopandas as gpd
+
+    path = gadm_layer_path(country_code, level, tolerance)
+    if not os.path.exists(path):
+        download_gadm_layers(country_code)
+        if not os.path.exists(path):
+            return None
+    return get_geometry_cache().get(("gdf", path), lambda: gpd.read_parquet(path))
+
+
+@timed("geojson regiones")
+def load_region_geojson(country_code, level=1, tolerance=GADM_MAP_TOLERANCE):
+    """Las mismas regiones ya serializadas como GeoJSON para folium (o None)"""
+    gdf = load_region_geometry(country_code, level, tolerance)
+    if gdf is None:
+        return None
+    path = gadm_layer_path(country_code, level, tolerance)
+    return get_geometry_cache().get(("geojson", path), lambda: gdf.to_json(drop_id=True))
+
+
+# --- Regiones de los circuitos ---
+CIRCUIT_REGIONS_PATH = os.path.join(GADM_DIR, "circuit-regions.parquet")
+CIRCUIT_REGION_COLUMNS = ["circuitId", "countryCode", "admin1", "admin2"]
+
+
+def circuit_layer_path(country_code, gadm_dir=GADM_DIR):
+    """Capa con la que se localizan los circuitos de un país (nivel 2 si existe), o None"""
+    for level in sorted(GADM_LEVELS, reverse=True):
+        path = gadm_layer_path(country_code, level, min(GADM_TOLERANCES), gadm_dir)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def locate_circuits(circuits, country_code, gadm_dir=GADM_DIR):
+    """
+    Región de cada circuito de un país con una sola consulta espacial (sjoin usa
+    un STRtree). Usa el nivel 2 de GADM si existe y si no el nivel 1. circuits
+    necesita las columnas id, latitude y longitude.
+    """
+    import geopandas as gpd
+
+    result = pd.DataFrame({"circuitId": circuits["id"].astype(str).values, "countryCode": country_code})
+    result["admin1"] = None
+    result["admin2"] = None
+    path = circuit_layer_path(country_code, gadm_dir)
+    if path is None:
+        return result
+    regions = gpd.read_parquet(path)
+    points = gpd.GeoDataFrame(
+        {"circuitId": result["circuitId"]},
+        geometry=gpd.points_from_xy(circuits["longitude"], circuits["latitude"]),
+        crs=regions.crs,
+    )
+    joined = gpd.sjoin(points, regions, how="left", predicate="within")
+    joined = joined.drop_duplicates("circuitId").set_index("circuitId")
+    result["admin1"] = result["circuitId"].map(joined.get("NAME_1", pd.Series(dtype=object)))
+    result["admin2"] = result["circuitId"].map(joined.get("NAME_2", pd.Series(dtype=object)))
+    return result
+
+
+def build_circuit_regions(catalog, gadm_dir=GADM_DIR):
+    """Tabla circuito -> (país, admin-1, admin-2) para todos los circuitos de f1db"""
+    circuits = catalog.table("circuits", columns=["id", "countryId", "latitude", "longitude"])
+    alpha3 = catalog.table("countries", columns=["id", "alpha3Code"]).set_index("id")["alpha3Code"]
+    circuits = circuits.assign(countryCode=circuits["countryId"].map(alpha3).astype(object))
+    parts = [
+        locate_circuits(group, country_code, gadm_dir)
+        for country_code, group in circuits.dropna(subset=["countryCode"]).groupby("countryCode")
+    ]
+    if not parts:
+        return pd.DataFrame(columns=CIRCUIT_REGION_COLUMNS)
+    return pd.concat(parts, ignore_index=True)[CIRCUIT_REGION_COLUMNS]
+
+
+def save_circuit_regions(table, path=CIRCUIT_REGIONS_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table.to_parquet(path + ".part", index=False)
+    os.replace(path + ".part", path)
+
+
+class CircuitRegionIndex:
+    """
+    Consulta en O(1) de la región de cada circuito y de los circuitos de cada
+    región. Solo se guardan los circuitos con región: los demás (por ejemplo,
+    porque su país aún no tenía capa en disco) se localizan al pedirlos, y si
+    siguen sin región se recuerdan como fallos para esa versión de la capa, de
+    modo que no se repite la consulta espacial hasta que la capa cambie.
+    """
+
+    def __init__(self, table):
+        self._lock = threading.Lock()
+        self._by_circuit = {}
+        self._by_region = defaultdict(set)
+        # (país, capa, mtime) -> circuitos que no caen en ninguna región de esa capa
+        self._misses = defaultdict(set)
+        self._add(table)
+
+    def _add(self, table):
+        for row in table.itertuples(index=False):
+            admin1 = row.admin1 if pd.notna(row.admin1) else None
+            admin2 = row.admin2 if pd.notna(row.admin2) else None
+            if admin1 is None and admin2 is None:
+                continue
+            self._by_circuit[row.circuitId] = (admin1, admin2)
+            for name in (admin1, admin2):
+                if name is not None:
+                    self._by_region[(row.countryCode, name)].add(row.circuitId)
+
+    def region(self, circuit_id):
+        """(admin1, admin2) del circuito, o None si no se ha localizado"""
+        return self._by_circuit.get(circuit_id)
+
+    def lookup(self, circuits, country_code):
+        """{circuitId: (admin1, admin2)} para los circuitos de un país"""
+        path = circuit_layer_path(country_code)
+        layer = (country_code, path, os.path.getmtime(path) if path else None)
+        ids = circuits["id"].astype(str)
+        missing = circuits[~ids.isin(self._by_circuit) & ~ids.isin(self._misses[layer])]
+        if not missing.empty:
+            located = locate_circuits(missing, country_code)
+            found = located["admin1"].notna() | located["admin2"].notna()
+            with self._lock:
+                self._add(located[found])
+                self._misses[layer].update(located.loc[~found, "circuitId"])
+        return {
+            circuit_id: self._by_circuit[circuit_id]
+            for circuit_id in circuits["id"].astype(str)
+            if circuit_id in self._by_circuit
+        }
+
+    def circuits_in_region(self, country_code, region_name):
+        """Circuitos situados en una región (admin-1 o admin-2) de un país"""
+        return sorted(self._by_region.get((country_code, region_name), ()))
+
+
+@st.cache_resource
+def get_circuit_regions():
+    """Índice de regiones de circuitos, desde la tabla precalculada si existe"""
+    if os.path.exists(CIRCUIT_REGIONS_PATH):
+        table = pd.read_parquet(CIRCUIT_REGIONS_PATH)
+    else:
+        table = build_circuit_regions(get_catalog())
+    return CircuitRegionIndex(table)
+
+
+# --- Fichas de pilotos, escuderías y Grandes Premios ---
+# Figuras y mapas que comparten las páginas y la exportación estática
+# (scripts.export_static), para que ambas muestren exactamente lo mismo.
+CAREER_METRICS = {
+    "Puntos": "totalPoints",
+    "Victorias": "totalRaceWins",
+    "Podios": "totalPodiums",
+    "Pole Positions": "totalPolePositions",
+}
+NATIONALITY_METRICS = {
+    "Victorias": "victories",
+    "Podios": "podiums",
+    "Pole Positions": "poles",
+    "Puntos Totales": "points",
+}
+REGION_ALIASES = {"COUNTRY": "País:", "NAME_1": "Región 1:", "NAME_2": "Región 2:"}
+
+
+def reliability_figure(driver_name, finished_count, dnf_count):
+    import plotly.express as px
+
+    reliability_data = pd.DataFrame({
+        "Estado": ["Carreras Finalizadas", "Abandonos / No Finalizadas"],
+        "Cantidad": [finished_count, dnf_count]
+    })
+    fig_pie = px.pie(
+        reliability_data,
+        names='Estado',
+        values='Cantidad',
+        title=f"<b>Resumen de Fiabilidad para {driver_name}</b>",
+        color_discrete_sequence=['#007bff', '#ff4d4d']
+    )
+    fig_pie.update_layout(
+        title={'x': 0.5, 'xanchor': 'center'},
+        legend=dict(orientation="h", yanchor="bottom", y=-0.35, xanchor="center", x=0.5),
+    )
+    fig_pie.update_traces(hole=0, textposition='inside', textinfo='percent')
+    return fig_pie
+
+
+def career_figure(career_data, metric_label, metric_col, name, color):
+    """Barras por temporada de una métrica de CAREER_METRICS para un piloto o una escudería"""
+    import plotly.express as px
+
+    fig = px.bar(
+        career_data,
+        x='year',
+        y=metric_col,
+        title=f"<b>Evolución de {metric_label} por Temporada para {name}</b>",
+        labels={'year': 'Temporada', metric_col: metric_label},
+        text_auto=True,
+    )
+    fig.update_layout(
+        title={'x': 0.5, 'xanchor': 'center'},
+        xaxis_title="Temporada",
+        yaxis_title=f"Total de {metric_label}",
+    )
+    fig.update_traces(marker_color=color, textposition='outside')
+    return fig
+
+
+def wins_map(world, color):
+    """Mapa folium con los países de world_layer(..., "victorias") que tienen alguna victoria"""
+    import folium
+    from folium.features import GeoJsonTooltip
+
+    m = folium.Map(location=[20, 0], zoom_start=2)
+    folium.GeoJson(
+        world,
+        style_function=lambda feature: {
+            "fillColor": color if feature["properties"]["victorias"] > 0 else "#cccccc",
+            "color": "black",
+            "weight": 0.5,
+            "fillOpacity": 0.7 if feature["properties"]["victorias"] > 0 else 0.2,
+        },
+        tooltip=GeoJsonTooltip(
+            fields=["NAME", "victorias"],
+            aliases=["País", "Victorias"],
+            localize=True,
+            sticky=True,
+            labels=True,
+            style=("background-color: white; color: #333333; font-family: arial; font-size: 12px; padding: 5px;"),
+        ),
+    ).add_to(m)
+    return m
+
+
+def circuits_country(circuits_used, countries):
+    """Código alpha-3 del país de los circuitos, o None si están en varios países"""
+    unique_country_ids = circuits_used['countryId'].unique()
+    if len(unique_country_ids) != 1:
+        return None
+    country_info = countries[countries['id'] == unique_country_ids[0]]
+    if country_info.empty:
+        return None
+    return country_info['alpha3Code'].iloc[0]
+
+
+def circuit_region_layer(circuits_used, country_code):
+    """
+    Regiones del país de los circuitos para su mapa: (GeoJSON, campos del tooltip,
+    nombres de las regiones con algún circuito), o None si no hay mapa regional.
+    """
+    gadm_gdf = load_region_geometry(country_code)
+    if gadm_gdf is None:
+        return None
+    # Región de cada circuito desde la tabla precalculada (admin-1, admin-2)
+    region_level = 1 if 'NAME_2' in gadm_gdf.columns else 0
+    circuit_regions = get_circuit_regions().lookup(circuits_used, country_code)
+    active_regions = {regions[region_level] for regions in circuit_regions.values() if regions[region_level]}
+    fields = [field for field in GADM_FIELDS if field in gadm_gdf.columns]
+    return load_region_geojson(country_code), fields, active_regions
+
+
+def region_name(properties):
+    for field in ('NAME_2', 'NAME_1', 'COUNTRY'):
+        if field in properties and pd.notna(properties[field]):
+            return properties[field]
+    return None
+
+
+def circuits_map(circuits_used, region_layer=None):
+    """Mapa folium de los circuitos de un GP, sobre sus regiones si hay circuit_region_layer"""
+    import folium
+
+    map_center_lat = circuits_used['latitude'].mean()
+    map_center_lon = circuits_used['longitude'].mean()
+    m = folium.Map(location=[map_center_lat, map_center_lon], zoom_start=5, tiles="CartoDB positron")
+
+    if region_layer is not None:
+        geojson, fields, active_regions = region_layer
+
+        def style_function(feature):
+            name = region_name(feature['properties'])
+            is_active = name is not None and name in active_regions
+            return {
+                'fillColor': '#3186cc' if is_active else '#cccccc',
+                'color': 'black',
+                'weight': 1,
+                'fillOpacity': 0.7 if is_active else 0.2,
+            }
+
+        folium.GeoJson(
+            geojson,
+            style_function=style_function,
+            tooltip=folium.features.GeoJsonTooltip(fields=fields, aliases=[REGION_ALIASES[field] for field in fields]),
+        ).add_to(m)
+    elif len(circuits_used) > 1:
+        sw = circuits_used[['latitude', 'longitude']].min().values.tolist()
+        ne = circuits_used[['latitude', 'longitude']].max().values.tolist()
+        m.fit_bounds([sw, ne], padding=(30, 30))
+
+    for row in circuits_used.itertuples(index=False):
+        folium.Marker(
+            location=[row.latitude, row.longitude],
+            popup=folium.Popup(f"<b>{row.fullName}</b><br>Lugar: {row.placeName}", max_width=300),
+            tooltip=row.name,
+            icon=folium.Icon(color='red', icon='flag-checkered', prefix='fa'),
+        ).add_to(m)
+    return m
+
+
+def nationality_values(results_in_gp, countries, metric_key):
+    """
+    Métrica de NATIONALITY_METRICS por país de nacionalidad del piloto en un GP:
+    DataFrame con country, value y alpha3Code, o None si no hay datos.
+    """
+    results_with_nationality = results_in_gp.merge(
+        countries[['id', 'name', 'alpha3Code']], left_on='nationalityCountryId', right_on='id', how='left'
+    )
+    if metric_key == "points":
+        points = pd.to_numeric(results_with_nationality['points'], errors='coerce').fillna(0)
+        data = points.groupby(results_with_nationality['name']).sum().reset_index()
+        data = data[data['points'] > 0]
+    else:
+        if metric_key == "victories":
+            mask = results_with_nationality['positionNumber'] == 1
+        elif metric_key == "podiums":
+            mask = results_with_nationality['positionNumber'].isin([1, 2, 3])
+        else:
+            mask = results_with_nationality['gridPositionNumber'] == 1
+        data = results_with_nationality.loc[mask, 'name'].value_counts().reset_index()
+    if data.empty:
         return None
+    data.columns = ['country', 'value']
+    alpha3 = countries[['name', 'alpha3Code']].drop_duplicates('name').set_index('name')['alpha3Code']
+    return data.assign(alpha3Code=data['country'].map(alpha3).astype(object))
+
+
+def nationality_figure(plot_data, metric_label):
+    import plotly.express as px
+
+    fig = px.choropleth(
+        plot_data,
+        locations="alpha3Code",
+        color="value",
+        hover_name="country",
+        hover_data={"value": True, "alpha3Code": False},
+        color_continuous_scale=px.colors.sequential.Plasma,
+        projection="natural earth",
+    )
+    fig.update_layout(
+        coloraxis_colorbar_title=metric_label,
+        margin={"r": 0, "t": 40, "l": 0, "b": 0}
+    )
+    fig.update_traces(
+        hovertemplate='<b>%{hovertext}</b><br>%{customdata[0]} ' + metric_label.lower() + '<extra></extra>'
+    )
+    return fig
+
+
+def lap_record_figure(evolution, title):
+    """Récord de vuelta tras cada carrera (escalonado) y vuelta rápida de cada carrera"""
+    import plotly.express as px
+
+    plot_data = evolution.assign(
+        record=evolution["recordMillis"] / 1000,
+        fastest=evolution["fastestLapMillis"] / 1000,
+        lapTime=evolution["fastestLapMillis"].map(lap_time),
+    )
+    fig = px.line(
+        plot_data,
+        x="date",
+        y="record",
+        line_shape="hv",
+        title=title,
+        labels={"date": "Fecha", "record": "Tiempo de vuelta (s)"},
+    )
+    fig.update_traces(name="Récord", showlegend=True, hovertemplate="Récord: %{y:.3f} s<extra></extra>")
+    fig.add_scatter(
+        x=plot_data["date"],
+        y=plot_data["fastest"],
+        mode="markers",
+        name="Vuelta rápida de la carrera",
+        customdata=plot_data[["year", "grandPrix", "driver", "constructor", "lapTime"]].to_numpy(),
+        hovertemplate="<b>%{customdata[1]} %{customdata[0]}</b><br>%{customdata[2]} (%{customdata[3]})<br>"
+                      "%{customdata[4]}<extra></extra>",
+    )
+    fig.update_layout(legend={"orientation": "h", "y": -0.2})
+    return fig
@@ -0,0 +1,74 @@
+"""
+Descarga de GADM las regiones de todos los países con circuitos y guarda en
+data/gadm/ las variantes simplificadas que usa el mapa de Grandes Premios,
+junto con la tabla que asigna a cada circuito su región (admin-1 y admin-2).
+
+Uso (desde la raíz del repositorio):
+    python -m scripts.build_geometry
+    python -m scripts.build_geometry --countries ITA USA --force
+    python -m scripts.build_geometry --regions-only   # solo recalcula circuit-regions.parquet
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from pages.functions import (
+    CIRCUIT_REGIONS_PATH,
+    GADM_DIR,
+    GADM_LEVELS,
+    GADM_MAP_TOLERANCE,
+    DataCatalog,
+    build_circuit_regions,
+    build_gadm_layers,
+    gadm_layer_path,
+    load_table,
+    save_circuit_regions,
+)
+
+
+def circuit_country_codes():
+    """Códigos alpha-3 de los países con algún circuito"""
+    circuits = load_table("circuits", columns=["countryId"])
+    countries = load_table("countries", columns=["id", "alpha3Code"])
+    codes = countries[countries["id"].isin(circuits["countryId"])]["alpha3Code"]
+    return sorted(codes.dropna().astype(str).unique())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepara la geometría regional de GADM")
+    parser.add_argument("--countries", nargs="*", help="Códigos alpha-3 (por defecto, los de todos los circuitos)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--force", action="store_true", help="Vuelve a descargar aunque ya estén en disco")
+    parser.add_argument("--regions-only", action="store_true", help="No descarga nada, solo recalcula la tabla de regiones")
+    args = parser.parse_args()
+
+    codes = [] if args.regions_only else args.countries or circuit_country_codes()
+    if not args.force:
+        codes = [
+            code for code in codes
+            if not any(os.path.exists(gadm_layer_path(code, level, GADM_MAP_TOLERANCE)) for level in GADM_LEVELS)
+        ]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(build_gadm_layers, code): code for code in codes}
+        for future in as_completed(futures):
+            code = futures[future]
+            try:
+                print(f"{code}: niveles {future.result()}")
+            except requests.RequestException as e:
+                print(f"{code}: error de descarga ({e})")
+    print(f"{len(codes)} países en {time.perf_counter() - start:.1f}s -> {GADM_DIR}")
+
+    start = time.perf_counter()
+    regions = build_circuit_regions(DataCatalog())
+    save_circuit_regions(regions)
+    located = regions["admin1"].notna().sum()
+    print(f"{located}/{len(regions)} circuitos con región en {time.perf_counter() - start:.1f}s -> {CIRCUIT_REGIONS_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Compila los CSV de database/ en el almacén Parquet que usan las páginas, junto
+con las vistas desnormalizadas (p. ej. races-race-results con los nombres de
+piloto y escudería). Solo se recompila lo que ha cambiado desde la última vez.
+
+Uso (desde la raíz del repositorio):
+    python -m scripts.build_store
+    python -m scripts.build_store --tables races-pit-stops races-qualifying-results
+    python -m scripts.build_store --force
+    python -m scripts.build_store --memory-report
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from pages.functions import DATABASE_DIR, STORE_DIR, build_store, schema_memory_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compila los CSV de f1db en Parquet")
+    parser.add_argument("--tables", nargs="*", help="Tablas a compilar (por defecto, todas)")
+    parser.add_argument("--database-dir", default=DATABASE_DIR)
+    parser.add_argument("--store-dir", default=STORE_DIR)
+    parser.add_argument("--force", action="store_true", help="Recompila aunque las entradas no hayan cambiado")
+    parser.add_argument(
+        "--memory-report",
+        action="store_true",
+        help="Muestra la memoria de cada tabla con los tipos por defecto y con el esquema compacto",
+    )
+    args = parser.parse_args()
+
+    if args.memory_report:
+        report = schema_memory_report(args.tables, database_dir=args.database_dir)
+        for row in report.itertuples():
+            change = "" if pd.isna(row.saving) else f" ({-row.saving:+.0%})"
+            print(f"{row.table}: {row.default_bytes / 1e6:.2f} MB -> {row.compact_bytes / 1e6:.2f} MB{change}")
+        total_before, total_after = report["default_bytes"].sum(), report["compact_bytes"].sum()
+        print(f"Total: {total_before / 1e6:.2f} MB -> {total_after / 1e6:.2f} MB ({total_after / total_before - 1:+.0%})")
+        return
+
+    start = time.perf_counter()
+    built = build_store(args.tables, database_dir=args.database_dir, store_dir=args.store_dir, force=args.force)
+    for table, rows in built.items():
+        if rows is not None:
+            print(f"{table}: {rows} filas")
+    unchanged = sum(rows is None for rows in built.values())
+    print(
+        f"{len(built) - unchanged} tablas compiladas, {unchanged} sin cambios, "
+        f"en {time.perf_counter() - start:.1f}s -> {args.store_dir}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,506 @@
+"""
+Exporta a HTML estático, con sus datos en JSON, la ficha de cada piloto
+(todos los de f1db-drivers.csv), escudería y Gran Premio, con las figuras y los
+mapas incrustados. Así las fichas más visitadas se pueden servir desde un
+servidor estático o una CDN y la aplicación de Streamlit queda para las
+comparaciones interactivas.
+
+Los datos de cada ficha se calculan en este proceso y se renderizan en un pool
+de procesos (uno por núcleo). El manifiesto de la exportación guarda el digest
+de los datos de cada ficha y se actualiza a medida que terminan: en la
+siguiente ejecución solo se vuelven a renderizar las fichas cuyos datos han
+cambiado, y una exportación interrumpida continúa donde se quedó.
+
+Las fotos salen de la caché de disco (scripts.prefetch_photos) y los mapas
+regionales de los Grandes Premios de data/gadm (scripts.build_geometry): la
+exportación no hace peticiones a la red.
+
+Uso (desde la raíz del repositorio):
+    python -m scripts.export_static
+    python -m scripts.export_static --output /srv/f1 --workers 8
+    python -m scripts.export_static --kinds pilotos escuderias --force
+"""
+import argparse
+import hashlib
+import html
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from pages.functions import (
+    CAREER_METRICS,
+    GADM_MAP_TOLERANCE,
+    NATIONALITY_METRICS,
+    PHOTO_CACHE_PATH,
+    DataCatalog,
+    PhotoCache,
+    build_constructor_profiles,
+    build_driver_profiles,
+    build_results_with_nationality,
+    career_figure,
+    circuit_region_layer,
+    circuits_country,
+    circuits_map,
+    gadm_layer_path,
+    nationality_figure,
+    nationality_values,
+    reliability_figure,
+    wins_map,
+    world_layer,
+)
+
+EXPORT_DIR = "export"
+MANIFEST_NAME = "manifest.json"
+# Cambiarlo obliga a volver a renderizar todas las fichas (nuevo formato de página)
+EXPORT_FORMAT = 1
+MANIFEST_EVERY = 2.0        # segundos entre escrituras del manifiesto durante la exportación
+KIND_TITLES = {
+    "pilotos": "Pilotos",
+    "escuderias": "Escuderías",
+    "grandes-premios": "Grandes Premios",
+}
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<script src="{root}assets/plotly.min.js"></script>
+<style>
+body {{ font-family: sans-serif; max-width: 1200px; margin: 0 auto; padding: 1rem 2rem; color: #31333f; }}
+.ficha {{ display: flex; gap: 2rem; align-items: flex-start; }}
+.ficha > div {{ flex: 2; }}
+.ficha > img {{ flex: 1; max-width: 250px; }}
+.metricas {{ display: flex; gap: 3rem; }}
+.metricas div {{ font-size: 1.6rem; }}
+.metricas small {{ display: block; font-size: 0.9rem; color: #808495; }}
+iframe {{ width: 100%; height: 500px; border: none; }}
+</style>
+</head>
+<body>
+<p><a href="{root}index.html">Inicio</a></p>
+{body}
+<p><small>Datos: f1db, versión {version}. <a href="data.json">JSON</a></small></p>
+</body>
+</html>
+"""
+
+INDEX_TEMPLATE = """<!DOCTYPE html>
+<html lang="es">
+<head><meta charset="utf-8"><title>{title}</title></head>
+<body style="font-family: sans-serif; max-width: 1200px; margin: 0 auto; padding: 1rem 2rem;">
+{body}
+</body>
+</html>
+"""
+
+
+# --- Datos de cada ficha (proceso principal) ---
+def records(df):
+    """Filas de un DataFrame como lista de dicts con tipos de JSON"""
+    return json.loads(df.to_json(orient="records"))
+
+
+def json_ready(values):
+    """dict con tipos de JSON: los nulos de pandas pasan a None y los enteros de NumPy a int"""
+    values = {key: None if not isinstance(value, dict) and pd.isna(value) else value for key, value in values.items()}
+    return json.loads(json.dumps(values, default=int))
+
+
+def careers(seasons, id_column):
+    """{id: filas por temporada con las métricas de CAREER_METRICS}"""
+    seasons = seasons[[id_column, "year", *CAREER_METRICS.values()]].sort_values("year", kind="stable")
+    return {
+        str(entity_id): records(group.drop(columns=id_column))
+        for entity_id, group in seasons.groupby(id_column, observed=True)
+    }
+
+
+def photo_url(photos, name):
+    found, url, _ = photos.get(name)
+    return url if found else None
+
+
+DRIVER_FIELDS = [
+    "name", "fullName", "dateOfBirth", "dateOfDeath", "placeOfBirth", "countryOfBirth", "nationality",
+    "permanentNumber", "championships", "totalRaceWins", "totalPodiums", "totalPolePositions", "totalRaceStarts",
+    "entries", "finished", "dnf", "winsByCountry",
+]
+
+
+def driver_pages(catalog, photos):
+    """(id, datos) de cada piloto de f1db-drivers.csv; los que no tienen resultados en carrera solo con su ficha personal"""
+    profiles = catalog.derived("driver-profiles", build_driver_profiles)
+    drivers = catalog.table("drivers")
+    country_names = catalog.table("countries", columns=["id", "name"]).set_index("id")["name"]
+    seasons_by_driver = careers(catalog.table("seasons-drivers"), "driverId")
+
+    for driver in drivers.itertuples(index=False):
+        driver_id = str(driver.id)
+        if driver_id in profiles.index:
+            profile = profiles.loc[driver_id]
+            data = {column: profile[column] for column in DRIVER_FIELDS}
+        else:
+            data = {
+                "name": driver.name,
+                "fullName": driver.fullName,
+                "dateOfBirth": driver.dateOfBirth,
+                "dateOfDeath": driver.dateOfDeath,
+                "placeOfBirth": driver.placeOfBirth,
+                "countryOfBirth": country_names.get(driver.countryOfBirthCountryId),
+                "nationality": country_names.get(driver.nationalityCountryId),
+                "permanentNumber": driver.permanentNumber,
+                "championships": 0, "totalRaceWins": 0, "totalPodiums": 0, "totalPolePositions": 0,
+                "totalRaceStarts": 0, "entries": 0, "finished": 0, "dnf": 0, "winsByCountry": {},
+            }
+        data = {
+            "id": driver_id,
+            **json_ready(data),
+            "career": seasons_by_driver.get(driver_id, []),
+            "photo": photo_url(photos, driver.name),
+        }
+        yield driver_id, data
+
+
+def constructor_pages(catalog, photos):
+    """(id, datos) de cada escudería de f1db-constructors.csv"""
+    profiles = catalog.derived("constructor-profiles", build_constructor_profiles)
+    seasons_by_team = careers(catalog.table("seasons-constructors"), "constructorId")
+    for constructor_id, profile in profiles.iterrows():
+        data = {
+            "id": constructor_id,
+            **json_ready(profile.to_dict()),
+            "career": seasons_by_team.get(constructor_id, []),
+            "photo": photo_url(photos, profile["name"]),
+        }
+        yield constructor_id, data
+
+
+def grand_prix_pages(catalog):
+    """(id, datos) de cada Gran Premio de f1db-grands-prix.csv"""
+    races = catalog.table("races", columns=["raceId", "grandPrixId", "circuitId"])
+    results = catalog.derived("races-race-results+nationality", build_results_with_nationality)
+    circuits = catalog.table("circuits", columns=["id", "name", "fullName", "placeName", "countryId", "latitude", "longitude"])
+    grands_prix = catalog.table("grands-prix", columns=["id", "fullName"])
+    countries = catalog.table("countries")
+
+    races_by_gp = {str(gp_id): group for gp_id, group in races.groupby("grandPrixId", observed=True)}
+    gp_of_race = races.set_index("raceId")["grandPrixId"].astype(str)
+    results = results.assign(grandPrixId=results["raceId"].map(gp_of_race))
+    results_by_gp = dict(list(results.groupby("grandPrixId")))
+
+    for gp in grands_prix.itertuples(index=False):
+        gp_id = str(gp.id)
+        races_in_gp = races_by_gp.get(gp_id, races.iloc[:0])
+        results_in_gp = results_by_gp.get(gp_id, results.iloc[:0])
+        wins_in_gp = results_in_gp[results_in_gp["positionNumber"] == 1]
+
+        data = {"id": gp_id, "name": gp.fullName, "racesHeld": int(races_in_gp["raceId"].nunique())}
+        for key, column in (("topDriver", "full_name"), ("topTeam", "team_full_name")):
+            wins = wins_in_gp[column].value_counts()
+            data[key] = {"name": wins_in_gp[column].mode()[0], "wins": int(wins.max())} if not wins_in_gp.empty else None
+
+        circuits_used = circuits[circuits["id"].isin(races_in_gp["circuitId"].unique())]
+        data["circuits"] = records(circuits_used.drop(columns="countryId"))
+        country_code = circuits_country(circuits_used, countries) if not circuits_used.empty else None
+        data["countryCode"] = country_code
+        # El mapa regional solo se incluye si la geometría ya está en disco (no se descarga)
+        layer_path = gadm_layer_path(country_code, 1, GADM_MAP_TOLERANCE) if country_code else None
+        data["regionLayer"] = (
+            [os.path.basename(layer_path), int(os.path.getmtime(layer_path))]
+            if layer_path and os.path.exists(layer_path) else None
+        )
+
+        data["nationality"] = {}
+        if not results_in_gp.empty:
+            for metric_key in NATIONALITY_METRICS.values():
+                values = nationality_values(results_in_gp, countries, metric_key)
+                data["nationality"][metric_key] = records(values) if values is not None else None
+        yield gp_id, data
+
+
+def page_digest(data, versions):
+    """Digest de los datos de una ficha, del formato de página y de las versiones de plotly/folium"""
+    payload = json.dumps([EXPORT_FORMAT, versions, data], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:20]
+
+
+# --- Renderizado (procesos del pool) ---
+def figure_html(fig):
+    return fig.to_html(full_html=False, include_plotlyjs=False, default_height="450px", config={"responsive": True})
+
+
+def map_html(m):
+    """Mapa folium como iframe autocontenido (su propio documento en srcdoc)"""
+    return f'<iframe srcdoc="{html.escape(m.get_root().render(), quote=True)}"></iframe>'
+
+
+def bullet(label, value):
+    return f"<li><b>{html.escape(label)}</b>: {html.escape(str(value))}</li>"
+
+
+def career_sections(data, color):
+    career = pd.DataFrame(data["career"])
+    parts = []
+    for metric_label, metric_col in CAREER_METRICS.items():
+        parts.append(figure_html(career_figure(career, metric_label, metric_col, data["name"], color)))
+    return "".join(parts)
+
+
+def render_driver(data):
+    parts = [f"<h1>{html.escape(data['name'])}</h1>", "<div class='ficha'><div>", "<h4>Ficha personal</h4><ul>"]
+    parts.append(bullet("Nombre completo", data["fullName"]))
+    parts.append(bullet("Fecha de nacimiento", data["dateOfBirth"]))
+    parts.append(bullet("Lugar de nacimiento", f"{data['placeOfBirth']} ({data['countryOfBirth']})"))
+    if data["dateOfDeath"]:
+        parts.append(bullet("Fecha de fallecimiento", data["dateOfDeath"]))
+    parts.append(bullet("Nacionalidad", data["nationality"]))
+    parts.append("</ul><h4>Estadísticas</h4><ul>")
+    if data["permanentNumber"] is not None:
+        parts.append(bullet("Dorsal", data["permanentNumber"]))
+    if data["championships"]:
+        parts.append(bullet("Campeonatos", data["championships"]))
+    for label, key in (("Victorias", "totalRaceWins"), ("Podios", "totalPodiums"),
+                       ("Pole Positions", "totalPolePositions"), ("Carreras", "totalRaceStarts")):
+        parts.append(bullet(label, data[key]))
+    parts.append("</ul></div>")
+    if data["photo"]:
+        parts.append(f"<img src='{html.escape(data['photo'], quote=True)}' alt=''>")
+    parts.append("</div>")
+
+    if data["entries"] > 0:
+        parts.append("<h3>Análisis de fiabilidad</h3>")
+        parts.append(figure_html(reliability_figure(data["name"], data["finished"], data["dnf"])))
+    parts.append("<hr><h3>Trayectoria del Piloto por Temporada</h3>")
+    if data["career"]:
+        parts.append(career_sections(data, "#ff4d4d"))
+    else:
+        parts.append("<p>No hay datos de rendimiento anual disponibles para este piloto.</p>")
+    world = world_layer(data["winsByCountry"], "victorias") if data["totalRaceWins"] > 0 else None
+    if world is not None:
+        parts.append("<hr><h4>Países donde ha conseguido victorias</h4>")
+        parts.append(map_html(wins_map(world, "#ff4d4d")))
+    return data["name"], "".join(parts)
+
+
+def render_constructor(data):
+    parts = [f"<h1>{html.escape(data['name'])}</h1>", "<div class='ficha'><div>", "<h4>Ficha de la escudería</h4><ul>"]
+    parts.append(bullet("Nombre completo", data["fullName"]))
+    parts.append(bullet("País de origen", data["country"]))
+    parts.append("</ul><h4>Estadísticas</h4><ul>")
+    if data["championships"]:
+        parts.append(bullet("Campeonatos", data["championships"]))
+    for label, key in (("Victorias", "totalRaceWins"), ("Podios", "totalPodiums"),
+                       ("Pole Positions", "totalPolePositions"), ("Dobletes (1-2)", "total1And2Finishes"),
+                       ("Carreras", "totalRaceStarts")):
+        parts.append(bullet(label, data[key]))
+    parts.append("</ul></div>")
+    if data["photo"]:
+        parts.append(f"<img src='{html.escape(data['photo'], quote=True)}' alt=''>")
+    parts.append("</div><hr><h3>Trayectoria de la Escudería por Temporada</h3>")
+    if data["career"]:
+        parts.append(career_sections(data, "#007bff"))
+    else:
+        parts.append("<p>No hay datos de rendimiento anual disponibles para esta escudería.</p>")
+    world = world_layer(data["winsByCountry"], "victorias") if data["totalRaceWins"] > 0 else None
+    if world is not None:
+        parts.append("<hr><h4>Países donde ha conseguido victorias</h4>")
+        parts.append(map_html(wins_map(world, "#007bff")))
+    return data["name"], "".join(parts)
+
+
+def render_grand_prix(data):
+    name = html.escape(data["name"])
+    parts = [f"<h1>{name}</h1>", "<div class='metricas'>", f"<div><small>Veces Disputado</small>{data['racesHeld']}</div>"]
+    for label, key in (("Piloto con más victorias", "topDriver"), ("Escudería con más victorias", "topTeam")):
+        top = data[key]
+        value = f"{html.escape(top['name'])}<small>{top['wins']} victorias</small>" if top else "N/A"
+        parts.append(f"<div><small>{label}</small>{value}</div>")
+    parts.append("</div><hr>")
+
+    parts.append(f"<h3>Ubicación de los Circuitos del {name}</h3>")
+    if data["circuits"]:
+        circuits_used = pd.DataFrame(data["circuits"])
+        region_layer = circuit_region_layer(circuits_used, data["countryCode"]) if data["regionLayer"] else None
+        parts.append(map_html(circuits_map(circuits_used, region_layer)))
+    else:
+        parts.append("<p>No hay información de circuitos para este Gran Premio.</p>")
+
+    parts.append(f"<h3>Estadísticas por nacionalidad de piloto en el {name}</h3>")
+    if not data["nationality"]:
+        parts.append("<p>No hay datos de resultados para este Gran Premio.</p>")
+    for metric_label, metric_key in NATIONALITY_METRICS.items():
+        if metric_key not in data["nationality"]:
+            continue
+        plot_data = data["nationality"][metric_key]
+        parts.append(f"<h4>{metric_label}</h4>")
+        if plot_data is not None:
+            parts.append(figure_html(nationality_figure(pd.DataFrame(plot_data), metric_label)))
+        else:
+            parts.append(f"<p>No hay datos de '{metric_label}' para este Gran Premio.</p>")
+    return data["name"], "".join(parts)
+
+
+RENDERERS = {
+    "pilotos": render_driver,
+    "escuderias": render_constructor,
+    "grandes-premios": render_grand_prix,
+}
+
+
+def write_file(path, text):
+    """Escritura atómica: un servidor estático nunca sirve un fichero a medias"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".part", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(path + ".part", path)
+
+
+def render_page(kind, entity_id, data, output, version):
+    """Escribe index.html y data.json de una ficha. Devuelve su nombre para los índices"""
+    title, body = RENDERERS[kind](data)
+    directory = os.path.join(output, kind, entity_id)
+    page = PAGE_TEMPLATE.format(title=html.escape(title), root="../../", body=body, version=html.escape(version))
+    write_file(os.path.join(directory, "data.json"), json.dumps(data, ensure_ascii=False))
+    write_file(os.path.join(directory, "index.html"), page)
+    return title
+
+
+def quiet_streamlit():
+    """Fuera de `streamlit run`, las cachés de Streamlit avisan de que no hay runtime: no es un error"""
+    for name in ("streamlit.runtime.caching.cache_data_api", "streamlit.runtime.caching.cache_resource_api"):
+        logging.getLogger(name).setLevel(logging.ERROR)
+
+
+# --- Exportación ---
+def read_export_manifest(output):
+    try:
+        with open(os.path.join(output, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_export_manifest(output, manifest):
+    write_file(os.path.join(output, MANIFEST_NAME), json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True))
+
+
+def write_assets(output):
+    import plotly.offline
+
+    path = os.path.join(output, "assets", "plotly.min.js")
+    plotly_js = plotly.offline.get_plotlyjs()
+    if not os.path.exists(path) or os.path.getsize(path) != len(plotly_js.encode("utf-8")):
+        write_file(path, plotly_js)
+
+
+def write_indexes(output, pages):
+    """Índice general y uno por tipo de ficha, ordenados por nombre"""
+    sections = []
+    for kind, title in KIND_TITLES.items():
+        entries = sorted(
+            ((name, key.split("/", 1)[1]) for key, (_, name) in pages.items() if key.startswith(kind + "/")),
+            key=lambda entry: entry[0].casefold(),
+        )
+        if not entries:
+            continue
+        links = "".join(
+            f"<li><a href='{html.escape(entity_id, quote=True)}/index.html'>{html.escape(name)}</a></li>"
+            for name, entity_id in entries
+        )
+        write_file(
+            os.path.join(output, kind, "index.html"),
+            INDEX_TEMPLATE.format(title=title, body=f"<p><a href='../index.html'>Inicio</a></p><h1>{title}</h1><ul>{links}</ul>"),
+        )
+        sections.append(f"<li><a href='{kind}/index.html'>{title}</a> ({len(entries)})</li>")
+    write_file(
+        os.path.join(output, "index.html"),
+        INDEX_TEMPLATE.format(title="Fórmula 1", body=f"<h1>Fórmula 1</h1><ul>{''.join(sections)}</ul>"),
+    )
+
+
+def collect_pages(kinds, photos):
+    catalog = DataCatalog()
+    sources = {
+        "pilotos": lambda: driver_pages(catalog, photos),
+        "escuderias": lambda: constructor_pages(catalog, photos),
+        "grandes-premios": lambda: grand_prix_pages(catalog),
+    }
+    pages = {}
+    for kind in kinds:
+        for entity_id, data in sources[kind]():
+            pages[f"{kind}/{entity_id}"] = data
+    return catalog.version, pages
+
+
+def main():
+    import folium
+    import plotly
+
+    parser = argparse.ArgumentParser(description="Exporta las fichas de pilotos, escuderías y GP a HTML estático")
+    parser.add_argument("--output", default=EXPORT_DIR, help="Carpeta de la exportación")
+    parser.add_argument("--kinds", nargs="*", choices=list(KIND_TITLES), default=list(KIND_TITLES))
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Procesos de renderizado")
+    parser.add_argument("--force", action="store_true", help="Vuelve a renderizar aunque los datos no hayan cambiado")
+    parser.add_argument("--photo-cache", default=PHOTO_CACHE_PATH)
+    args = parser.parse_args()
+    quiet_streamlit()
+
+    start = time.perf_counter()
+    version, pages = collect_pages(args.kinds, PhotoCache(args.photo_cache))
+    versions = {"plotly": plotly.__version__, "folium": folium.__version__}
+    digests = {key: page_digest(data, versions) for key, data in pages.items()}
+    print(f"{len(pages)} fichas con los datos de la versión {version} en {time.perf_counter() - start:.1f}s")
+
+    previous = read_export_manifest(args.output).get("pages", {})
+    # {clave: [digest, nombre]} de las fichas ya escritas; las de tipos que no se exportan ahora se conservan
+    done = {key: value for key, value in previous.items() if key.split("/", 1)[0] not in args.kinds}
+    pending = []
+    for key, digest in digests.items():
+        old = previous.get(key)
+        if not args.force and old and old[0] == digest and os.path.exists(os.path.join(args.output, key, "index.html")):
+            done[key] = old
+        else:
+            pending.append(key)
+    removed = [key for key in previous if key.split("/", 1)[0] in args.kinds and key not in digests]
+    for key in removed:
+        shutil.rmtree(os.path.join(args.output, key), ignore_errors=True)
+
+    write_assets(args.output)
+    manifest = {"format": EXPORT_FORMAT, "dataset": version, "pages": done}
+    write_export_manifest(args.output, manifest)
+
+    start, errors, last_write = time.perf_counter(), 0, time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=quiet_streamlit) as pool:
+        futures = {
+            pool.submit(render_page, *key.split("/", 1), pages[key], args.output, version): key
+            for key in pending
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                done[key] = [digests[key], future.result()]
+            except Exception as e:
+                errors += 1
+                print(f"{key}: {e}")
+            if time.perf_counter() - last_write > MANIFEST_EVERY:
+                write_export_manifest(args.output, manifest)
+                last_write = time.perf_counter()
+    write_export_manifest(args.output, manifest)
+    write_indexes(args.output, done)
+
+    print(
+        f"{len(pending) - errors} fichas renderizadas con {args.workers} procesos en "
+        f"{time.perf_counter() - start:.1f}s, {len(digests) - len(pending)} sin cambios, "
+        f"{len(removed)} eliminadas, {errors} errores -> {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
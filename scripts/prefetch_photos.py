@@ -0,0 +1,91 @@
+"""
+Precarga en la caché de disco las fotos de Wikipedia de todos los pilotos y
+escuderías, para que ninguna página tenga que esperar a Wikipedia.
+
+Uso (desde la raíz del repositorio):
+    python -m scripts.prefetch_photos
+    python -m scripts.prefetch_photos --workers 16 --images
+    python -m scripts.prefetch_photos --base-url http://127.0.0.1:8000   # servidor de pruebas local
+"""
+import argparse
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from pages.functions import (
+    HTTP_TIMEOUT,
+    PHOTO_CACHE_PATH,
+    WIKIPEDIA_URL,
+    PhotoCache,
+    load_table,
+    resolve_driver_photo,
+)
+
+_local = threading.local()
+
+
+def _session():
+    """Una sesión HTTP por hilo (requests.Session no es segura entre hilos)"""
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+        _local.session.headers["User-Agent"] = "f1-data-dashboard photo prefetch"
+    return _local.session
+
+
+def prefetch_one(cache, name, base_url, with_images=False, force=False):
+    """Resuelve y guarda la foto de un nombre. Devuelve 'cached', 'found' o 'missing'"""
+    if not force:
+        found, url, image = cache.get(name)
+        if found and (image or not url or not with_images):
+            return "cached"
+    url = resolve_driver_photo(name, base_url=base_url, session=_session())
+    image = None
+    if url and with_images:
+        response = _session().get(url, timeout=HTTP_TIMEOUT)
+        if response.status_code == 200:
+            image = response.content
+    cache.put(name, url, image)
+    return "found" if url else "missing"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precarga las fotos de pilotos y escuderías")
+    parser.add_argument("--workers", type=int, default=8, help="Peticiones simultáneas a Wikipedia")
+    parser.add_argument("--images", action="store_true", help="Guarda también la imagen, no solo la URL")
+    parser.add_argument("--force", action="store_true", help="Vuelve a buscar aunque la entrada no haya caducado")
+    parser.add_argument("--base-url", default=WIKIPEDIA_URL)
+    parser.add_argument("--cache", default=PHOTO_CACHE_PATH)
+    args = parser.parse_args()
+
+    names = load_table("drivers", columns=["name"])["name"].tolist()
+    names += load_table("constructors", columns=["name"])["name"].tolist()
+    names = list(dict.fromkeys(names))
+
+    cache = PhotoCache(args.cache)
+    counts = Counter()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            pool.submit(prefetch_one, cache, name, args.base_url, args.images, args.force): name
+            for name in names
+        }
+        for future in as_completed(futures):
+            try:
+                counts[future.result()] += 1
+            except requests.RequestException as e:
+                counts["error"] += 1
+                print(f"{futures[future]}: {e}")
+
+    print(
+        f"{len(names)} nombres en {time.perf_counter() - start:.1f}s: "
+        f"{counts['found']} fotos nuevas, {counts['missing']} sin foto, "
+        f"{counts['cached']} ya en caché, {counts['error']} errores"
+    )
+    print(cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Incorpora una nueva entrega de CSV de f1db sin reiniciar la aplicación.
+
+Compara cada CSV con el de database/ por su hash, añade al almacén solo las
+carreras nuevas cuando las anteriores no han cambiado, recompila lo demás y
+publica la nueva versión sustituyendo el manifiesto. Los servidores en marcha
+la usan a partir de su siguiente rerun y conservan en memoria las tablas y
+derivados cuyas entradas no han cambiado.
+
+Uso (desde la raíz del repositorio):
+    python -m scripts.refresh_data ~/Descargas/f1db-csv
+"""
+import argparse
+import time
+
+from pages.functions import DATABASE_DIR, STORE_DIR, read_manifest, refresh_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Actualiza los datos con una nueva entrega de f1db")
+    parser.add_argument("source", help="Carpeta con los f1db-*.csv nuevos")
+    parser.add_argument("--database-dir", default=DATABASE_DIR)
+    parser.add_argument("--store-dir", default=STORE_DIR)
+    args = parser.parse_args()
+
+    before = read_manifest(args.store_dir).get("version", "-")
+    start = time.perf_counter()
+    changes = refresh_store(args.source, database_dir=args.database_dir, store_dir=args.store_dir)
+    for table, change in sorted(changes.items()):
+        print(f"{table}: {'carreras nuevas añadidas' if change == 'appended' else 'recompilada'}")
+    if not changes:
+        print("Sin cambios")
+    after = read_manifest(args.store_dir).get("version", "-")
+    print(f"Versión {before} -> {after} en {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()